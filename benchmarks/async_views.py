@@ -0,0 +1,116 @@
+import argparse
+import asyncio
+import threading
+import time
+
+from .common import (
+    asgi_request, benchmark_databases, disable_throttling, print_table, setup_django, summarize_latencies,
+)
+
+
+# Бенчмарк конкурентности под ASGI: синхронные представления чтения
+# (/api/tasks/...) против асинхронных (/api/async/tasks/...) в одном
+# ASGI-приложении (get_asgi_application), без сетевого сервера. Клиенты -
+# корутины, каждая выполняет запросы последовательно; --db-latency-ms
+# добавляет задержку к каждому SQL-запросу (удаленная или нагруженная БД).
+#   python -m benchmarks.async_views --concurrency 1 10 50 --requests 500 --db-latency-ms 5
+
+ENDPOINTS = {
+    'list': ('task-list', []),
+    'user': ('user-task-list', ['bench']),
+    'detail': ('task-detail', None),
+    'status': ('task-filter-by-status', ['new']),
+}
+
+
+async def run(app, variant, path, headers, concurrency, requests):
+    latencies, errors = [], 0
+    remaining = requests
+    peak_threads = threading.active_count()
+
+    async def client():
+        nonlocal remaining, errors
+        while remaining > 0:
+            remaining -= 1
+            start = time.perf_counter()
+            status, _, _ = await asgi_request(app, 'GET', path, headers=headers)
+            latencies.append(time.perf_counter() - start)
+            if status != 200:
+                errors += 1
+
+    async def sample_threads():
+        nonlocal peak_threads
+        while True:
+            peak_threads = max(peak_threads, threading.active_count())
+            await asyncio.sleep(0.005)
+
+    sampler = asyncio.create_task(sample_threads())
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    sampler.cancel()
+
+    return {'view': variant, 'concurrency': concurrency, 'requests': requests, 'errors': errors,
+            'rps': round(requests / elapsed, 1), 'peak_threads': peak_threads,
+            **summarize_latencies(latencies)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Sync vs async read views under ASGI')
+    parser.add_argument('--endpoint', choices=sorted(ENDPOINTS), default='list')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 10, 50])
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--tasks', type=int, default=1000)
+    parser.add_argument('--db-latency-ms', type=float, default=0.0)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.contrib.auth import get_user_model
+    from django.core.asgi import get_asgi_application
+    from django.core.cache import cache
+    from django.db.backends.signals import connection_created
+    from django.urls import reverse
+    from rest_framework_simplejwt.tokens import RefreshToken
+
+    from tasks.models import Task
+
+    # Задержка выполняется в потоке, где идет запрос к БД: у синхронных
+    # представлений - в потоке запроса, у асинхронных - в потоке sync_to_async
+    def delay(execute, sql, params, many, context):
+        time.sleep(args.db_latency_ms / 1000)
+        return execute(sql, params, many, context)
+
+    def add_latency(sender, connection, **kwargs):
+        connection.execute_wrappers.append(delay)
+
+    with benchmark_databases(), disable_throttling():
+        user = get_user_model().objects.create_user(username='bench', password='benchpass', first_name='Bench')
+        Task.objects.bulk_create([
+            Task(title=f'Task {i}', description='Bench task', status='new' if i % 2 else 'completed', user=user)
+            for i in range(args.tasks)
+        ])
+        token = str(RefreshToken.for_user(user).access_token)
+        headers = {'Authorization': f'Bearer {token}'}
+
+        name, url_args = ENDPOINTS[args.endpoint]
+        if url_args is None:
+            url_args = [Task.objects.order_by('id').values_list('id', flat=True).first()]
+        paths = {'sync': reverse(name, args=url_args), 'async': reverse(f'async-{name}', args=url_args)}
+
+        if args.db_latency_ms:
+            connection_created.connect(add_latency)
+        app = get_asgi_application()
+        rows = []
+        for concurrency in args.concurrency:
+            for variant, path in paths.items():
+                # Одинаковые начальные условия: списки user и status кэшируются
+                cache.clear()
+                rows.append(asyncio.run(run(app, variant, path, headers, concurrency, args.requests)))
+        connection_created.disconnect(add_latency)
+
+        print_table(rows, ['view', 'concurrency', 'requests', 'errors', 'rps',
+                           'p50_ms', 'p95_ms', 'p99_ms', 'peak_threads'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+import argparse
+import time
+from unittest import mock
+
+from .common import benchmark_databases, print_table, setup_django, summarize_latencies
+
+
+# Бенчмарк JWT-аутентификации: число запросов к БД и задержка на один
+# GET /api/tasks/<id>/ для JWTAuthentication (до) и TaskJWTAuthentication (после).
+#   python -m benchmarks.auth --requests 1000
+
+def run(auth_class, client, url, requests):
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+    from rest_framework.views import APIView
+
+    from tasks.authentication import user_state_cache
+
+    user_state_cache.clear()
+    latencies, queries = [], 0
+    with mock.patch.object(APIView, 'authentication_classes', [auth_class]):
+        for _ in range(requests):
+            with CaptureQueriesContext(connection) as context:
+                start = time.perf_counter()
+                response = client.get(url)
+                latencies.append(time.perf_counter() - start)
+            assert response.status_code == 200, response.status_code
+            queries += len(context.captured_queries)
+
+    return {'auth': auth_class.__name__, 'queries_per_request': round(queries / requests, 3),
+            **summarize_latencies(latencies)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='JWT authentication benchmark')
+    parser.add_argument('--requests', type=int, default=1000)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.contrib.auth import get_user_model
+    from django.urls import reverse
+    from rest_framework.test import APIClient
+    from rest_framework_simplejwt.authentication import JWTAuthentication
+    from rest_framework_simplejwt.tokens import AccessToken
+
+    from tasks.authentication import TaskJWTAuthentication
+    from tasks.models import Task
+
+    with benchmark_databases():
+        user = get_user_model().objects.create_user(username='bench', password='benchpass', first_name='Bench')
+        task = Task.objects.create(title='Bench task', status='new', user=user)
+
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(user)}')
+        url = reverse('task-detail', args=[task.id])
+
+        rows = [run(auth_class, client, url, args.requests)
+                for auth_class in (JWTAuthentication, TaskJWTAuthentication)]
+        print_table(rows, ['auth', 'queries_per_request', 'p50_ms', 'p95_ms', 'p99_ms', 'mean_ms'])
+
+
+if __name__ == '__main__':
+    main()
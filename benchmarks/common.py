@@ -0,0 +1,143 @@
+import asyncio
+import io
+import os
+from contextlib import contextmanager
+
+import django
+
+
+# Общие утилиты бенчмарков. Бенчмарки создают отдельную тестовую БД
+# (как `manage.py test`) и удаляют ее после прогона, поэтому их можно
+# запускать против локального PostgreSQL или SQLite:
+#   DB_ENGINE=django.db.backends.sqlite3 DB_NAME=bench.sqlite3 python -m benchmarks.<name>
+
+def setup_django():
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'todo_list_app.settings')
+    django.setup()
+
+
+# keepdb=True - БД не удаляется после прогона и используется повторно
+# (например, чтобы не заполнять заново большой объем данных)
+@contextmanager
+def benchmark_databases(verbosity=0, keepdb=False):
+    from django.test.utils import (
+        setup_databases, setup_test_environment, teardown_databases, teardown_test_environment,
+    )
+
+    setup_test_environment()
+    old_config = setup_databases(verbosity=verbosity, interactive=False, keepdb=keepdb)
+    try:
+        yield
+    finally:
+        teardown_databases(old_config, verbosity=verbosity, keepdb=keepdb)
+        teardown_test_environment()
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, round(q / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+# Сводка по задержкам (секунды) в миллисекундах
+def summarize_latencies(latencies):
+    return {
+        'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 3),
+        'mean_ms': round(sum(latencies) / len(latencies) * 1000, 3) if latencies else 0.0,
+    }
+
+
+def print_table(rows, columns, file=None):
+    widths = {column: max(len(column), *(len(str(row[column])) for row in rows)) for column in columns}
+    print('  '.join(column.ljust(widths[column]) for column in columns), file=file)
+    for row in rows:
+        print('  '.join(str(row[column]).ljust(widths[column]) for column in columns), file=file)
+
+
+# Ограничение частоты (tasks/throttling.py) отключается на время бенчмарка:
+# иначе нагрузка упирается в лимиты, а не в производительность
+@contextmanager
+def disable_throttling(disabled=True):
+    if not disabled:
+        yield
+        return
+    from unittest import mock
+
+    from tasks.throttling import TokenBucketThrottle
+
+    with mock.patch.object(TokenBucketThrottle, 'allow_request', lambda self, request, view: True):
+        yield
+
+
+# Запрос к WSGI-приложению без сетевого сервера: (статус, заголовки, тело).
+# Имена заголовков ответа - в нижнем регистре
+def wsgi_request(app, method, path, query_string='', headers=None, body=b''):
+    environ = {
+        'REQUEST_METHOD': method, 'PATH_INFO': path, 'QUERY_STRING': query_string,
+        'SERVER_NAME': 'testserver', 'SERVER_PORT': '80', 'SERVER_PROTOCOL': 'HTTP/1.1',
+        'REMOTE_ADDR': '127.0.0.1', 'HTTP_HOST': 'testserver',
+        'CONTENT_LENGTH': str(len(body)), 'wsgi.input': io.BytesIO(body),
+        'wsgi.url_scheme': 'http', 'wsgi.errors': io.StringIO(),
+        'wsgi.multithread': True, 'wsgi.multiprocess': False, 'wsgi.run_once': False,
+    }
+    for name, value in (headers or {}).items():
+        key = name.upper().replace('-', '_')
+        environ[key if key == 'CONTENT_TYPE' else f'HTTP_{key}'] = value
+
+    started = {}
+
+    def start_response(status, response_headers, exc_info=None):
+        started['status'] = int(status.split(' ', 1)[0])
+        started['headers'] = {name.lower(): value for name, value in response_headers}
+
+    result = app(environ, start_response)
+    try:
+        content = b''.join(result)
+    finally:
+        if hasattr(result, 'close'):
+            result.close()
+    return started['status'], started['headers'], content
+
+
+# Запрос к ASGI-приложению без сетевого сервера: (статус, заголовки, тело).
+# Тело запроса отдается один раз, затем клиент "держит соединение" до
+# конца ответа (как медленный клиент, а не отключившийся)
+async def asgi_request(app, method, path, query_string='', headers=None, body=b''):
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1',
+        'method': method, 'scheme': 'http', 'path': path, 'raw_path': path.encode(),
+        'query_string': query_string.encode(), 'root_path': '',
+        'headers': [(b'host', b'testserver'), (b'content-length', str(len(body)).encode())] + [
+            (name.lower().encode(), value.encode()) for name, value in (headers or {}).items()
+        ],
+        'client': ('127.0.0.1', 50000), 'server': ('testserver', 80),
+    }
+    request_sent = False
+    disconnected = asyncio.Event()
+
+    async def receive():
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {'type': 'http.request', 'body': body, 'more_body': False}
+        await disconnected.wait()
+        return {'type': 'http.disconnect'}
+
+    response = {'status': None, 'headers': {}, 'body': []}
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            response['status'] = message['status']
+            response['headers'] = {name.decode().lower(): value.decode() for name, value in message['headers']}
+        elif message['type'] == 'http.response.body':
+            response['body'].append(message.get('body', b''))
+
+    try:
+        await app(scope, receive, send)
+    finally:
+        disconnected.set()
+    return response['status'], response['headers'], b''.join(response['body'])
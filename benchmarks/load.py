@@ -0,0 +1,350 @@
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import re
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from .common import (
+    asgi_request, benchmark_databases, disable_throttling, print_table, setup_django,
+    summarize_latencies, wsgi_request,
+)
+
+
+# Нагрузочный тест API задач: заполняет БД пользователями и задачами
+# (bulk_create пакетами), затем по очереди нагружает каждый эндпоинт
+# tasks/urls.py конкурентными клиентами через WSGI- или ASGI-приложение
+# Django в том же процессе (без сетевого сервера и внешних сервисов).
+# Для каждого эндпоинта - p50/p95/p99, запросов в секунду и SQL-запросов
+# на запрос (из заголовка Server-Timing, tasks/instrumentation.py).
+# Результат - JSON (--output), чтобы сравнивать прогоны между собой.
+#
+#   DB_ENGINE=django.db.backends.sqlite3 DB_NAME=load.sqlite3 \
+#       python -m benchmarks.load --users 10000 --tasks 1000000 --keepdb \
+#       --server asgi --concurrency 20 --requests 500 --output results.json
+#
+# --keepdb сохраняет заполненную тестовую БД между прогонами (повторное
+# заполнение пропускается). Ограничение частоты (tasks/throttling.py) на
+# время теста выключено, если не указан --throttling.
+
+LOAD_PASSWORD = 'loadpass1'
+METRICS_TOKEN = 'load-metrics'
+WORDS = ['report', 'invoice', 'deploy', 'review', 'meeting', 'backup', 'release', 'budget',
+         'design', 'support', 'migration', 'audit', 'training', 'hiring', 'roadmap', 'cleanup']
+STATUSES = ['new', 'in_progress', 'completed']
+
+# Эндпоинты без модели "запрос - ответ"
+SKIPPED = {
+    'task-events': 'SSE stream: a long-lived connection, latency is not meaningful',
+}
+
+SERVER_TIMING_QUERIES = re.compile(r'desc="(\d+) queries"')
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(itertools.islice(iterator, size)):
+        yield batch
+
+
+def seed(users, tasks, batch_size, rng):
+    from django.contrib.auth import get_user_model
+    from django.contrib.auth.hashers import make_password
+
+    from tasks.models import Task
+
+    User = get_user_model()
+    if Task.objects.exists():
+        print('Using existing data (--keepdb).', file=sys.stderr)
+        return
+
+    start = time.perf_counter()
+    # Один хэш пароля на всех: PBKDF2 на каждого пользователя занял бы минуты
+    password = make_password(LOAD_PASSWORD)
+    User.objects.create_user(username='loadadmin', password=LOAD_PASSWORD, first_name='Load', is_staff=True)
+    for batch in batched(range(users), batch_size):
+        User.objects.bulk_create([
+            User(username=f'load{i}', first_name='Load', password=password) for i in batch
+        ])
+    user_ids = list(User.objects.filter(username__startswith='load', is_staff=False).values_list('id', flat=True))
+
+    def rows():
+        for i in range(tasks):
+            yield Task(
+                title=f'{rng.choice(WORDS)} {rng.choice(WORDS)} {i}',
+                description=' '.join(rng.choices(WORDS, k=6)) if i % 3 else None,
+                status=rng.choice(STATUSES),
+                user_id=user_ids[i % len(user_ids)],
+            )
+
+    created = 0
+    for batch in batched(rows(), batch_size):
+        Task.objects.bulk_create(batch)
+        created += len(batch)
+        if created % (batch_size * 20) == 0:
+            print(f'Seeded {created}/{tasks} tasks', file=sys.stderr)
+    print(f'Seeded {users} users, {tasks} tasks in {time.perf_counter() - start:.1f}s', file=sys.stderr)
+
+
+# Клиенты теста: выборка пользователей с токенами и id их задач
+class LoadContext:
+
+    def __init__(self, sample_users, rng):
+        from django.contrib.auth import get_user_model
+        from rest_framework_simplejwt.tokens import RefreshToken
+
+        from tasks.models import Task
+
+        User = get_user_model()
+        ids = list(User.objects.filter(username__startswith='load', is_staff=False).values_list('id', flat=True))
+        users = User.objects.filter(id__in=rng.sample(ids, min(sample_users, len(ids))))
+        self.clients = []
+        for user in users:
+            refresh = RefreshToken.for_user(user)
+            task_ids = list(Task.objects.filter(user=user).order_by('id').values_list('id', flat=True)[:1000])
+            self.clients.append({
+                'username': user.username,
+                'access': str(refresh.access_token),
+                'refresh': str(refresh),
+                'task_ids': task_ids,
+            })
+        self.admin_access = str(RefreshToken.for_user(User.objects.get(username='loadadmin')).access_token)
+
+    def client(self, rng):
+        return rng.choice(self.clients)
+
+
+def auth(client):
+    return {'Authorization': f"Bearer {client['access']}"}
+
+
+def json_body(data):
+    return {'Content-Type': 'application/json'}, json.dumps(data).encode()
+
+
+def get(path, query='', headers=None):
+    return 'GET', path, query, headers or {}, b''
+
+
+def send(method, path, headers, data):
+    content_headers, body = json_body(data)
+    return method, path, '', {**headers, **content_headers}, body
+
+
+def own_task(client, rng):
+    return rng.choice(client['task_ids']) if client['task_ids'] else 0
+
+
+# Сценарий эндпоинта: имя URL -> (построение запроса, ожидаемые статусы).
+# Построение получает контекст, клиента и генератор случайных чисел
+def scenarios():
+    from django.urls import reverse
+
+    def url(name, *args):
+        return reverse(name, args=args)
+
+    def delete(ctx, client, rng):
+        # Каждая задача удаляется один раз
+        task_id = client['task_ids'].pop() if client['task_ids'] else 0
+        return 'DELETE', url('task-delete', task_id), '', auth(client), b''
+
+    return {
+        'task-list': (lambda ctx, c, rng: get(url('task-list'), f'page={rng.randint(1, 20)}', auth(c)), {200}),
+        'task-list:cursor': (lambda ctx, c, rng: get(url('task-list'), 'pagination=cursor', auth(c)), {200}),
+        'user-task-list': (lambda ctx, c, rng: get(url('user-task-list', c['username']), '', auth(c)), {200}),
+        'user-task-sync': (lambda ctx, c, rng: get(url('user-task-sync', c['username']), 'limit=100', auth(c)),
+                           {200}),
+        'task-detail': (lambda ctx, c, rng: get(url('task-detail', own_task(c, rng)), '', auth(c)), {200}),
+        'task-create': (lambda ctx, c, rng: send('POST', url('task-create'), auth(c),
+                                                 {'title': f'{rng.choice(WORDS)} load', 'status': 'new'}), {201}),
+        'task-update': (lambda ctx, c, rng: send('PATCH', url('task-update', own_task(c, rng)), auth(c),
+                                                 {'title': f'{rng.choice(WORDS)} updated'}), {200}),
+        'task-delete': (delete, {200}),
+        'task-complete': (lambda ctx, c, rng: send('PUT', url('task-complete', own_task(c, rng)), auth(c), {}),
+                          {200}),
+        'task-bulk': (lambda ctx, c, rng: send('POST', url('task-bulk'), auth(c), {'operations': [
+            {'op': 'create', 'data': {'title': f'{rng.choice(WORDS)} bulk', 'status': 'new'}},
+            {'op': 'update', 'id': own_task(c, rng), 'data': {'status': 'in_progress'}},
+            {'op': 'complete', 'id': own_task(c, rng)},
+        ]}), {200}),
+        'task-export': (lambda ctx, c, rng: get(url('task-export'), f"user={c['username']}&output=ndjson", auth(c)),
+                        {200}),
+        'task-search': (lambda ctx, c, rng: get(url('task-search'), f'q={rng.choice(WORDS)}', auth(c)), {200}),
+        'task-filter-by-status': (lambda ctx, c, rng: get(url('task-filter-by-status', rng.choice(STATUSES)),
+                                                          f'page={rng.randint(1, 5)}', auth(c)), {200}),
+        'task-stats': (lambda ctx, c, rng: get(url('task-stats'), '', auth(c)), {200}),
+        'user-task-stats-list': (lambda ctx, c, rng: get(url('user-task-stats-list'), '', auth(c)), {200}),
+        'user-task-stats': (lambda ctx, c, rng: get(url('user-task-stats', c['username']), '', auth(c)), {200}),
+        'task-cache-stats': (lambda ctx, c, rng: get(url('task-cache-stats'), '',
+                                                     {'Authorization': f'Bearer {ctx.admin_access}'}), {200}),
+        'task-metrics': (lambda ctx, c, rng: get(url('task-metrics'), '',
+                                                 {'Authorization': f'Bearer {METRICS_TOKEN}'}), {200}),
+        'async-task-list': (lambda ctx, c, rng: get(url('async-task-list'), f'page={rng.randint(1, 20)}', auth(c)),
+                            {200}),
+        'async-user-task-list': (lambda ctx, c, rng: get(url('async-user-task-list', c['username']), '', auth(c)),
+                                 {200}),
+        'async-task-detail': (lambda ctx, c, rng: get(url('async-task-detail', own_task(c, rng)), '', auth(c)),
+                              {200}),
+        'async-task-filter-by-status': (lambda ctx, c, rng: get(url('async-task-filter-by-status',
+                                                                    rng.choice(STATUSES)), '', auth(c)), {200}),
+        'token-obtain-pair': (lambda ctx, c, rng: send('POST', url('token-obtain-pair'), {},
+                                                       {'username': c['username'], 'password': LOAD_PASSWORD}), {200}),
+        'token-refresh': (lambda ctx, c, rng: send('POST', url('token-refresh'), {}, {'refresh': c['refresh']}),
+                          {200}),
+    }
+
+
+def check_coverage(names):
+    from tasks.urls import urlpatterns
+
+    url_names = {pattern.name for pattern in urlpatterns}
+    covered = {name.split(':')[0] for name in names}
+    missing = url_names - covered - SKIPPED.keys()
+    for name in sorted(missing):
+        print(f'WARNING: no load scenario for {name!r}', file=sys.stderr)
+
+
+def record(results, latencies, start, response, expected):
+    status, headers, _ = response
+    latencies.append(time.perf_counter() - start)
+    match = SERVER_TIMING_QUERIES.search(headers.get('server-timing', ''))
+    with results['lock']:
+        results['queries'] += int(match.group(1)) if match else 0
+        if status not in expected:
+            results['errors'] += 1
+            results['statuses'][status] = results['statuses'].get(status, 0) + 1
+
+
+def run_wsgi(app, build, expected, ctx, concurrency, requests, rng_seed):
+    from django.db import connections
+
+    latencies, counter = [], itertools.count()
+    results = {'lock': threading.Lock(), 'queries': 0, 'errors': 0, 'statuses': {}}
+
+    def worker(index):
+        rng = random.Random(rng_seed + index)
+        try:
+            while next(counter) < requests:
+                method, path, query, headers, body = build(ctx, ctx.client(rng), rng)
+                start = time.perf_counter()
+                response = wsgi_request(app, method, path, query, headers, body)
+                record(results, latencies, start, response, expected)
+        finally:
+            connections.close_all()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as executor:
+        list(executor.map(worker, range(concurrency)))
+    return latencies, results, time.perf_counter() - start
+
+
+def run_asgi(app, build, expected, ctx, concurrency, requests, rng_seed):
+    latencies, counter = [], itertools.count()
+    results = {'lock': threading.Lock(), 'queries': 0, 'errors': 0, 'statuses': {}}
+
+    async def client(index):
+        rng = random.Random(rng_seed + index)
+        while next(counter) < requests:
+            method, path, query, headers, body = build(ctx, ctx.client(rng), rng)
+            start = time.perf_counter()
+            response = await asgi_request(app, method, path, query, headers, body)
+            record(results, latencies, start, response, expected)
+
+    async def main():
+        await asyncio.gather(*(client(index) for index in range(concurrency)))
+
+    start = time.perf_counter()
+    asyncio.run(main())
+    return latencies, results, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test of the task API')
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--tasks', type=int, default=100000)
+    parser.add_argument('--batch-size', type=int, default=5000, help='Rows per bulk_create.')
+    parser.add_argument('--keepdb', action='store_true', help='Keep and reuse the seeded test database.')
+    parser.add_argument('--server', choices=['wsgi', 'asgi'], default='wsgi')
+    parser.add_argument('--concurrency', type=int, default=10)
+    parser.add_argument('--requests', type=int, default=200, help='Requests per endpoint.')
+    parser.add_argument('--sample-users', type=int, default=100, help='Distinct users issuing requests.')
+    parser.add_argument('--endpoints', nargs='+', help='URL names to run (default: all).')
+    parser.add_argument('--throttling', action='store_true', help='Keep rate limiting enabled.')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='Write JSON results to this file (default: stdout).')
+    args = parser.parse_args()
+
+    setup_django()
+    import django
+    from django.conf import settings
+    from django.db import connection
+    from django.test.utils import override_settings
+
+    # SQLite: тестовая БД в файле, а не в памяти - ее можно сохранить
+    # (--keepdb), и она доступна из потоков клиентов. Транзакции IMMEDIATE
+    # с ожиданием блокировки: иначе параллельные записи получают
+    # "database is locked" при повышении блокировки внутри транзакции
+    database = settings.DATABASES['default']
+    if database['ENGINE'].endswith('sqlite3'):
+        test_settings = database.setdefault('TEST', {})
+        if not test_settings.get('NAME'):
+            test_settings['NAME'] = f"{database['NAME']}.load"
+        database.setdefault('OPTIONS', {}).update(transaction_mode='IMMEDIATE', timeout=30)
+
+    all_scenarios = scenarios()
+    check_coverage(all_scenarios)
+    names = args.endpoints or list(all_scenarios)
+    rng = random.Random(args.seed)
+    started_at = datetime.now(timezone.utc).isoformat()
+
+    metrics = override_settings(TASKS_METRICS_ENABLED=True, TASKS_METRICS_SERVER_TIMING=True,
+                                TASKS_METRICS_TOKEN=METRICS_TOKEN, TASKS_SLOW_QUERY_MS=None)
+    with benchmark_databases(keepdb=args.keepdb), metrics, disable_throttling(not args.throttling):
+        seed(args.users, args.tasks, args.batch_size, rng)
+        ctx = LoadContext(args.sample_users, rng)
+
+        if args.server == 'asgi':
+            from django.core.asgi import get_asgi_application
+            app, run = get_asgi_application(), run_asgi
+        else:
+            from django.core.wsgi import get_wsgi_application
+            app, run = get_wsgi_application(), run_wsgi
+
+        rows = []
+        for name in names:
+            build, expected = all_scenarios[name]
+            latencies, results, elapsed = run(app, build, expected, ctx, args.concurrency, args.requests, args.seed)
+            rows.append({
+                'endpoint': name,
+                'requests': len(latencies),
+                'errors': results['errors'],
+                'error_statuses': results['statuses'],
+                'rps': round(len(latencies) / elapsed, 1),
+                'queries_per_request': round(results['queries'] / len(latencies), 2) if latencies else 0.0,
+                **summarize_latencies(latencies),
+            })
+            print(f'{name}: {rows[-1]["rps"]} rps', file=sys.stderr)
+
+        report = {
+            'started_at': started_at,
+            'config': {**vars(args), 'database': connection.vendor, 'django': django.get_version()},
+            'results': rows,
+        }
+
+    print_table(rows, ['endpoint', 'requests', 'errors', 'rps', 'queries_per_request',
+                       'p50_ms', 'p95_ms', 'p99_ms'], file=sys.stderr)
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as file:
+            file.write(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
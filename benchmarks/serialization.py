@@ -0,0 +1,63 @@
+import argparse
+import time
+
+from .common import benchmark_databases, print_table, setup_django
+
+
+# Микробенчмарк сериализации страниц списка: TaskSerializer по моделям
+# против ValuesSerializer по строкам .values(). Выборка и сериализация
+# измеряются отдельно, результат - строк в секунду.
+#   python -m benchmarks.serialization --page-size 100 --repeat 200
+
+def run(name, fetch, serialize, repeat):
+    fetch_time = serialize_time = 0.0
+    rows_total = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        rows = fetch()
+        fetched = time.perf_counter()
+        data = serialize(rows)
+        serialize_time += time.perf_counter() - fetched
+        fetch_time += fetched - start
+        rows_total += len(data)
+
+    return {
+        'serializer': name,
+        'rows': rows_total,
+        'serialize_rows_per_sec': round(rows_total / serialize_time),
+        'total_rows_per_sec': round(rows_total / (fetch_time + serialize_time)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Task list serialization benchmark')
+    parser.add_argument('--page-size', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.contrib.auth import get_user_model
+
+    from tasks.models import Task
+    from tasks.serializers import TaskSerializer
+    from tasks.values import task_values_serializer
+
+    with benchmark_databases():
+        user = get_user_model().objects.create_user(username='bench', password='benchpass', first_name='Bench')
+        Task.objects.bulk_create([
+            Task(title=f'Task {i}', description='Bench task' if i % 2 else None, status='new', user=user)
+            for i in range(args.page_size)
+        ])
+        queryset = Task.objects.order_by('-id')[:args.page_size]
+
+        rows = [
+            run('TaskSerializer', lambda: list(queryset.all()),
+                lambda tasks: TaskSerializer(tasks, many=True).data, args.repeat),
+            run('ValuesSerializer', lambda: list(queryset.values(*task_values_serializer.columns)),
+                task_values_serializer.to_representation, args.repeat),
+        ]
+        print_table(rows, ['serializer', 'rows', 'serialize_rows_per_sec', 'total_rows_per_sec'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,14 @@
+#!/bin/sh
+# Запуск приложения в продакшене: миграции (по желанию), статика админки и
+# gunicorn с ASGI/WSGI-воркерами (gunicorn.conf.py). Параметры - из окружения.
+set -e
+
+export DJANGO_SETTINGS_MODULE="${DJANGO_SETTINGS_MODULE:-todo_list_app.settings_production}"
+
+if [ "${RUN_MIGRATIONS:-0}" = "1" ]; then
+    python manage.py migrate --noinput
+fi
+
+python manage.py collectstatic --noinput -v 0
+
+exec gunicorn -c gunicorn.conf.py
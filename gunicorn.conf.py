@@ -0,0 +1,35 @@
+import multiprocessing
+import os
+
+
+# Конфигурация gunicorn для продакшена (entrypoint.sh).
+# По умолчанию - ASGI-воркеры uvicorn: они обслуживают и обычные запросы,
+# и долгие SSE-соединения (/api/tasks/events/), не занимая поток на каждое.
+# SERVER_MODE=wsgi - классические потоковые воркеры gthread.
+
+server_mode = os.getenv('SERVER_MODE', 'asgi')
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.getenv('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+
+if server_mode == 'wsgi':
+    wsgi_app = 'todo_list_app.wsgi:application'
+    worker_class = 'gthread'
+    threads = int(os.getenv('GUNICORN_THREADS', 4))
+else:
+    wsgi_app = 'todo_list_app.asgi:application'
+    worker_class = 'uvicorn.workers.UvicornWorker'
+
+# Запрос дольше timeout считается зависшим, воркер перезапускается.
+# Для ASGI-воркеров это контроль "живости" процесса, SSE-соединения он не обрывает.
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 30))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', 5))
+
+# Периодический перезапуск воркеров ограничивает рост памяти
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 10000))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', 1000))
+
+accesslog = os.getenv('GUNICORN_ACCESS_LOG', '-')
+errorlog = '-'
+loglevel = os.getenv('GUNICORN_LOG_LEVEL', 'info')
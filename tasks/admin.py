@@ -1,10 +1,68 @@
+import json
+from functools import cached_property
+
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 from django.contrib.auth import get_user_model
+from django.core.paginator import Paginator
+from django.db import connections, transaction
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
+from .cache import invalidate_task_lists
+from .models import Task, TaskTombstone
+from .search import search_tasks
+from .signals import tasks_changed
+
 User = get_user_model()
 
+
+# Число строк таблицы по статистике PostgreSQL (pg_class.reltuples,
+# обновляется autovacuum/ANALYZE) или None, если оценки нет
+def estimate_table_rows(model, using):
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', [model._meta.db_table])
+        row = cursor.fetchone()
+    # -1 - таблица еще не анализировалась
+    return row[0] if row is not None and row[0] >= 0 else None
+
+
+# Оценка числа строк запроса по плану PostgreSQL (EXPLAIN без выполнения)
+def estimate_query_rows(queryset):
+    if connections[queryset.db].vendor != 'postgresql':
+        return None
+    plan = json.loads(queryset.order_by().explain(format='json'))
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+# Пагинатор админки для больших таблиц - без COUNT(*) по миллионам строк.
+# Без фильтров и поиска - оценка pg_class.reltuples. С фильтрами - точный
+# COUNT по подзапросу с LIMIT exact_count_limit + 1 (по индексу фильтра), а
+# если строк больше - оценка по плану запроса. Оценка может отличаться от
+# точного числа: последние страницы могут оказаться пустыми или недоступными.
+class EstimatedCountPaginator(Paginator):
+    exact_count_limit = 10000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimate_table_rows(queryset.model, queryset.db)
+            if estimate is not None and estimate > self.exact_count_limit:
+                return estimate
+
+        count = queryset[:self.exact_count_limit + 1].count()
+        if count <= self.exact_count_limit:
+            return count
+        estimate = estimate_query_rows(queryset)
+        if estimate is None:
+            return queryset.count()
+        return max(estimate, count)
+
+
 # Создаем кастомный класс для отображения всех полей
 class CustomUserAdmin(UserAdmin):
     fieldsets = (
@@ -24,8 +82,88 @@ class CustomUserAdmin(UserAdmin):
     list_display = ('username', 'first_name', 'last_name', 'is_staff')
     search_fields = ('username', 'first_name', 'last_name', 'email')
     ordering = ('username',)
+    # Без COUNT(*) по всей таблице пользователей
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
-# Регистрируем кастомный класс
-admin.site.register(User, CustomUserAdmin)
 
+# Админка задач для больших таблиц: оценочное число строк, пользователь
+# задачи - одним JOIN, фильтр и сортировка - только по индексированным
+# колонкам (status, -id), поиск - по id, username или GIN-индексу
+# полнотекстового поиска вместо LIKE '%...%'. Изменения через админку
+# сбрасывают кэш списков и попадают в ленту событий и синхронизацию,
+# как изменения через API.
+class TaskAdmin(admin.ModelAdmin):
+    list_display = ('id', 'title', 'status', 'user', 'updated_at')
+    list_select_related = ('user',)
+    list_filter = ('status',)
+    ordering = ('-id',)
+    sortable_by = ('id',)
+    search_fields = ('title', 'description')
+    search_help_text = _('Task id, @username or words from the title and description.')
+    raw_id_fields = ('user',)
+    readonly_fields = ('updated_at',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    actions = ['mark_completed']
+
+    # Поиск по первичному ключу, уникальному username или search_vector
+    def get_search_results(self, request, queryset, search_term):
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+        if term.isdigit():
+            return queryset.filter(pk=int(term)), False
+        if term.startswith('@'):
+            return queryset.filter(user__username=term[1:]), False
+        return search_tasks(queryset, term), False
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        invalidate_task_lists(usernames=[obj.user.username],
+                              statuses={form.initial.get('status', obj.status), obj.status})
+
+    def delete_model(self, request, obj):
+        self.delete_queryset(request, Task.objects.filter(pk=obj.pk))
 
+    # Одним DELETE, с метками удаления для инкрементальной синхронизации
+    def delete_queryset(self, request, queryset):
+        with transaction.atomic():
+            rows = list(queryset.order_by().values_list('id', 'user_id', 'user__username', 'status'))
+            Task.objects.filter(pk__in=[task_id for task_id, _, _, _ in rows]).delete()
+            TaskTombstone.objects.bulk_create([
+                TaskTombstone(task_id=task_id, user_id=user_id, status=task_status)
+                for task_id, user_id, _, task_status in rows
+            ])
+            tasks_changed.send(sender=Task, changes=[
+                {'type': 'deleted', 'task': {'id': task_id, 'user': user_id, 'status': task_status},
+                 'previous_status': task_status}
+                for task_id, user_id, _, task_status in rows
+            ])
+            invalidate_task_lists(usernames={username for _, _, username, _ in rows},
+                                  statuses={task_status for _, _, _, task_status in rows})
+
+    # Один UPDATE на все выбранные задачи вместо save() каждой
+    @admin.action(description=_('Mark selected tasks as completed'))
+    def mark_completed(self, request, queryset):
+        with transaction.atomic():
+            rows = list(
+                queryset.exclude(status='completed').order_by().select_for_update(of=('self',))
+                .values_list('id', 'user_id', 'user__username', 'status')
+            )
+            Task.objects.filter(pk__in=[task_id for task_id, _, _, _ in rows]).update(
+                status='completed', updated_at=timezone.now()
+            )
+            tasks_changed.send(sender=Task, changes=[
+                {'type': 'completed', 'task': {'id': task_id, 'user': user_id, 'status': 'completed'},
+                 'previous_status': task_status}
+                for task_id, user_id, _, task_status in rows
+            ])
+            invalidate_task_lists(usernames={username for _, _, username, _ in rows},
+                                  statuses={'completed', *(task_status for _, _, _, task_status in rows)})
+        self.message_user(request, _('Tasks marked as completed: %(count)d') % {'count': len(rows)})
+
+
+# Регистрируем кастомный класс
+admin.site.register(User, CustomUserAdmin)
+admin.site.register(Task, TaskAdmin)
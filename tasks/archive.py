@@ -0,0 +1,89 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import router, transaction
+from django.utils import timezone
+
+from .merge import MergedQuerySet
+from .models import ArchivedTask, Task
+
+
+# Архив завершенных задач. Задачи, завершенные (MarkTaskCompletedView,
+# TaskUpdateView, пакетные операции) дольше TASKS_ARCHIVE_AFTER_DAYS дней
+# назад, команда archive_completed_tasks переносит из Task в ArchivedTask:
+# таблица задач и ее индексы остаются размером с "горячие" данные.
+#
+#   - Чтение: списки (все задачи, задачи пользователя, фильтр по статусу
+#     completed) и задача по id читают Task и архив и сливают результаты по
+#     -id (MergedQuerySet); ответы те же, что и до переноса.
+#   - Запись: изменение, завершение и пакетные операции над задачей из
+#     архива сначала возвращают ее в Task (restore_archived_tasks),
+#     удаление удаляет ее прямо из архива.
+#   - Счетчики TaskCounter учитывают задачи архива (триггеры).
+#   - Выгрузка и синхронизация (полная и инкрементальная) включают архив;
+#     поиск работает только с Task.
+#
+# Без TASKS_ARCHIVE_AFTER_DAYS архив не используется и запросов к нему нет.
+
+ARCHIVED_FIELDS = ('id', 'title', 'description', 'status', 'user_id', 'updated_at')
+
+
+def archive_enabled():
+    return getattr(settings, 'TASKS_ARCHIVE_AFTER_DAYS', None) is not None
+
+
+# Запрос к задачам вместе с архивом: make_queryset(модель) строит один и тот
+# же запрос к Task и ArchivedTask. include_archive=False (например, фильтр
+# по незавершенному статусу) или выключенный архив - только Task
+def with_archive(make_queryset, include_archive=True):
+    queryset = make_queryset(Task)
+    if not include_archive or not archive_enabled():
+        return queryset
+    return MergedQuerySet([queryset, make_queryset(ArchivedTask)])
+
+
+def archive_cutoff(days=None):
+    if days is None:
+        days = settings.TASKS_ARCHIVE_AFTER_DAYS
+    return timezone.now() - timedelta(days=days)
+
+
+# Один пакет переноса в БД using: до batch_size завершенных до cutoff задач
+# с id больше after_id. Копирование и удаление - в одной транзакции, поэтому
+# прерванный перенос не оставляет задачу ни в двух местах, ни ни в одном.
+# Строки, заблокированные конкурентной записью, пропускаются (SKIP LOCKED) и
+# переносятся следующим запуском. Возвращает id перенесенных задач.
+def archive_batch(using, cutoff, after_id, batch_size):
+    with transaction.atomic(using=using):
+        rows = list(
+            Task.objects.using(using)
+            .filter(status='completed', updated_at__lt=cutoff, id__gt=after_id)
+            .order_by('id').select_for_update(skip_locked=True)
+            .values(*ARCHIVED_FIELDS)[:batch_size]
+        )
+        if not rows:
+            return []
+        ids = [row['id'] for row in rows]
+        ArchivedTask.objects.using(using).bulk_create(
+            [ArchivedTask(**row) for row in rows], ignore_conflicts=True,
+        )
+        Task.objects.using(using).filter(id__in=ids).delete()
+    return ids
+
+
+# Возврат задач пользователя из архива в Task перед изменением (в БД задач
+# пользователя). Возвращает число возвращенных задач
+def restore_archived_tasks(task_ids, user_id):
+    if not archive_enabled():
+        return 0
+    using = router.db_for_write(Task)
+    with transaction.atomic(using=using):
+        rows = list(
+            ArchivedTask.objects.using(using).filter(id__in=task_ids, user_id=user_id)
+            .select_for_update().values(*ARCHIVED_FIELDS)
+        )
+        if not rows:
+            return 0
+        Task.objects.using(using).bulk_create([Task(**row) for row in rows])
+        ArchivedTask.objects.using(using).filter(id__in=[row['id'] for row in rows]).delete()
+    return len(rows)
@@ -0,0 +1,217 @@
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.http import HttpResponse
+from django.views import View
+from rest_framework.exceptions import APIException, AuthenticationFailed, NotAuthenticated, NotFound, Throttled
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.views import exception_handler
+
+from .archive import with_archive
+from .authentication import TaskJWTAuthentication
+from .cache import (
+    aget_version, cache_stats, get_cache, list_cache_key, list_cache_keys, list_cache_timeout,
+)
+from .conditional import etag_matches, make_etag, make_list_etag, not_modified, task_marker
+from .instrumentation import measure_serialization
+from .models import Task
+from .pagination import AsyncPageNumberPagination, AsyncTaskCursorPagination, SelectablePaginationMixin
+from .renderers import FastJSONRenderer
+from .routers import achoose_read_alias, reading_from, reading_replica
+from .serializers import TaskSerializer
+from .sharding import aget_username_shard, scatter, sharding_enabled, using_shard
+from .values import SparseFieldsetMixin
+
+
+# Асинхронные варианты представлений чтения (список, задачи пользователя,
+# задача по id, фильтр по статусу). Под ASGI запрос не занимает поток
+# на все время обработки: аутентификация, выборка и кэш - через
+# асинхронный ORM и асинхронный API кэша. Ответы совпадают с синхронными
+# представлениями (tasks/views.py); формат - только JSON, без Browsable API.
+
+# Обработка запроса в стиле APIView: DRF Request (query_params, абсолютные
+# ссылки), JWT-аутентификация, исключения DRF -> ответы с тем же телом
+# и заголовками, что и у синхронных представлений. Ответ строит корутина
+# aget(request, *args, **kwargs) подкласса или миксина: get() вызывает ее
+# после аутентификации, throttling и выбора реплики.
+class AsyncAPIView(View):
+    http_method_names = ['get', 'head', 'options']
+    authentication_class = TaskJWTAuthentication
+    renderer_class = FastJSONRenderer
+    throttle_classes = api_settings.DEFAULT_THROTTLE_CLASSES
+    www_authenticate_realm = 'api'
+
+    async def get(self, request, *args, **kwargs):
+        self.request = request = Request(request)
+        request.accepted_renderer = self.renderer_class()
+        request.accepted_media_type = request.accepted_renderer.media_type
+        try:
+            auth = await self.authentication_class().aauthenticate(request)
+            if auth is None:
+                raise NotAuthenticated()
+            request.user, request.auth = auth
+            await sync_to_async(self.check_throttles)(request)
+            # Чтение с реплики, как у синхронных представлений (ReplicaReadMixin)
+            with reading_from(await achoose_read_alias(request.user.username)):
+                response = await self.aget(request, *args, **kwargs)
+        except APIException as exc:
+            response = self.handle_exception(exc)
+        return self.render(request, response)
+
+    # Те же throttle-классы и ответ 429, что и у APIView
+    def check_throttles(self, request):
+        durations = []
+        for throttle in [throttle_class() for throttle_class in self.throttle_classes]:
+            if not throttle.allow_request(request, self):
+                durations.append(throttle.wait())
+        if durations:
+            raise Throttled(wait=max((duration for duration in durations if duration is not None), default=None))
+
+    def handle_exception(self, exc):
+        if isinstance(exc, (NotAuthenticated, AuthenticationFailed)):
+            exc.auth_header = f'Bearer realm="{self.www_authenticate_realm}"'
+        return exception_handler(exc, {'view': self, 'request': self.request})
+
+    # Ответ рендерится здесь же, а не обработчиком Django: тот вызывает
+    # render() шаблонных ответов (Response) через sync_to_async
+    def render(self, request, response):
+        renderer = request.accepted_renderer
+        content = renderer.render(response.data, renderer.media_type, {
+            'view': self, 'request': request, 'response': response,
+        })
+        rendered = HttpResponse(content, status=response.status_code, content_type=renderer.media_type)
+        for name, value in response.items():
+            if name.lower() != 'content-type':
+                rendered[name] = value
+        rendered['Allow'] = 'GET, HEAD, OPTIONS'
+        return rendered
+
+
+# Страница списка через .values() и ValuesSerializer (как ValuesListMixin,
+# с ?fields= / ?exclude=), ETag и 304 (как ListETagMixin), выбор пагинации
+# ?pagination=cursor
+class AsyncTaskListMixin(SparseFieldsetMixin, SelectablePaginationMixin):
+    pagination_class = AsyncPageNumberPagination
+    cursor_pagination_class = AsyncTaskCursorPagination
+
+    # Слияние по -id страниц Task и архива на всех шардах
+    def get_queryset(self):
+        return scatter(with_archive(lambda model: model.objects.order_by('-id')))
+
+    async def aget(self, request, *args, **kwargs):
+        return await self.alist(request)
+
+    async def apaginate_queryset(self, queryset):
+        return await self.paginator.apaginate_queryset(queryset, self.request, view=self)
+
+    async def alist(self, request):
+        values_serializer = self.get_values_serializer()
+        queryset = self.get_queryset().values(*values_serializer.columns)
+        page = await self.apaginate_queryset(queryset)
+        rows = page if page is not None else [row async for row in queryset]
+
+        etag = make_list_etag(request, self.paginator, rows)
+        if etag_matches(request, etag):
+            return not_modified(etag)
+
+        with measure_serialization():
+            data = values_serializer.to_representation(rows)
+        if page is not None:
+            response = self.paginator.get_paginated_response(data)
+        else:
+            response = Response(data)
+        response['ETag'] = etag
+        return response
+
+
+# Версионированный кэш списков (как VersionedListCacheMixin): те же версии
+# областей, поэтому инвалидация при записи сбрасывает и эти ответы
+class AsyncVersionedListCacheMixin:
+    cache_scope = None
+    cache_scope_kwarg = None
+
+    async def alist(self, request):
+        cache = get_cache()
+        version = await aget_version(self.cache_scope, self.kwargs.get(self.cache_scope_kwarg))
+        replica = reading_replica()
+        keys = list_cache_keys(list_cache_key(self.cache_scope, version, request), replica)
+        found = await cache.aget_many(keys)
+        cached = next((found[key] for key in keys if key in found), None)
+        if cached is not None:
+            cache_stats.record(hit=True)
+            etag = cached['etag']
+            if etag and etag_matches(request, etag):
+                return not_modified(etag)
+            response = Response(cached['data'])
+            if etag:
+                response['ETag'] = etag
+            return response
+
+        cache_stats.record(hit=False)
+        response = await super().alist(request)
+        # Ответы с реплики - под своим ключом и недолго (см. VersionedListCacheMixin)
+        if response.status_code == 200:
+            await cache.aset(keys[-1], {'etag': response.get('ETag'), 'data': response.data},
+                             list_cache_timeout(replica))
+        return response
+
+
+# Получение списка всех задач
+class AsyncTaskListView(AsyncTaskListMixin, AsyncAPIView):
+    pass
+
+
+# Получение задач пользователя по 'username'
+class AsyncUserTasksView(AsyncVersionedListCacheMixin, AsyncTaskListMixin, AsyncAPIView):
+    cache_scope = 'user'
+    cache_scope_kwarg = 'username'
+
+    def get_queryset(self):
+        username = self.kwargs.get('username')
+        return with_archive(lambda model: model.objects.filter(user__username=username).order_by('-id'))
+
+    # Задачи пользователя - только из его шарда (как TaskShardMixin)
+    async def aget(self, request, *args, **kwargs):
+        if not sharding_enabled():
+            return await super().aget(request, *args, **kwargs)
+        with using_shard(await aget_username_shard(self.kwargs.get('username'))):
+            return await super().aget(request, *args, **kwargs)
+
+    async def apaginate_queryset(self, queryset):
+        page = await super().apaginate_queryset(queryset)
+        if not page:
+            User = get_user_model()
+            if not await User.objects.filter(username=self.kwargs.get('username')).aexists():
+                raise NotFound("User not found.")
+        return page
+
+
+# Фильтр задач по статусу
+class AsyncTaskFilterStatusView(AsyncVersionedListCacheMixin, AsyncTaskListMixin, AsyncAPIView):
+    cache_scope = 'status'
+    cache_scope_kwarg = 'status'
+
+    # Завершенные задачи - вместе с архивом
+    def get_queryset(self):
+        status = self.kwargs.get('status')
+        return scatter(with_archive(lambda model: model.objects.filter(status=status).order_by('-id'),
+                                    include_archive=status == 'completed'))
+
+
+# Получение задачи по ее UID
+class AsyncTaskDetailView(SparseFieldsetMixin, AsyncAPIView):
+
+    async def aget(self, request, *args, **kwargs):
+        columns = self.get_values_serializer().columns
+        try:
+            task = await scatter(with_archive(lambda model: model.objects.only(*columns))).aget(pk=kwargs['pk'])
+        except Task.DoesNotExist:
+            raise NotFound("No Task matches the given query.")
+
+        etag = make_etag(request, task_marker(task))
+        if etag_matches(request, etag):
+            return not_modified(etag)
+        with measure_serialization():
+            data = TaskSerializer(task, fields=self.get_fieldset()).data
+        return Response(data, headers={'ETag': etag})
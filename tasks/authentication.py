@@ -0,0 +1,193 @@
+import threading
+import time
+from collections import OrderedDict
+from functools import partial
+from typing import NamedTuple, Optional
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.utils.functional import SimpleLazyObject
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from .cache import aget_version, bump_version, get_version
+
+
+# Состояние пользователя, которое нужно для проверки токена
+class UserState(NamedTuple):
+    is_active: bool
+    username: str
+    password_hash: Optional[str]
+
+
+# Ограниченный по размеру (LRU) и по времени жизни (TTL) кэш состояний
+# пользователей в памяти процесса. Каждая запись хранит версию пользователя
+# из общего кэша (TASKS_CACHE_ALIAS) на момент загрузки; изменение
+# пользователя (сигналы, tasks/signals.py) увеличивает версию после COMMIT,
+# и записи с прежней версией не используются ни в одном процессе. Если кэш
+# не общий (LocMemCache), другие процессы увидят изменение не позже чем через
+# TTL; изменения в обход save() (queryset.update) - тоже через TTL.
+class UserStateCache:
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, user_id, version):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            state, entry_version, expires_at = entry
+            if entry_version != version or expires_at < time.monotonic():
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return state
+
+    def set(self, user_id, state, version):
+        with self._lock:
+            self._entries[user_id] = (state, version, time.monotonic() + self.ttl)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+        transaction.on_commit(partial(bump_version, 'auth_user', user_id))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+user_state_cache = UserStateCache(
+    max_size=getattr(settings, 'TASKS_AUTH_USER_CACHE_SIZE', 10000),
+    ttl=getattr(settings, 'TASKS_AUTH_USER_CACHE_TTL', 60),
+)
+
+
+def load_user_state(user_id):
+    User = get_user_model()
+    row = (User._default_manager
+           .filter(**{api_settings.USER_ID_FIELD: user_id})
+           .values_list('is_active', 'username', 'password')
+           .first())
+    if row is None:
+        return None
+    is_active, username, password = row
+    password_hash = get_md5_hash_password(password) if api_settings.CHECK_REVOKE_TOKEN else None
+    return UserState(is_active, username, password_hash)
+
+
+async def aload_user_state(user_id):
+    User = get_user_model()
+    row = await (User._default_manager
+                 .filter(**{api_settings.USER_ID_FIELD: user_id})
+                 .values_list('is_active', 'username', 'password')
+                 .afirst())
+    if row is None:
+        return None
+    is_active, username, password = row
+    password_hash = get_md5_hash_password(password) if api_settings.CHECK_REVOKE_TOKEN else None
+    return UserState(is_active, username, password_hash)
+
+
+def _load_user(user_id):
+    User = get_user_model()
+    return User._default_manager.get(**{api_settings.USER_ID_FIELD: user_id})
+
+
+# Пользователь, построенный по токену: id, username и is_active доступны
+# без запроса к БД, строка пользователя загружается только при обращении
+# к остальным атрибутам
+class TokenBackedUser(SimpleLazyObject):
+    is_authenticated = True
+    is_anonymous = False
+
+    def __init__(self, user_id, state):
+        super().__init__(partial(_load_user, user_id))
+        self.__dict__.update(id=user_id, pk=user_id,
+                             username=state.username, is_active=state.is_active)
+
+    # LazyObject проксирует эти методы в загруженный объект - переопределяем,
+    # чтобы проверки вида `if request.user` и сравнения не ходили в БД
+    def __bool__(self):
+        return True
+
+    def __eq__(self, other):
+        if isinstance(other, TokenBackedUser):
+            return other.pk == self.pk
+        return isinstance(other, get_user_model()) and other.pk == self.pk
+
+    def __hash__(self):
+        return hash(self.pk)
+
+    def __str__(self):
+        return self.username
+
+
+# JWT-аутентификация без обязательной выборки пользователя на каждый запрос:
+# состояние пользователя берется из user_state_cache (плюс чтение версии
+# пользователя из общего кэша), при промахе - один узкий запрос
+# (is_active, username, password). Версия читается до загрузки состояния:
+# изменение между ними сбросит запись на следующем запросе.
+# aauthenticate() - то же для асинхронных представлений (tasks/async_views.py).
+class TaskJWTAuthentication(JWTAuthentication):
+
+    def get_user(self, validated_token):
+        user_id = self.get_user_id(validated_token)
+        version = get_version('auth_user', user_id)
+        state = user_state_cache.get(user_id, version)
+        if state is None:
+            state = self.remember_state(user_id, load_user_state(user_id), version)
+        return self.build_user(user_id, state, validated_token)
+
+    async def aget_user(self, validated_token):
+        user_id = self.get_user_id(validated_token)
+        version = await aget_version('auth_user', user_id)
+        state = user_state_cache.get(user_id, version)
+        if state is None:
+            state = self.remember_state(user_id, await aload_user_state(user_id), version)
+        return self.build_user(user_id, state, validated_token)
+
+    async def aauthenticate(self, request):
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        # Проверка подписи и срока действия - без ввода-вывода
+        validated_token = self.get_validated_token(raw_token)
+        return await self.aget_user(validated_token), validated_token
+
+    def get_user_id(self, validated_token):
+        try:
+            return validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+    def remember_state(self, user_id, state, version):
+        if state is None:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+        user_state_cache.set(user_id, state, version)
+        return state
+
+    def build_user(self, user_id, state, validated_token):
+        if not state.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != state.password_hash:
+                raise AuthenticationFailed(
+                    _("The user's password has been changed."), code="password_changed"
+                )
+
+        return TokenBackedUser(user_id, state)
@@ -0,0 +1,141 @@
+from django.db import router, transaction
+from django.utils import timezone
+from rest_framework import status
+
+from .archive import restore_archived_tasks, with_archive
+from .models import Task, TaskTombstone
+from .serializers import TaskSerializer
+from .sharding import next_task_ids, scatter
+from .signals import tasks_changed
+
+
+# Пакетное применение операций над задачами одного пользователя.
+# Проверка владельца - один запрос WHERE id IN (...) AND user_id = ...,
+# создание - bulk_create, обновление - bulk_update, завершение и удаление -
+# по одному UPDATE/DELETE на весь пакет. Все изменения - в одной транзакции.
+# Возвращает список результатов в порядке операций и множество затронутых статусов.
+# bulk_create/bulk_update/update()/delete() не отправляют сигналы моделей,
+# поэтому события для ленты изменений отправляются явно (tasks_changed).
+def apply_bulk_operations(user, operations):
+    results = [None] * len(operations)
+    affected_statuses = set()
+
+    # Повторное упоминание одной задачи в пакете не допускается
+    seen_ids = set()
+    for index, operation in enumerate(operations):
+        task_id = operation.get('id')
+        if operation['op'] == 'create' or task_id is None:
+            continue
+        if task_id in seen_ids:
+            results[index] = _error(operation, status.HTTP_400_BAD_REQUEST,
+                                    'Duplicate task id in batch.')
+        seen_ids.add(task_id)
+
+    # Транзакция - в БД задач пользователя (его шард)
+    with transaction.atomic(using=router.db_for_write(Task)):
+        # Свои задачи из архива изменяются после возврата в Task
+        restore_archived_tasks(seen_ids, user.id)
+        owned = {
+            task.id: task
+            for task in Task.objects.filter(id__in=seen_ids, user_id=user.id).select_for_update()
+        }
+        # Отличаем "чужую" задачу (403) от несуществующей (404);
+        # чужие задачи могут быть на других шардах и в архиве
+        missing_ids = seen_ids - owned.keys()
+        foreign_ids = set(
+            scatter(with_archive(lambda model: model.objects.filter(id__in=missing_ids)))
+            .values_list('id', flat=True)
+        ) if missing_ids else set()
+
+        to_create, to_update, to_complete, to_delete = [], [], [], []
+        update_fields = {'updated_at'}
+
+        for index, operation in enumerate(operations):
+            if results[index] is not None:
+                continue
+            op = operation['op']
+
+            if op == 'create':
+                serializer = TaskSerializer(data=operation['data'])
+                if not serializer.is_valid():
+                    results[index] = _error(operation, status.HTTP_400_BAD_REQUEST, serializer.errors)
+                    continue
+                to_create.append((index, Task(user_id=user.id, **serializer.validated_data)))
+                continue
+
+            task = owned.get(operation['id'])
+            if task is None:
+                if operation['id'] in foreign_ids:
+                    results[index] = _error(operation, status.HTTP_403_FORBIDDEN,
+                                            f'You do not have permission to {op} this task.')
+                else:
+                    results[index] = _error(operation, status.HTTP_404_NOT_FOUND, 'Not found.')
+                continue
+
+            affected_statuses.add(task.status)
+            if op == 'update':
+                serializer = TaskSerializer(task, data=operation['data'], partial=True)
+                if not serializer.is_valid():
+                    results[index] = _error(operation, status.HTTP_400_BAD_REQUEST, serializer.errors)
+                    continue
+                for field, value in serializer.validated_data.items():
+                    setattr(task, field, value)
+                update_fields.update(serializer.validated_data)
+                to_update.append((index, task))
+            elif op == 'complete':
+                to_complete.append(task)
+                results[index] = {'op': op, 'id': task.id, 'status': status.HTTP_200_OK}
+            else:
+                to_delete.append(task)
+                results[index] = {'op': op, 'id': task.id, 'status': status.HTTP_200_OK}
+
+        now = timezone.now()
+        if to_create:
+            for (_, task), task_id in zip(to_create, next_task_ids(len(to_create))):
+                task.id = task_id
+            Task.objects.bulk_create([task for _, task in to_create])
+        if to_update:
+            for _, task in to_update:
+                task.updated_at = now
+            Task.objects.bulk_update([task for _, task in to_update], fields=sorted(update_fields))
+        if to_complete:
+            Task.objects.filter(id__in=[task.id for task in to_complete], user_id=user.id).update(
+                status='completed', updated_at=now
+            )
+            affected_statuses.add('completed')
+        if to_delete:
+            Task.objects.filter(id__in=[task.id for task in to_delete], user_id=user.id).delete()
+            TaskTombstone.objects.bulk_create([
+                TaskTombstone(task_id=task.id, user_id=user.id, status=task.status, deleted_at=now)
+                for task in to_delete
+            ])
+
+    changes = []
+    for index, task in to_create:
+        affected_statuses.add(task.status)
+        data = TaskSerializer(task).data
+        results[index] = {'op': 'create', 'id': task.id, 'status': status.HTTP_201_CREATED, 'task': data}
+        changes.append({'type': 'created', 'task': data, 'previous_status': None})
+    for index, task in to_update:
+        affected_statuses.add(task.status)
+        data = TaskSerializer(task).data
+        results[index] = {'op': 'update', 'id': task.id, 'status': status.HTTP_200_OK, 'task': data}
+        changes.append({'type': 'updated', 'task': data, 'previous_status': task.loaded_status})
+    for task in to_complete:
+        changes.append({'type': 'completed', 'previous_status': task.status,
+                        'task': {'id': task.id, 'user': user.id, 'status': 'completed'}})
+    for task in to_delete:
+        changes.append({'type': 'deleted', 'previous_status': task.status,
+                        'task': {'id': task.id, 'user': user.id, 'status': task.status}})
+    if changes:
+        tasks_changed.send(sender=Task, changes=changes)
+
+    return results, affected_statuses
+
+
+def _error(operation, status_code, detail):
+    result = {'op': operation['op'], 'status': status_code}
+    if operation.get('id') is not None:
+        result['id'] = operation['id']
+    result['errors' if isinstance(detail, dict) else 'detail'] = detail
+    return result
@@ -0,0 +1,173 @@
+import hashlib
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+from rest_framework.response import Response
+
+from .conditional import etag_matches, not_modified
+
+
+# Кэш ответов списков задач с версионированием по пользователю и по статусу.
+# Ключ ответа включает текущую "версию" области (user/status), поэтому
+# инвалидация - это один инкремент счетчика версии, без поиска и удаления ключей.
+
+def get_cache():
+    return caches[getattr(settings, 'TASKS_CACHE_ALIAS', 'default')]
+
+
+# Кэш виден всем процессам (Redis, Memcached, файлы, БД). LocMemCache -
+# у каждого процесса свой
+def cache_is_shared():
+    return not isinstance(get_cache(), LocMemCache)
+
+
+def _version_key(scope, value):
+    digest = hashlib.md5(str(value).encode()).hexdigest()
+    return f'tasks:version:{scope}:{digest}'
+
+
+def get_version(scope, value):
+    cache = get_cache()
+    key = _version_key(scope, value)
+    version = cache.get(key)
+    if version is None:
+        # Начальная версия - текущее время в наносекундах: после вытеснения
+        # счетчика из кэша старые ключи ответов не могут совпасть с новыми
+        version = time.time_ns()
+        if not cache.add(key, version, timeout=None):
+            version = cache.get(key, version)
+    return version
+
+
+async def aget_version(scope, value):
+    cache = get_cache()
+    key = _version_key(scope, value)
+    version = await cache.aget(key)
+    if version is None:
+        version = time.time_ns()
+        if not await cache.aadd(key, version, timeout=None):
+            version = await cache.aget(key, version)
+    return version
+
+
+# Ссылки next/previous абсолютные, поэтому в ключ входит полный URI,
+# а формат ответа - потому что от него зависит сохраненный ETag
+def list_cache_key(scope, version, request):
+    uri = f'{request.accepted_renderer.format}|{request.build_absolute_uri()}'
+    digest = hashlib.md5(uri.encode()).hexdigest()
+    return f'tasks:list:{scope}:{version}:{digest}'
+
+
+# Ключи ответа для чтения: из основной БД и, при чтении с реплики, с реплики
+# (последний - ключ, под которым сохраняется ответ этого запроса)
+def list_cache_keys(key, replica):
+    return [key, f'{key}:replica'] if replica else [key]
+
+
+# Время жизни ответа. Ответ с реплики живет не дольше окна прилипания
+# (TASKS_DB_REPLICA_STICKY_SECONDS), которое больше отставания реплик: даже
+# устаревший ответ отставшей реплики быстро вытесняется свежим.
+def list_cache_timeout(replica):
+    timeout = getattr(settings, 'TASKS_LIST_CACHE_TIMEOUT', 300)
+    if replica:
+        timeout = min(timeout, getattr(settings, 'TASKS_DB_REPLICA_STICKY_SECONDS', 5))
+    return timeout
+
+
+def _incr_version(cache, key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), timeout=None)
+
+
+def bump_version(scope, value):
+    _incr_version(get_cache(), _version_key(scope, value))
+
+
+def bump_versions(usernames=(), statuses=()):
+    cache = get_cache()
+    keys = [_version_key('user', username) for username in set(usernames)]
+    keys += [_version_key('status', value) for value in set(statuses)]
+    for key in keys:
+        _incr_version(cache, key)
+
+
+# Инвалидация после фиксации транзакции: иначе параллельный запрос может
+# закэшировать под новой версией еще не зафиксированные (старые) данные
+def invalidate_task_lists(usernames=(), statuses=()):
+    from .routers import mark_primary_sticky
+
+    # Чтения авторов записи - с основной БД, пока реплики догоняют
+    mark_primary_sticky(usernames)
+    transaction.on_commit(lambda: bump_versions(usernames, statuses))
+
+
+# Счетчики попаданий/промахов кэша в рамках процесса
+class CacheStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def record(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses}
+
+
+cache_stats = CacheStats()
+
+
+# Кэширование ответов ListAPIView. Область версии задается парой
+# cache_scope ('user' | 'status') и cache_scope_kwarg (имя параметра URL).
+# Ответы с реплики хранятся под отдельным ключом и недолго (list_cache_timeout):
+# отставшая реплика может вернуть старые данные под новой версией области, и
+# их не должен получить автор записи, чьи чтения "прилипли" к основной БД.
+# Чтение с реплики сначала берет ответ основной БД - он свежее.
+class VersionedListCacheMixin:
+    cache_scope = None
+    cache_scope_kwarg = None
+
+    def get_cache_scope_value(self):
+        return self.kwargs.get(self.cache_scope_kwarg)
+
+    def get_list_cache_key(self, request):
+        version = get_version(self.cache_scope, self.get_cache_scope_value())
+        return list_cache_key(self.cache_scope, version, request)
+
+    def list(self, request, *args, **kwargs):
+        from .routers import reading_replica
+
+        cache = get_cache()
+        replica = reading_replica()
+        keys = list_cache_keys(self.get_list_cache_key(request), replica)
+        found = cache.get_many(keys)
+        cached = next((found[key] for key in keys if key in found), None)
+        if cached is not None:
+            cache_stats.record(hit=True)
+            etag = cached['etag']
+            # Повторный опрос без изменений: 304 без обращения к БД
+            if etag and etag_matches(request, etag):
+                return not_modified(etag)
+            response = Response(cached['data'])
+            if etag:
+                response['ETag'] = etag
+            return response
+
+        cache_stats.record(hit=False)
+        response = super().list(request, *args, **kwargs)
+        if response.status_code == 200:
+            cache.set(keys[-1], {'etag': response.get('ETag'), 'data': response.data},
+                      list_cache_timeout(replica))
+        return response
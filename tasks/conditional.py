@@ -0,0 +1,95 @@
+import hashlib
+
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.response import Response
+
+from .instrumentation import measure_serialization
+
+
+# Условные GET-запросы (ETag / If-None-Match).
+# ETag считается по метке изменения строк (Task.updated_at) до сериализации,
+# поэтому при совпадении клиент получает 304 без тела, а сервер не тратит
+# время на сериализацию и рендеринг.
+
+def make_etag(request, *parts):
+    # В ETag входят полный URI (страница, фильтры, ссылки next/previous)
+    # и формат ответа - сильный ETag должен соответствовать байтам тела
+    renderer = getattr(request, 'accepted_renderer', None)
+    values = [request.build_absolute_uri(), getattr(renderer, 'format', '')]
+    values.extend(parts)
+    digest = hashlib.sha1('|'.join(str(value) for value in values).encode()).hexdigest()
+    return f'"{digest}"'
+
+
+def etag_matches(request, etag):
+    header = request.META.get('HTTP_IF_NONE_MATCH')
+    if not header:
+        return False
+    etags = parse_etags(header)
+    return '*' in etags or etag in etags
+
+
+def not_modified(etag):
+    return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+
+
+def task_marker(task):
+    # Строки .values() (tasks/values.py) - словари
+    if isinstance(task, dict):
+        return f"{task['id']}:{task['updated_at'].isoformat()}"
+    return f'{task.pk}:{task.updated_at.isoformat()}'
+
+
+# ETag страницы списка: по строкам страницы (id, updated_at), числу объектов
+# (если пагинатор его считает) и наличию соседних страниц
+def make_list_etag(request, paginator, rows):
+    parts = []
+    # PageNumberPagination хранит страницу Django с общим count,
+    # CursorPagination - просто список строк
+    page = getattr(paginator, 'page', None)
+    if hasattr(page, 'paginator'):
+        parts.append(page.paginator.count)
+    parts.append(getattr(paginator, 'has_next', None))
+    parts.append(getattr(paginator, 'has_previous', None))
+    parts.extend(task_marker(task) for task in rows)
+    return make_etag(request, *parts)
+
+
+# ETag для RetrieveAPIView: по id и updated_at задачи
+class DetailETagMixin:
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        etag = make_etag(request, task_marker(instance))
+        if etag_matches(request, etag):
+            return not_modified(etag)
+
+        with measure_serialization():
+            data = self.get_serializer(instance).data
+        return Response(data, headers={'ETag': etag})
+
+
+# ETag для ListAPIView - без дополнительных запросов к БД и без сериализации
+class ListETagMixin:
+
+    def get_list_etag(self, request, rows):
+        return make_list_etag(request, self.paginator, rows)
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        rows = page if page is not None else list(queryset)
+
+        etag = self.get_list_etag(request, rows)
+        if etag_matches(request, etag):
+            return not_modified(etag)
+
+        with measure_serialization():
+            data = self.get_serializer(rows, many=True).data
+        if page is not None:
+            response = self.get_paginated_response(data)
+        else:
+            response = Response(data)
+        response['ETag'] = etag
+        return response
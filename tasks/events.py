@@ -0,0 +1,218 @@
+import asyncio
+import json
+import logging
+import select
+import threading
+import time
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections, transaction
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+
+# Лента изменений задач (pub/sub).
+# Изменения публикуются сигналом tasks_changed (tasks/signals.py) и через
+# бэкенд доставляются в EventHub каждого процесса, который раздает события
+# подписчикам (SSE-соединениям) по их фильтрам.
+#
+# Событие: {"type": "created" | "updated" | "completed" | "deleted",
+#           "task": {"id": ..., "user": ..., ...}, "previous_status": ... | null}
+
+class Subscription:
+    def __init__(self, loop, user_id=None, status=None, max_queue=1000):
+        self.loop = loop
+        self.user_id = user_id
+        self.status = status
+        self.queue = asyncio.Queue(maxsize=max_queue)
+        self.overflowed = False
+
+    def matches(self, event):
+        task = event['task']
+        if self.user_id is not None and task.get('user') != self.user_id:
+            return False
+        if self.status is not None:
+            previous_status = event.get('previous_status')
+            if self.status in (task.get('status'), previous_status):
+                return True
+            # Прежний статус неизвестен - задача могла покинуть фильтр
+            return previous_status is None and event['type'] in ('completed', 'deleted')
+        return True
+
+    # Вызывается в цикле событий подписчика
+    def put(self, event):
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Клиент не успевает читать: помечаем поток, клиент должен
+            # переподключиться и синхронизироваться заново
+            self.overflowed = True
+
+
+class EventHub:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions = set()
+        self._backend = None
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            with self._lock:
+                if self._backend is None:
+                    backend_path = getattr(settings, 'TASKS_EVENTS_BACKEND', 'tasks.events.InProcessBackend')
+                    self._backend = import_string(backend_path)(self)
+        return self._backend
+
+    def subscribe(self, user_id=None, status=None):
+        # Слушатель бэкенда запускается только в процессах, где есть подписчики
+        self.backend.start()
+        subscription = Subscription(
+            asyncio.get_running_loop(), user_id=user_id, status=status,
+            max_queue=getattr(settings, 'TASKS_EVENTS_MAX_QUEUE', 1000),
+        )
+        with self._lock:
+            self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+    # Доставка события подписчикам этого процесса (из любого потока)
+    def dispatch(self, payload):
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+        if not subscriptions:
+            return
+        event = json.loads(payload)
+        for subscription in subscriptions:
+            if subscription.matches(event):
+                try:
+                    subscription.loop.call_soon_threadsafe(subscription.put, event)
+                except RuntimeError:
+                    # Цикл событий подписчика уже закрыт
+                    self.unsubscribe(subscription)
+
+    def publish(self, events):
+        payloads = [json.dumps(event, cls=DjangoJSONEncoder) for event in events]
+        backend = self.backend
+        if backend.transactional:
+            for payload in payloads:
+                backend.publish(payload)
+        else:
+            # События уходят подписчикам только после фиксации транзакции
+            def publish_committed():
+                for payload in payloads:
+                    backend.publish(payload)
+
+            transaction.on_commit(publish_committed)
+
+
+# Бэкенд в памяти процесса: подходит для одного процесса (runserver,
+# один ASGI-воркер) и для тестов
+class InProcessBackend:
+    transactional = False
+
+    def __init__(self, hub):
+        self.hub = hub
+
+    def start(self):
+        pass
+
+    def publish(self, payload):
+        self.hub.dispatch(payload)
+
+
+# Бэкенд PostgreSQL LISTEN/NOTIFY для нескольких процессов и узлов.
+# NOTIFY транзакционный - уведомление доставляется только после COMMIT.
+# Каждый процесс с подписчиками держит отдельное соединение с LISTEN - мимо
+# пула psycopg (DB_POOL): занятое навсегда соединение уменьшало бы пул, а
+# каждое переподключение оставляло бы в нем невозвращенный слот.
+class PostgresNotifyBackend:
+    transactional = True
+    channel = 'tasks_events'
+
+    def __init__(self, hub, using='default'):
+        self.hub = hub
+        self.using = using
+        self._started = False
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        thread = threading.Thread(target=self._listen_forever, name='tasks-events-listener', daemon=True)
+        thread.start()
+
+    def publish(self, payload):
+        with connections[self.using].cursor() as cursor:
+            cursor.execute('SELECT pg_notify(%s, %s)', [self.channel, payload])
+
+    def _listen_forever(self):
+        while True:
+            try:
+                self._listen()
+            except Exception:
+                logger.exception('Task events listener failed, reconnecting')
+                time.sleep(1)
+
+    def _listen(self):
+        wrapper = connections[self.using]
+        connection = wrapper.Database.connect(**wrapper.get_connection_params())
+        try:
+            connection.autocommit = True
+            with connection.cursor() as cursor:
+                cursor.execute(f'LISTEN {self.channel}')
+            while True:
+                for payload in self._wait_notifies(connection):
+                    self.hub.dispatch(payload)
+        finally:
+            connection.close()
+
+    @staticmethod
+    def _wait_notifies(connection, timeout=5.0):
+        if hasattr(connection, 'poll'):
+            # psycopg2
+            if select.select([connection], [], [], timeout) != ([], [], []):
+                connection.poll()
+                while connection.notifies:
+                    yield connection.notifies.pop(0).payload
+        else:
+            # psycopg 3
+            for notify in connection.notifies(timeout=timeout):
+                yield notify.payload
+
+
+event_hub = EventHub()
+
+
+def format_sse(event_type, data):
+    return f'event: {event_type}\ndata: {json.dumps(data, cls=DjangoJSONEncoder)}\n\n'
+
+
+# Асинхронный поток Server-Sent Events для одной подписки
+async def stream_events(subscription, heartbeat):
+    try:
+        yield f'retry: {int(heartbeat * 1000)}\n\n'
+        while True:
+            try:
+                event = await asyncio.wait_for(subscription.queue.get(), timeout=heartbeat)
+            except asyncio.TimeoutError:
+                if subscription.overflowed:
+                    yield format_sse('reset', {'detail': 'Event stream overflowed, resync required.'})
+                    return
+                yield ': keepalive\n\n'
+                continue
+            yield format_sse(event['type'], event)
+            if subscription.overflowed and subscription.queue.empty():
+                yield format_sse('reset', {'detail': 'Event stream overflowed, resync required.'})
+                return
+    finally:
+        event_hub.unsubscribe(subscription)
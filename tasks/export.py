@@ -0,0 +1,125 @@
+import csv
+import json
+
+from django.conf import settings
+from rest_framework.negotiation import BaseContentNegotiation
+
+from .archive import with_archive
+from .sharding import scatter
+
+
+# Потоковая выгрузка задач (NDJSON / CSV).
+# Под WSGI строки читаются через values_list().iterator(): на PostgreSQL это
+# серверный курсор, который отдает по chunk_size строк за раз. Под ASGI
+# синхронный итератор Django собрал бы в список целиком до первого байта
+# ответа, поэтому выгрузка идет асинхронным итератором: пакеты по chunk_size
+# строк по возрастанию id, каждый - отдельным запросом. В обоих случаях
+# память процесса не зависит от размера таблицы. Модели и сериализатор
+# не создаются - каждая строка кортежа сразу превращается в текст.
+# Задачи архива выгружаются вместе с остальными. С шардированием читаются
+# все шарды (scatter); потоки строк частей сливаются по id.
+
+# Поля совпадают с TaskSerializer (user - id владельца)
+EXPORT_FIELDS = ('id', 'title', 'description', 'status', 'user')
+EXPORT_COLUMNS = ('id', 'title', 'description', 'status', 'user_id')
+
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+
+def _export_queryset(username, status):
+    def make_queryset(model):
+        queryset = model.objects.order_by('id')
+        if username is not None:
+            queryset = queryset.filter(user__username=username)
+        if status is not None:
+            queryset = queryset.filter(status=status)
+        return queryset.values_list(*EXPORT_COLUMNS)
+
+    return scatter(with_archive(make_queryset, include_archive=status in (None, 'completed')))
+
+
+def get_export_rows(username=None, status=None, chunk_size=None):
+    chunk_size = chunk_size or getattr(settings, 'TASKS_EXPORT_CHUNK_SIZE', 2000)
+    return _export_queryset(username, status).iterator(chunk_size=chunk_size)
+
+
+# Пакеты строк для асинхронной выгрузки: WHERE id > <последний id> LIMIT
+# chunk_size по первичному ключу, без курсора, открытого между await
+async def aget_export_batches(username=None, status=None, chunk_size=None):
+    chunk_size = chunk_size or getattr(settings, 'TASKS_EXPORT_CHUNK_SIZE', 2000)
+    queryset = _export_queryset(username, status)
+    last_id = 0
+    while True:
+        batch = [row async for row in queryset.filter(id__gt=last_id)[:chunk_size]]
+        if not batch:
+            return
+        yield batch
+        last_id = batch[-1][0]
+
+
+# Строки объединяются в блоки, чтобы не отдавать серверу по одной
+# короткой строке на каждую задачу
+def _batched(lines, batch_size):
+    batch = []
+    for line in lines:
+        batch.append(line)
+        if len(batch) >= batch_size:
+            yield ''.join(batch)
+            batch = []
+    if batch:
+        yield ''.join(batch)
+
+
+def _ndjson_lines(rows):
+    for row in rows:
+        yield json.dumps(dict(zip(EXPORT_FIELDS, row)), ensure_ascii=False) + '\n'
+
+
+# csv.writer пишет в объект с методом write - возвращаем строку вместо записи
+class _Echo:
+    def write(self, value):
+        return value
+
+
+def _csv_lines(rows):
+    writer = csv.writer(_Echo())
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def _lines(rows, output_format):
+    return _ndjson_lines(rows) if output_format == 'ndjson' else _csv_lines(rows)
+
+
+def _header(output_format):
+    return csv.writer(_Echo()).writerow(EXPORT_FIELDS) if output_format == 'csv' else None
+
+
+def iter_export(rows, output_format, batch_size=500):
+    header = _header(output_format)
+    if header is not None:
+        yield header
+    yield from _batched(_lines(rows, output_format), batch_size)
+
+
+async def aiter_export(batches, output_format, batch_size=500):
+    header = _header(output_format)
+    if header is not None:
+        yield header
+    async for rows in batches:
+        for chunk in _batched(_lines(rows, output_format), batch_size):
+            yield chunk
+
+
+# Формат выгрузки задается параметром ?output= (или Accept), а ошибки
+# отдаются первым рендерером (JSON) - без 406 на Accept: text/csv
+class ExportContentNegotiation(BaseContentNegotiation):
+
+    def select_parser(self, request, parsers):
+        return parsers[0] if parsers else None
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        return renderers[0], renderers[0].media_type
@@ -0,0 +1,242 @@
+import logging
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from time import perf_counter
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+
+# Инструментирование запросов: для каждого маршрута (имени URL) -
+# полное время, число и время SQL-запросов, время сериализации и размер
+# ответа. Значения отдаются клиенту в заголовке Server-Timing и
+# накапливаются в гистограммах процесса, которые отдает /api/tasks/metrics/
+# в текстовом формате Prometheus. Медленные SQL-запросы (дольше
+# TASKS_SLOW_QUERY_MS) пишутся в журнал tasks.slow_queries.
+#
+# Выключенное инструментирование (TASKS_METRICS_ENABLED = False и
+# TASKS_SLOW_QUERY_MS = None) исключается из цепочки middleware, а
+# measure_serialization() и обертка SQL-запросов без активного запроса сводятся к
+# чтению ContextVar.
+
+slow_query_logger = logging.getLogger('tasks.slow_queries')
+
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 25, 50, 100)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Метрики текущего запроса. ContextVar, а не threading.local: контекст
+# копируется в потоки sync_to_async, поэтому запросы асинхронного ORM
+# учитываются в том же запросе
+_current = ContextVar('tasks_request_metrics', default=None)
+
+
+class RequestMetrics:
+    __slots__ = ('path', 'db_queries', 'db_time', 'serialize_time', 'slow_query_threshold')
+
+    def __init__(self, path, slow_query_threshold):
+        self.path = path
+        self.db_queries = 0
+        self.db_time = 0.0
+        self.serialize_time = 0.0
+        self.slow_query_threshold = slow_query_threshold
+
+
+# Учет времени сериализации: serializer.data и рендеринг JSON
+@contextmanager
+def measure_serialization():
+    metrics = _current.get()
+    if metrics is None:
+        yield
+        return
+    start = perf_counter()
+    try:
+        yield
+    finally:
+        metrics.serialize_time += perf_counter() - start
+
+
+def _execute_wrapper(execute, sql, params, many, context):
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    start = perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration = perf_counter() - start
+        metrics.db_queries += 1
+        metrics.db_time += duration
+        threshold = metrics.slow_query_threshold
+        if threshold is not None and duration >= threshold:
+            # Только SQL с плейсхолдерами, без параметров (данных пользователей)
+            slow_query_logger.warning('%.1f ms %s %s', duration * 1000, metrics.path, sql)
+
+
+def _install_execute_wrapper(sender=None, connection=None, **kwargs):
+    if _execute_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_execute_wrapper)
+
+
+# Обертка ставится на каждое новое соединение (signal connection_created)
+# и на уже открытые соединения текущего потока
+def install_execute_wrapper():
+    connection_created.connect(_install_execute_wrapper, dispatch_uid='tasks_request_metrics')
+    wrap_open_connections()
+
+
+def wrap_open_connections():
+    for connection in connections.all(initialized_only=True):
+        _install_execute_wrapper(connection=connection)
+
+
+class Histogram:
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        # Последний элемент - значения больше всех границ (+Inf)
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        # Границы включительные (le), как в Prometheus
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+# Гистограммы по (маршрут, метод) в памяти процесса
+class MetricsRegistry:
+    METRICS = (
+        ('tasks_request_duration_seconds', 'Request wall time in seconds.', DURATION_BUCKETS),
+        ('tasks_request_db_queries', 'Database queries per request.', QUERY_BUCKETS),
+        ('tasks_request_db_duration_seconds', 'Database time per request in seconds.', DURATION_BUCKETS),
+        ('tasks_request_serialize_duration_seconds', 'Serialization and rendering time per request in seconds.',
+         DURATION_BUCKETS),
+        ('tasks_response_size_bytes', 'Response body size in bytes.', SIZE_BUCKETS),
+    )
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._series = {}
+
+    # values - по одному значению на метрику из METRICS; None не учитывается
+    # (размер потокового ответа заранее неизвестен)
+    def observe(self, route, method, values):
+        with self._lock:
+            histograms = self._series.get((route, method))
+            if histograms is None:
+                histograms = self._series[(route, method)] = [
+                    Histogram(buckets) for _, _, buckets in self.METRICS
+                ]
+            for histogram, value in zip(histograms, values):
+                if value is not None:
+                    histogram.observe(value)
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+    def render(self):
+        with self._lock:
+            series = sorted(
+                (key, [(list(h.counts), h.sum, h.count) for h in histograms])
+                for key, histograms in self._series.items()
+            )
+
+        lines = []
+        for index, (name, help_text, buckets) in enumerate(self.METRICS):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} histogram')
+            for (route, method), histograms in series:
+                counts, total, count = histograms[index]
+                labels = f'route="{_escape(route)}",method="{_escape(method)}"'
+                cumulative = 0
+                for bound, bucket_count in zip(buckets, counts):
+                    cumulative += bucket_count
+                    lines.append(f'{name}_bucket{{{labels},le="{float(bound)!r}"}} {cumulative}')
+                lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {count}')
+                lines.append(f'{name}_sum{{{labels}}} {total!r}')
+                lines.append(f'{name}_count{{{labels}}} {count}')
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+metrics_registry = MetricsRegistry()
+
+
+# Подключается первым в MIDDLEWARE, чтобы учитывать все остальные
+# middleware; работает и под WSGI, и под ASGI
+class RequestMetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.collect = getattr(settings, 'TASKS_METRICS_ENABLED', False)
+        slow_query_ms = getattr(settings, 'TASKS_SLOW_QUERY_MS', None)
+        if not self.collect and slow_query_ms is None:
+            raise MiddlewareNotUsed()
+
+        self.get_response = get_response
+        self.server_timing = self.collect and getattr(settings, 'TASKS_METRICS_SERVER_TIMING', True)
+        self.slow_query_threshold = slow_query_ms / 1000 if slow_query_ms is not None else None
+        install_execute_wrapper()
+
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        metrics = RequestMetrics(request.path, self.slow_query_threshold)
+        token = _current.set(metrics)
+        start = perf_counter()
+        try:
+            # Соединение этого потока могло открыться до подключения сигнала
+            wrap_open_connections()
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, metrics, perf_counter() - start)
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics(request.path, self.slow_query_threshold)
+        token = _current.set(metrics)
+        start = perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, metrics, perf_counter() - start)
+
+    def finish(self, request, response, metrics, duration):
+        if not self.collect:
+            return response
+
+        match = request.resolver_match
+        route = (match.view_name if match is not None else None) or 'unmatched'
+        size = None if response.streaming else len(response.content)
+        metrics_registry.observe(route, request.method, (
+            duration, metrics.db_queries, metrics.db_time, metrics.serialize_time, size,
+        ))
+
+        if self.server_timing:
+            response['Server-Timing'] = ', '.join((
+                f'app;dur={duration * 1000:.2f}',
+                f'db;dur={metrics.db_time * 1000:.2f};desc="{metrics.db_queries} queries"',
+                f'serialize;dur={metrics.serialize_time * 1000:.2f}',
+            ))
+        return response
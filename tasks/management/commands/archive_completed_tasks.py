@@ -0,0 +1,73 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from tasks.archive import archive_batch, archive_cutoff
+from tasks.models import Task
+from tasks.sharding import get_shards
+
+
+class Command(BaseCommand):
+    help = ('Переносит в архив (ArchivedTask) задачи, завершенные дольше '
+            'TASKS_ARCHIVE_AFTER_DAYS дней назад, пакетами на каждом шарде. '
+            'Каждый пакет - отдельная транзакция: прерванный запуск можно просто повторить.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=getattr(settings, 'TASKS_ARCHIVE_AFTER_DAYS', None),
+            help='Возраст завершенных задач для переноса в днях (по умолчанию TASKS_ARCHIVE_AFTER_DAYS).',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Число задач, переносимых одной транзакцией (по умолчанию 1000).',
+        )
+        parser.add_argument(
+            '--max-batches', type=int,
+            help='Наибольшее число пакетов за запуск на шард (по умолчанию - пока есть что переносить).',
+        )
+        parser.add_argument(
+            '--sleep', type=float, default=0.0,
+            help='Пауза между пакетами в секундах, чтобы не нагружать БД.',
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только посчитать задачи для переноса.',
+        )
+
+    def handle(self, *args, **options):
+        if options['days'] is None:
+            raise CommandError('Архив не настроен: задайте TASKS_ARCHIVE_AFTER_DAYS или --days.')
+        cutoff = archive_cutoff(options['days'])
+
+        total = 0
+        for alias in get_shards():
+            if options['dry_run']:
+                count = Task.objects.using(alias).filter(status='completed', updated_at__lt=cutoff).count()
+                self.stdout.write(f'{alias}: задач для переноса: {count}')
+                total += count
+                continue
+
+            moved = self.archive_shard(alias, cutoff, options)
+            self.stdout.write(f'{alias}: перенесено задач: {moved}')
+            total += moved
+
+        if options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(f'Всего задач для переноса: {total}'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'Перенесено в архив задач: {total}'))
+
+    # Пакеты идут по возрастанию id: каждый следующий продолжает после
+    # последней перенесенной задачи и не просматривает уже пройденные строки
+    def archive_shard(self, alias, cutoff, options):
+        moved, batches, last_id = 0, 0, 0
+        while options['max_batches'] is None or batches < options['max_batches']:
+            ids = archive_batch(alias, cutoff, last_id, options['batch_size'])
+            if not ids:
+                break
+            moved += len(ids)
+            batches += 1
+            last_id = ids[-1]
+            if options['sleep']:
+                time.sleep(options['sleep'])
+        return moved
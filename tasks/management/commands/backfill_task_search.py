@@ -0,0 +1,59 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Max, Min
+
+from tasks.models import Task
+from tasks.search import task_search_vector
+from tasks.sharding import get_shards
+
+
+class Command(BaseCommand):
+    help = ('Заполняет Task.search_vector для существующих строк пакетами по диапазонам id '
+            '(PostgreSQL) на каждом шарде. Каждый пакет - отдельная короткая транзакция, '
+            'таблица не блокируется.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=5000,
+            help='Размер диапазона id в одном UPDATE (по умолчанию 5000).',
+        )
+        parser.add_argument(
+            '--sleep', type=float, default=0.0,
+            help='Пауза между пакетами в секундах (снижает нагрузку на реплики и WAL).',
+        )
+        parser.add_argument(
+            '--start-id', type=int,
+            help='Начать с этого id (продолжение прерванного заполнения).',
+        )
+
+    def handle(self, *args, **options):
+        shards = get_shards()
+        if any(connections[alias].vendor != 'postgresql' for alias in shards):
+            raise CommandError('Поисковый вектор поддерживается только для PostgreSQL.')
+
+        total = sum(self.backfill_shard(alias, options) for alias in shards)
+        self.stdout.write(self.style.SUCCESS(f'Готово, обновлено строк: {total}'))
+
+    def backfill_shard(self, alias, options):
+        bounds = Task.objects.using(alias).aggregate(min_id=Min('id'), max_id=Max('id'))
+        if bounds['max_id'] is None:
+            self.stdout.write(f'{alias}: таблица задач пуста.')
+            return 0
+
+        batch_size = options['batch_size']
+        start = options['start_id'] or bounds['min_id']
+        total = 0
+        # Диапазоны по первичному ключу: каждый UPDATE блокирует только
+        # строки своего диапазона; уже заполненные строки пропускаются
+        while start <= bounds['max_id']:
+            end = start + batch_size
+            total += Task.objects.using(alias).filter(
+                id__gte=start, id__lt=end, search_vector__isnull=True,
+            ).update(search_vector=task_search_vector())
+            self.stdout.write(f'{alias}: id < {end}: обновлено {total}')
+            start = end
+            if options['sleep']:
+                time.sleep(options['sleep'])
+        return total
@@ -0,0 +1,107 @@
+import json
+from contextlib import ExitStack
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from rest_framework.settings import api_settings
+
+from tasks import views
+from tasks.merge import MergedQuerySet
+from tasks.models import Task
+from tasks.search import search_tasks
+from tasks.sharding import get_shards, scatter
+
+
+# Рекурсивный обход плана EXPLAIN (FORMAT JSON): возвращает узлы Seq Scan,
+# у которых оценка числа строк превышает порог
+def find_seq_scans(plan, max_rows):
+    found = []
+    if plan.get('Node Type') == 'Seq Scan' and plan.get('Plan Rows', 0) > max_rows:
+        found.append((plan.get('Relation Name'), plan['Plan Rows']))
+    for child in plan.get('Plans', []):
+        found.extend(find_seq_scans(child, max_rows))
+    return found
+
+
+class Command(BaseCommand):
+    help = ('Выполняет EXPLAIN для запросов всех списков задач и завершается с ошибкой, '
+            'если в плане есть Seq Scan с оценкой строк выше порога (PostgreSQL).')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--max-rows', type=int, default=10000,
+            help='Допустимая оценка строк для Seq Scan (по умолчанию 10000).',
+        )
+        parser.add_argument(
+            '--username',
+            help='Пользователь для UserTasksView (по умолчанию - владелец последней задачи).',
+        )
+        parser.add_argument(
+            '--force-index', action='store_true',
+            help='Выполнить EXPLAIN с enable_seqscan = off: любой Seq Scan означает, '
+                 'что для запроса нет пригодного индекса.',
+        )
+
+    def get_list_querysets(self, username, position):
+        page_size = api_settings.PAGE_SIZE or 10
+        endpoints = [('task-list', views.TaskListView, {})]
+        endpoints.append(('user-task-list', views.UserTasksView, {'username': username}))
+        for value, _ in Task.STATUS_CHOICES:
+            endpoints.append(('task-filter-by-status', views.TaskFilterStatusView, {'status': value}))
+
+        for name, view_class, kwargs in endpoints:
+            view = view_class(kwargs=kwargs)
+            queryset = view.get_queryset()
+            label = ' '.join([name] + [f'{key}={value}' for key, value in kwargs.items()])
+            # Первая страница и "глубокая" страница курсорной пагинации
+            yield from self.split(label, queryset, page_size)
+            yield from self.split(f'{label} (cursor)', queryset.filter(id__lt=position), page_size)
+
+        # Полнотекстовый поиск: GIN-индекс по search_vector
+        search = scatter(search_tasks(Task.objects.all(), 'task')).order_by('-rank', '-id')
+        yield from self.split('task-search q=task', search, page_size)
+
+    # Запрос по шардам и архиву (MergedQuerySet) - EXPLAIN каждой части в ее БД
+    def split(self, label, queryset, page_size):
+        if not isinstance(queryset, MergedQuerySet):
+            yield label, queryset[:page_size]
+            return
+        for part in queryset.querysets:
+            yield f'{label} [{part.model._meta.model_name}@{part.db}]', part[:page_size]
+
+    def handle(self, *args, **options):
+        shards = get_shards()
+        if any(connections[alias].vendor != 'postgresql' for alias in shards):
+            raise CommandError('Проверка планов запросов поддерживается только для PostgreSQL.')
+
+        last_task = Task.objects.order_by('-id').values('id', 'user__username').first()
+        if last_task is None:
+            raise CommandError('Таблица задач пуста: планы для пустой таблицы не показательны.')
+        username = options['username'] or last_task['user__username']
+        # Позиция курсора в середине таблицы
+        position = last_task['id'] // 2
+
+        max_rows = 0 if options['force_index'] else options['max_rows']
+        failures = []
+        with ExitStack() as stack:
+            for alias in shards:
+                stack.enter_context(transaction.atomic(using=alias))
+                if options['force_index']:
+                    with connections[alias].cursor() as cursor:
+                        cursor.execute('SET LOCAL enable_seqscan = off')
+
+            for label, queryset in self.get_list_querysets(username, position):
+                plan = json.loads(queryset.explain(format='json'))['Plan']
+                seq_scans = find_seq_scans(plan, max_rows)
+                if seq_scans:
+                    failures.append(label)
+                    for relation, rows in seq_scans:
+                        self.stdout.write(self.style.ERROR(
+                            f'{label}: Seq Scan on {relation} (~{rows} rows)'
+                        ))
+                else:
+                    self.stdout.write(f'{label}: OK')
+
+        if failures:
+            raise CommandError(f'Seq Scan выше порога в {len(failures)} запросах.')
+        self.stdout.write(self.style.SUCCESS('Планы запросов в порядке.'))
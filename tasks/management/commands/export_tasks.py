@@ -0,0 +1,35 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from tasks.export import EXPORT_FORMATS, get_export_rows, iter_export
+from tasks.models import Task
+
+
+class Command(BaseCommand):
+    help = ('Потоковая выгрузка задач в NDJSON или CSV (в stdout или файл) '
+            'без загрузки всей таблицы в память.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output-format', choices=sorted(EXPORT_FORMATS), default='ndjson',
+                            help='Формат выгрузки (по умолчанию ndjson).')
+        parser.add_argument('--user', help='Выгрузить только задачи пользователя (username).')
+        parser.add_argument('--status', choices=[value for value, _ in Task.STATUS_CHOICES],
+                            help='Выгрузить только задачи с этим статусом.')
+        parser.add_argument('--file', help='Путь к файлу (по умолчанию - stdout).')
+        parser.add_argument('--chunk-size', type=int,
+                            help='Строк за одно чтение из курсора (по умолчанию TASKS_EXPORT_CHUNK_SIZE).')
+
+    def handle(self, *args, **options):
+        username = options['user']
+        if username is not None and not get_user_model().objects.filter(username=username).exists():
+            raise CommandError(f'Пользователь {username} не найден.')
+
+        rows = get_export_rows(username=username, status=options['status'],
+                               chunk_size=options['chunk_size'])
+        chunks = iter_export(rows, options['output_format'])
+        if options['file']:
+            with open(options['file'], 'w', encoding='utf-8', newline='') as file:
+                file.writelines(chunks)
+        else:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
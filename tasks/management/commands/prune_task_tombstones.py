@@ -0,0 +1,38 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from tasks.models import TaskTombstone
+
+
+class Command(BaseCommand):
+    help = ('Удаляет метки удаленных задач старше срока хранения '
+            '(TASKS_SYNC_TOMBSTONE_RETENTION_DAYS) пакетами.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int,
+            default=getattr(settings, 'TASKS_SYNC_TOMBSTONE_RETENTION_DAYS', 30),
+            help='Срок хранения меток в днях.',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=5000,
+            help='Число меток, удаляемых одним запросом (по умолчанию 5000).',
+        )
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        total = 0
+        # Короткие DELETE по первичному ключу не держат долгих блокировок
+        while True:
+            ids = list(
+                TaskTombstone.objects.filter(deleted_at__lt=cutoff)
+                .order_by('id').values_list('id', flat=True)[:options['batch_size']]
+            )
+            if not ids:
+                break
+            deleted, _ = TaskTombstone.objects.filter(id__in=ids).delete()
+            total += deleted
+        self.stdout.write(self.style.SUCCESS(f'Удалено меток: {total}'))
@@ -0,0 +1,228 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import Q, Sum
+from django.db.models.constants import OnConflict
+from django.db.models.sql import InsertQuery
+
+from tasks.cache import cache_is_shared
+from tasks.models import ArchivedTask, Task, TaskCounter, TaskTombstone, UserShard
+from tasks.sharding import ensure_anchor, get_shards, publish_user_shard, sharding_enabled
+
+
+class Command(BaseCommand):
+    help = ('Переносит задачи пользователей между шардами (TASKS_SHARDS) пакетами: '
+            'указанных пользователей (--user ... --to) или, без --user, пользователей '
+            'самых нагруженных шардов на наименее нагруженные. Прерванные переносы '
+            'завершаются при следующем запуске.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', action='append', default=[],
+            help='Имя пользователя для переноса (можно указать несколько раз).',
+        )
+        parser.add_argument('--to', help='Шард назначения для --user.')
+        parser.add_argument(
+            '--max-users', type=int, default=100,
+            help='Без --user: наибольшее число переносимых пользователей (по умолчанию 100).',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Число задач, копируемых и удаляемых за один запрос (по умолчанию 1000).',
+        )
+        parser.add_argument(
+            '--drain-seconds', type=float, default=2.0,
+            help='Пауза после запрета записи, чтобы завершились уже начатые запросы (по умолчанию 2).',
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только показать план переноса.',
+        )
+
+    def handle(self, *args, **options):
+        if not sharding_enabled():
+            raise CommandError('Шардирование не настроено (TASKS_SHARDS).')
+        # Карта шардов кэшируется; с кэшем в памяти процесса веб-процессы не
+        # увидят переключения шарда, и их записи уйдут на очищенный шард
+        if not options['dry_run'] and not cache_is_shared():
+            raise CommandError('Перенос требует общего для всех процессов кэша (TASKS_CACHE_ALIAS), '
+                               'например Redis: LocMemCache у каждого процесса свой.')
+        self.batch_size = options['batch_size']
+        # Записи читают карту шардов из основной БД (без кэша), поэтому
+        # ждать истечения кэша карты не нужно - только начатые запросы
+        self.drain_seconds = options['drain_seconds']
+
+        if not options['dry_run']:
+            self.resume_interrupted()
+
+        if options['user']:
+            plan = self.plan_users(options['user'], options['to'])
+        else:
+            plan = self.plan_balance(options['max_users'])
+
+        for user_id, username, source, target in plan:
+            self.stdout.write(f'{username}: {source} -> {target}')
+            if not options['dry_run']:
+                self.move_user(user_id, username, source, target)
+
+        if not plan:
+            self.stdout.write(self.style.SUCCESS('Переносить нечего.'))
+        elif not options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(f'Перенесено пользователей: {len(plan)}'))
+
+    # План: [(user_id, username, шард-источник, шард назначения)]
+
+    def plan_users(self, usernames, target):
+        if target not in get_shards():
+            raise CommandError(f'Неизвестный шард: {target!r}. Шарды: {", ".join(get_shards())}.')
+        users = dict(
+            get_user_model().objects.using(DEFAULT_DB_ALIAS)
+            .filter(username__in=usernames).values_list('username', 'id')
+        )
+        unknown = sorted(set(usernames) - users.keys())
+        if unknown:
+            raise CommandError(f'Пользователи не найдены: {", ".join(unknown)}.')
+        shards = self.user_shards(users.values())
+        return [
+            (user_id, username, shards.get(user_id, DEFAULT_DB_ALIAS), target)
+            for username, user_id in sorted(users.items())
+            if shards.get(user_id, DEFAULT_DB_ALIAS) != target
+        ]
+
+    # Жадная балансировка по числу задач (счетчики TaskCounter шардов): с
+    # самого нагруженного шарда на наименее нагруженный переносится
+    # пользователь, чей перенос сильнее всего сокращает разницу между ними
+    def plan_balance(self, max_users):
+        shards = get_shards()
+        users = {}
+        for alias in shards:
+            rows = (TaskCounter.objects.using(alias).values('user_id')
+                    .annotate(total=Sum('count')).filter(total__gt=0).order_by())
+            users[alias] = {row['user_id']: row['total'] for row in rows}
+        loads = {alias: sum(users[alias].values()) for alias in shards}
+
+        moves = []
+        while len(moves) < max_users:
+            source = max(shards, key=loads.get)
+            target = min(shards, key=loads.get)
+            gap = loads[source] - loads[target]
+            # Перенос пользователя с total задачами уменьшает разницу, только если total < gap
+            candidates = [(user_id, total) for user_id, total in users[source].items() if total < gap]
+            if not candidates:
+                break
+            user_id, total = min(candidates, key=lambda candidate: abs(gap - 2 * candidate[1]))
+            del users[source][user_id]
+            users[target][user_id] = total
+            loads[source] -= total
+            loads[target] += total
+            moves.append((user_id, source, target))
+
+        usernames = dict(
+            get_user_model().objects.using(DEFAULT_DB_ALIAS)
+            .filter(id__in=[user_id for user_id, _, _ in moves]).values_list('id', 'username')
+        )
+        return [(user_id, usernames[user_id], source, target)
+                for user_id, source, target in moves if user_id in usernames]
+
+    def user_shards(self, user_ids):
+        return dict(
+            UserShard.objects.using(DEFAULT_DB_ALIAS).filter(user_id__in=user_ids).values_list('user_id', 'shard')
+        )
+
+    # Перенос, прерванный на копировании (moving_to) или на удалении со
+    # старого шарда (moved_from), продолжается с того же шага
+    def resume_interrupted(self):
+        User = get_user_model()
+        pending = (UserShard.objects.using(DEFAULT_DB_ALIAS)
+                   .filter(Q(moving_to__isnull=False) | Q(moved_from__isnull=False)))
+        for entry in pending:
+            username = User.objects.using(DEFAULT_DB_ALIAS).filter(pk=entry.user_id).values_list(
+                'username', flat=True).first()
+            if entry.moving_to is not None:
+                self.stdout.write(f'{username}: {entry.shard} -> {entry.moving_to} (продолжение)')
+                self.move_user(entry.user_id, username, entry.shard, entry.moving_to)
+            else:
+                self.stdout.write(f'{username}: удаление с {entry.moved_from} (продолжение)')
+                self.cleanup(entry.user_id, entry.moved_from)
+
+    # Шаги переноса:
+    #   1. карта: moving_to = target - запись задач пользователя отклоняется (503),
+    #      чтение продолжается с source; пауза drain_seconds;
+    #   2. копирование задач, архива и меток удаления пакетами (повторная вставка
+    #      уже скопированных строк пропускается); счетчики на target
+    #      пересчитываются триггерами;
+    #   3. карта: shard = target, moved_from = source - чтение и запись с target;
+    #   4. удаление строк с source пакетами, затем moved_from = None.
+    def move_user(self, user_id, username, source, target):
+        self.update_map(user_id, shard=source, moving_to=target, moved_from=None)
+        if self.drain_seconds:
+            time.sleep(self.drain_seconds)
+
+        ensure_anchor(target, user_id, username)
+        for model in (Task, ArchivedTask):
+            self.copy_rows(model, user_id, source, target)
+        self.copy_tombstones(user_id, source, target)
+
+        self.update_map(user_id, shard=target, moving_to=None, moved_from=source)
+        self.cleanup(user_id, source)
+
+    def update_map(self, user_id, **fields):
+        UserShard.objects.using(DEFAULT_DB_ALIAS).update_or_create(user_id=user_id, defaults=fields)
+        publish_user_shard(user_id, fields['shard'], fields['moving_to'])
+
+    # Строки копируются как есть (raw): id и updated_at сохраняются
+    def copy_rows(self, model, user_id, source, target):
+        last_id = 0
+        while True:
+            rows = list(
+                model.objects.using(source).filter(user_id=user_id, id__gt=last_id).order_by('id')[:self.batch_size]
+            )
+            if not rows:
+                break
+            last_id = rows[-1].id
+            deferred = rows[0].get_deferred_fields()
+            fields = [field for field in model._meta.concrete_fields if field.attname not in deferred]
+            query = InsertQuery(model, on_conflict=OnConflict.IGNORE)
+            query.insert_values(fields, rows, raw=True)
+            with transaction.atomic(using=target):
+                query.get_compiler(using=target).execute_sql()
+
+    # Метки удаления получают новые id шарда назначения; прерванное
+    # копирование повторяется целиком (метки уже перенесенных задач не дублируются)
+    def copy_tombstones(self, user_id, source, target):
+        with transaction.atomic(using=target):
+            TaskTombstone.objects.using(target).filter(user_id=user_id).delete()
+            last = (None, 0)
+            while True:
+                tombstones = TaskTombstone.objects.using(source).filter(user_id=user_id).order_by('deleted_at', 'id')
+                if last[0] is not None:
+                    tombstones = tombstones.filter(
+                        Q(deleted_at__gt=last[0]) | Q(deleted_at=last[0], id__gt=last[1])
+                    )
+                batch = list(tombstones[:self.batch_size])
+                if not batch:
+                    break
+                last = (batch[-1].deleted_at, batch[-1].id)
+                TaskTombstone.objects.using(target).bulk_create([
+                    TaskTombstone(task_id=tombstone.task_id, user_id=user_id, status=tombstone.status,
+                                  deleted_at=tombstone.deleted_at)
+                    for tombstone in batch
+                ])
+
+    def cleanup(self, user_id, source):
+        for model in (Task, ArchivedTask, TaskTombstone):
+            while True:
+                ids = list(
+                    model.objects.using(source).filter(user_id=user_id).values_list('id', flat=True)[:self.batch_size]
+                )
+                if not ids:
+                    break
+                model.objects.using(source).filter(id__in=ids).delete()
+        TaskCounter.objects.using(source).filter(user_id=user_id).delete()
+        if source != DEFAULT_DB_ALIAS:
+            get_user_model().objects.using(source).filter(pk=user_id).delete()
+
+        entry = UserShard.objects.using(DEFAULT_DB_ALIAS).get(user_id=user_id)
+        self.update_map(user_id, shard=entry.shard, moving_to=None, moved_from=None)
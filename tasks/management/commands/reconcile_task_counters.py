@@ -0,0 +1,88 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+
+from tasks.models import ArchivedTask, Task, TaskCounter
+from tasks.sharding import get_shards
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает счетчики задач (TaskCounter) по таблице задач и архиву '
+            'пакетами пользователей на каждом шарде и сообщает о расхождениях.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Число пользователей в одном пакете (по умолчанию 500).',
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только сообщить о расхождениях, не исправляя счетчики.',
+        )
+
+    def handle(self, *args, **options):
+        drift_total = 0
+        for alias in get_shards():
+            drift_total += self.reconcile_shard(alias, options['batch_size'], options['dry_run'])
+
+        if drift_total:
+            action = 'найдено' if options['dry_run'] else 'исправлено'
+            self.stdout.write(self.style.WARNING(f'Расхождений {action}: {drift_total}'))
+        else:
+            self.stdout.write(self.style.SUCCESS('Счетчики совпадают с данными.'))
+
+    # Пользователи шарда - строки пользователей в его БД (на дополнительных
+    # шардах - якоря пользователей этого шарда)
+    def reconcile_shard(self, alias, batch_size, dry_run):
+        User = get_user_model()
+        last_id, drift = 0, 0
+        while True:
+            user_ids = list(
+                User.objects.using(alias).filter(id__gt=last_id).order_by('id')
+                .values_list('id', flat=True)[:batch_size]
+            )
+            if not user_ids:
+                return drift
+            last_id = user_ids[-1]
+            drift += self.reconcile_batch(alias, user_ids, dry_run)
+
+    # Строки счетчиков пакета блокируются до пересчета: триггеры конкурентных
+    # записей ждут конца транзакции и применяют свои +1/-1 поверх пересчитанных
+    # значений, поэтому изменения во время сверки не теряются
+    def reconcile_batch(self, alias, user_ids, dry_run):
+        with transaction.atomic(using=alias):
+            counters = {
+                (counter.user_id, counter.status): counter
+                for counter in TaskCounter.objects.using(alias).select_for_update().filter(user_id__in=user_ids)
+            }
+            actual = {}
+            for model in (Task, ArchivedTask):
+                for user_id, status, count in (
+                    model.objects.using(alias).filter(user_id__in=user_ids)
+                    .values_list('user_id', 'status').annotate(count=Count('id')).order_by()
+                ):
+                    actual[user_id, status] = actual.get((user_id, status), 0) + count
+
+            to_update, to_create = [], []
+            for key in counters.keys() | actual.keys():
+                counter = counters.get(key)
+                expected = actual.get(key, 0)
+                stored = counter.count if counter is not None else 0
+                if stored == expected:
+                    continue
+                user_id, status = key
+                self.stdout.write(f'{alias}: user_id={user_id} status={status}: {stored} -> {expected}')
+                if counter is None:
+                    to_create.append(TaskCounter(user_id=user_id, status=status, count=expected))
+                else:
+                    counter.count = expected
+                    to_update.append(counter)
+
+            if not dry_run:
+                TaskCounter.objects.using(alias).bulk_update(to_update, ['count'])
+                TaskCounter.objects.using(alias).bulk_create(
+                    to_create, update_conflicts=True,
+                    unique_fields=['user', 'status'], update_fields=['count'],
+                )
+        return len(to_update) + len(to_create)
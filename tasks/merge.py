@@ -0,0 +1,151 @@
+import heapq
+from itertools import chain, islice
+
+
+# Queryset поверх нескольких одинаково отсортированных запросов (одна
+# выборка на разных шардах, оперативная таблица задач и архив) - в объеме,
+# который нужен представлениям и пагинаторам (Django Paginator,
+# CursorPagination DRF и их асинхронные варианты): filter/values/order_by,
+# count, exists, get и срезы. Операции применяются к каждому запросу.
+# Срез [start:stop] читает из каждого запроса первые stop строк и сливает их
+# по полям сортировки (одного направления, последнее - уникальное, например
+# '-id' или ('-rank', '-id')); строка, которая во время переноса оказалась в
+# двух местах, выдается один раз. iterator() сливает потоки строк запросов
+# без загрузки их в память (выгрузка).
+class MergedQuerySet:
+
+    def __init__(self, querysets):
+        self.querysets = list(querysets)
+
+    @property
+    def model(self):
+        return self.querysets[0].model
+
+    @property
+    def ordered(self):
+        return self.querysets[0].ordered
+
+    def _chain(self, method, *args, **kwargs):
+        return type(self)([getattr(queryset, method)(*args, **kwargs) for queryset in self.querysets])
+
+    def filter(self, *args, **kwargs):
+        return self._chain('filter', *args, **kwargs)
+
+    def values(self, *fields, **expressions):
+        return self._chain('values', *fields, **expressions)
+
+    def values_list(self, *fields, **kwargs):
+        return self._chain('values_list', *fields, **kwargs)
+
+    def order_by(self, *fields):
+        return self._chain('order_by', *fields)
+
+    def count(self):
+        return sum(queryset.count() for queryset in self.querysets)
+
+    async def acount(self):
+        total = 0
+        for queryset in self.querysets:
+            total += await queryset.acount()
+        return total
+
+    def exists(self):
+        return any(queryset.exists() for queryset in self.querysets)
+
+    def get(self, *args, **kwargs):
+        for queryset in self.querysets:
+            try:
+                return queryset.get(*args, **kwargs)
+            except queryset.model.DoesNotExist:
+                continue
+        raise self.model.DoesNotExist(f'{self.model._meta.object_name} matching query does not exist.')
+
+    async def aget(self, *args, **kwargs):
+        for queryset in self.querysets:
+            try:
+                return await queryset.aget(*args, **kwargs)
+            except queryset.model.DoesNotExist:
+                continue
+        raise self.model.DoesNotExist(f'{self.model._meta.object_name} matching query does not exist.')
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice) or key.step is not None:
+            raise TypeError('MergedQuerySet supports only slices without step.')
+        return MergedRows(self, key.start or 0, key.stop)
+
+    def __iter__(self):
+        return iter(MergedRows(self, 0, None))
+
+    def __aiter__(self):
+        return MergedRows(self, 0, None).__aiter__()
+
+    def iterator(self, chunk_size=None):
+        return self._merged([queryset.iterator(chunk_size=chunk_size) for queryset in self.querysets])
+
+    def merge(self, part_rows, start, stop):
+        return list(islice(self._merged(part_rows), start, stop))
+
+    def _merged(self, part_rows):
+        queryset = self.querysets[0]
+        order_by = queryset.query.order_by
+        if not order_by:
+            return chain.from_iterable(part_rows)
+        descending = {field.startswith('-') for field in order_by}
+        if len(descending) > 1:
+            raise TypeError('MergedQuerySet supports only one ordering direction.')
+        names = [field.lstrip('-') for field in order_by]
+        # Строки values_list() - кортежи в порядке полей запроса
+        indexes = [queryset._fields.index(name) for name in names] if queryset._fields else None
+
+        def key(row):
+            if isinstance(row, dict):
+                return tuple(row[name] for name in names)
+            if isinstance(row, tuple):
+                return tuple(row[index] for index in indexes)
+            return tuple(getattr(row, name) for name in names)
+
+        return _unique(heapq.merge(*part_rows, key=key, reverse=descending.pop()), key)
+
+
+def _unique(rows, key):
+    previous = object()
+    for row in rows:
+        value = key(row)
+        if value != previous:
+            previous = value
+            yield row
+
+
+# Строки среза MergedQuerySet: запросы выполняются при первом обращении
+# (синхронном или async for)
+class MergedRows:
+
+    def __init__(self, merged, start, stop):
+        self.merged = merged
+        self.start = start
+        self.stop = stop
+        self._rows = None
+
+    def _limited(self, queryset):
+        return queryset[:self.stop] if self.stop is not None else queryset
+
+    def _result(self):
+        if self._rows is None:
+            part_rows = [list(self._limited(queryset)) for queryset in self.merged.querysets]
+            self._rows = self.merged.merge(part_rows, self.start, self.stop)
+        return self._rows
+
+    def __iter__(self):
+        return iter(self._result())
+
+    def __len__(self):
+        return len(self._result())
+
+    async def __aiter__(self):
+        if self._rows is None:
+            part_rows = []
+            for queryset in self.merged.querysets:
+                part_rows.append([row async for row in self._limited(queryset)])
+            self._rows = self.merged.merge(part_rows, self.start, self.stop)
+        for row in self._rows:
+            yield row
@@ -0,0 +1,44 @@
+from django.contrib.postgres.indexes import PostgresIndex
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db.migrations.operations import AddIndex, RunSQL
+
+
+# Создание индекса без блокировки записи в таблицу (CREATE INDEX CONCURRENTLY).
+# На PostgreSQL - конкурентное построение, на остальных СУБД (SQLite в тестах
+# и бенчмарках) - обычный CREATE INDEX. Индексы PostgreSQL (GIN, GiST и т.п.)
+# на других СУБД не создаются. Миграция должна быть с atomic = False.
+class AddIndexConcurrentlyIfPostgres(AddIndexConcurrently):
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+        elif not isinstance(self.index, PostgresIndex):
+            AddIndex.database_forwards(self, app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+        elif not isinstance(self.index, PostgresIndex):
+            AddIndex.database_backwards(self, app_label, schema_editor, from_state, to_state)
+
+
+# SQL для одной СУБД (триггеры, функции PL/pgSQL и т.п.).
+# На остальных СУБД операция ничего не делает.
+class RunSQLForVendor(RunSQL):
+    vendor = None
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == self.vendor:
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == self.vendor:
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+
+
+class RunSQLIfPostgres(RunSQLForVendor):
+    vendor = 'postgresql'
+
+
+class RunSQLIfSQLite(RunSQLForVendor):
+    vendor = 'sqlite'
@@ -0,0 +1,30 @@
+# Generated by Django 5.1.1 on 2026-10-18 17:41
+
+from django.db import migrations, models
+
+from tasks.migration_operations import AddIndexConcurrentlyIfPostgres
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY нельзя выполнять внутри транзакции
+    atomic = False
+
+    dependencies = [
+        ('tasks', '0001_initial'),
+    ]
+
+    operations = [
+        AddIndexConcurrentlyIfPostgres(
+            model_name='task',
+            index=models.Index(fields=['user', '-id'], name='task_user_id_desc_idx'),
+        ),
+        AddIndexConcurrentlyIfPostgres(
+            model_name='task',
+            index=models.Index(fields=['status', '-id'], name='task_status_id_desc_idx'),
+        ),
+        AddIndexConcurrentlyIfPostgres(
+            model_name='task',
+            index=models.Index(condition=models.Q(('status__in', ['new', 'in_progress'])), fields=['status', '-id'], name='task_active_status_id_idx'),
+        ),
+    ]
@@ -0,0 +1,108 @@
+# Generated by Django 5.1.1 on 2026-10-18 18:10
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+from tasks.migration_operations import RunSQLIfPostgres, RunSQLIfSQLite
+
+
+# Счетчики обновляются в той же транзакции, что и запись задачи:
+# INSERT - +1 к (user, status), DELETE - -1, UPDATE status/user_id - -1 к
+# старой паре и +1 к новой. Сразу после создания триггеров счетчики
+# заполняются по текущим данным (CREATE TRIGGER блокирует запись в
+# tasks_task до конца транзакции миграции, поэтому изменения не теряются).
+SEED_COUNTERS = """
+INSERT INTO tasks_taskcounter (user_id, status, count)
+SELECT user_id, status, COUNT(*) FROM tasks_task GROUP BY user_id, status;
+"""
+
+POSTGRES_COUNTER_TRIGGERS = """
+CREATE OR REPLACE FUNCTION tasks_task_counter_update() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        UPDATE tasks_taskcounter SET count = count - 1
+        WHERE user_id = OLD.user_id AND status = OLD.status;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO tasks_taskcounter (user_id, status, count) VALUES (NEW.user_id, NEW.status, 1)
+        ON CONFLICT (user_id, status) DO UPDATE SET count = tasks_taskcounter.count + 1;
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER tasks_task_counter_insert_delete
+    AFTER INSERT OR DELETE ON tasks_task
+    FOR EACH ROW EXECUTE FUNCTION tasks_task_counter_update();
+
+CREATE TRIGGER tasks_task_counter_update
+    AFTER UPDATE OF status, user_id ON tasks_task
+    FOR EACH ROW
+    WHEN (OLD.status IS DISTINCT FROM NEW.status OR OLD.user_id IS DISTINCT FROM NEW.user_id)
+    EXECUTE FUNCTION tasks_task_counter_update();
+""" + SEED_COUNTERS
+
+DROP_POSTGRES_COUNTER_TRIGGERS = """
+DROP TRIGGER IF EXISTS tasks_task_counter_insert_delete ON tasks_task;
+DROP TRIGGER IF EXISTS tasks_task_counter_update ON tasks_task;
+DROP FUNCTION IF EXISTS tasks_task_counter_update();
+"""
+
+SQLITE_COUNTER_TRIGGERS = [
+    """
+    CREATE TRIGGER tasks_task_counter_insert AFTER INSERT ON tasks_task
+    BEGIN
+        INSERT INTO tasks_taskcounter (user_id, status, count) VALUES (NEW.user_id, NEW.status, 1)
+        ON CONFLICT (user_id, status) DO UPDATE SET count = count + 1;
+    END;
+    """,
+    """
+    CREATE TRIGGER tasks_task_counter_delete AFTER DELETE ON tasks_task
+    BEGIN
+        UPDATE tasks_taskcounter SET count = count - 1
+        WHERE user_id = OLD.user_id AND status = OLD.status;
+    END;
+    """,
+    """
+    CREATE TRIGGER tasks_task_counter_update AFTER UPDATE OF status, user_id ON tasks_task
+    WHEN OLD.status IS NOT NEW.status OR OLD.user_id IS NOT NEW.user_id
+    BEGIN
+        UPDATE tasks_taskcounter SET count = count - 1
+        WHERE user_id = OLD.user_id AND status = OLD.status;
+        INSERT INTO tasks_taskcounter (user_id, status, count) VALUES (NEW.user_id, NEW.status, 1)
+        ON CONFLICT (user_id, status) DO UPDATE SET count = count + 1;
+    END;
+    """,
+    SEED_COUNTERS,
+]
+
+DROP_SQLITE_COUNTER_TRIGGERS = [
+    'DROP TRIGGER IF EXISTS tasks_task_counter_insert;',
+    'DROP TRIGGER IF EXISTS tasks_task_counter_delete;',
+    'DROP TRIGGER IF EXISTS tasks_task_counter_update;',
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0005_task_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(max_length=20)),
+                ('count', models.BigIntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user', 'status'), name='task_counter_user_status_uniq')],
+            },
+        ),
+        RunSQLIfPostgres(POSTGRES_COUNTER_TRIGGERS, DROP_POSTGRES_COUNTER_TRIGGERS),
+        RunSQLIfSQLite(SQLITE_COUNTER_TRIGGERS, DROP_SQLITE_COUNTER_TRIGGERS),
+    ]
@@ -0,0 +1,73 @@
+# Generated by Django 5.1.1 on 2026-10-18 18:50
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+from tasks.migration_operations import RunSQLIfPostgres, RunSQLIfSQLite
+
+
+# Задачи в архиве по-прежнему учитываются в счетчиках TaskCounter: перенос
+# в архив (DELETE из tasks_task и INSERT в архив в одной транзакции) и
+# возврат из архива оставляют счетчики без изменений. Строки архива не
+# изменяются, поэтому триггера на UPDATE нет. В PostgreSQL используется
+# функция tasks_task_counter_update() из 0006_task_counters.
+POSTGRES_ARCHIVE_COUNTER_TRIGGER = """
+CREATE TRIGGER tasks_archivedtask_counter_insert_delete
+    AFTER INSERT OR DELETE ON tasks_archivedtask
+    FOR EACH ROW EXECUTE FUNCTION tasks_task_counter_update();
+"""
+
+DROP_POSTGRES_ARCHIVE_COUNTER_TRIGGER = """
+DROP TRIGGER IF EXISTS tasks_archivedtask_counter_insert_delete ON tasks_archivedtask;
+"""
+
+SQLITE_ARCHIVE_COUNTER_TRIGGERS = [
+    """
+    CREATE TRIGGER tasks_archivedtask_counter_insert AFTER INSERT ON tasks_archivedtask
+    BEGIN
+        INSERT INTO tasks_taskcounter (user_id, status, count) VALUES (NEW.user_id, NEW.status, 1)
+        ON CONFLICT (user_id, status) DO UPDATE SET count = count + 1;
+    END;
+    """,
+    """
+    CREATE TRIGGER tasks_archivedtask_counter_delete AFTER DELETE ON tasks_archivedtask
+    BEGIN
+        UPDATE tasks_taskcounter SET count = count - 1
+        WHERE user_id = OLD.user_id AND status = OLD.status;
+    END;
+    """,
+]
+
+DROP_SQLITE_ARCHIVE_COUNTER_TRIGGERS = [
+    'DROP TRIGGER IF EXISTS tasks_archivedtask_counter_insert;',
+    'DROP TRIGGER IF EXISTS tasks_archivedtask_counter_delete;',
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0007_user_shard'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedTask',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('title', models.CharField(max_length=80)),
+                ('description', models.TextField(blank=True, max_length=140, null=True)),
+                ('status', models.CharField(choices=[('new', 'NEW'), ('in_progress', 'IN_PROGRESS'), ('completed', 'COMPLETED')], default='completed', max_length=20)),
+                ('updated_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', '-id'], name='archived_task_user_id_idx')],
+            },
+        ),
+        RunSQLIfPostgres(POSTGRES_ARCHIVE_COUNTER_TRIGGER, DROP_POSTGRES_ARCHIVE_COUNTER_TRIGGER),
+        RunSQLIfSQLite(SQLITE_ARCHIVE_COUNTER_TRIGGERS, DROP_SQLITE_ARCHIVE_COUNTER_TRIGGERS),
+    ]
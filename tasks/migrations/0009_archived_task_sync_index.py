@@ -0,0 +1,22 @@
+# Generated by Django 5.1.1 on 2026-10-18 21:05
+
+from django.db import migrations, models
+
+from tasks.migration_operations import AddIndexConcurrentlyIfPostgres
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY нельзя выполнять внутри транзакции
+    atomic = False
+
+    dependencies = [
+        ('tasks', '0008_archived_task'),
+    ]
+
+    operations = [
+        AddIndexConcurrentlyIfPostgres(
+            model_name='archivedtask',
+            index=models.Index(fields=['user', 'updated_at', 'id'], name='archived_task_user_updated_idx'),
+        ),
+    ]
@@ -1,6 +1,9 @@
 from django.db import models
+from django.utils import timezone
 from django.conf import settings
 from django.contrib.auth.models import AbstractUser
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 
 # Модель пользователей
 class User(AbstractUser):
@@ -28,6 +31,14 @@ class User(AbstractUser):
         return self.username
 
 
+# Поисковый вектор задачи (tsvector) нужен только в SQL-фильтре поиска,
+# поэтому по умолчанию не загружается вместе с задачей
+class TaskManager(models.Manager):
+
+    def get_queryset(self):
+        return super().get_queryset().defer('search_vector')
+
+
 # Модель задач
 class Task(models.Model):
     STATUS_CHOICES = [
@@ -40,8 +51,118 @@ class Task(models.Model):
     description = models.TextField(max_length=140, blank=True, null=True)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='new')
     user = models.ForeignKey('User', on_delete=models.CASCADE, related_name='tasks')
+    # Метка изменения строки (для ETag): обновляется при каждом save()
+    updated_at = models.DateTimeField(auto_now=True)
+    # Полнотекстовый поиск по title и description (tasks/search.py).
+    # Заполняется триггером PostgreSQL при INSERT и UPDATE title/description
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    objects = TaskManager()
+
+    class Meta:
+        # Индексы повторяют фильтр и ORDER BY списков задач:
+        # UserTasksView - (user, -id), TaskFilterStatusView - (status, -id).
+        # Частичный индекс покрывает "горячие" незавершенные статусы и остается
+        # компактным, даже когда завершенных задач большинство.
+        indexes = [
+            models.Index(fields=['user', '-id'], name='task_user_id_desc_idx'),
+            models.Index(fields=['status', '-id'], name='task_status_id_desc_idx'),
+            models.Index(
+                fields=['status', '-id'],
+                name='task_active_status_id_idx',
+                condition=models.Q(status__in=['new', 'in_progress']),
+            ),
+            # Инкрементальная синхронизация: изменения пользователя после водяного знака
+            models.Index(fields=['user', 'updated_at', 'id'], name='task_user_updated_idx'),
+            # Полнотекстовый поиск (@@ по search_vector)
+            GinIndex(fields=['search_vector'], name='task_search_vector_idx'),
+        ]
+
+    # Статус на момент загрузки из БД (для событий об изменении статуса)
+    loaded_status = None
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.loaded_status = instance.__dict__.get('status')
+        return instance
+
+    def __str__(self):
+        return self.title
+
+
+# Архив ("холодное" хранилище) завершенных задач (tasks/archive.py): задачи,
+# завершенные дольше TASKS_ARCHIVE_AFTER_DAYS назад, переносятся сюда
+# командой archive_completed_tasks с сохранением id и updated_at, а при
+# изменении возвращаются в Task. Строки архива не изменяются; счетчики
+# TaskCounter учитывают их триггерами (миграция 0008_archived_task).
+class ArchivedTask(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    title = models.CharField(max_length=80)
+    description = models.TextField(max_length=140, blank=True, null=True)
+    status = models.CharField(max_length=20, choices=Task.STATUS_CHOICES, default='completed')
+    user = models.ForeignKey('User', on_delete=models.CASCADE, related_name='+')
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        # Архив пользователя (UserTasksView) и его синхронизация; общий список
+        # и фильтр по статусу читают архив по первичному ключу (ORDER BY -id)
+        indexes = [
+            models.Index(fields=['user', '-id'], name='archived_task_user_id_idx'),
+            models.Index(fields=['user', 'updated_at', 'id'], name='archived_task_user_updated_idx'),
+        ]
 
     def __str__(self):
         return self.title
 
 
+# Запись об удаленной задаче для инкрементальной синхронизации
+class TaskTombstone(models.Model):
+    task_id = models.BigIntegerField()
+    user = models.ForeignKey('User', on_delete=models.CASCADE, related_name='+')
+    status = models.CharField(max_length=20, blank=True, null=True)
+    deleted_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'deleted_at', 'id'], name='tombstone_user_deleted_idx'),
+        ]
+
+    def __str__(self):
+        return f'Deleted task {self.task_id}'
+
+
+# Материализованные счетчики задач пользователя по статусам.
+# Поддерживаются триггерами на tasks_task (миграция 0006_task_counters)
+# при любой записи - save(), update(), bulk_create(), delete().
+# Общие счетчики - сумма по пользователям (без "горячей" общей строки).
+class TaskCounter(models.Model):
+    user = models.ForeignKey('User', on_delete=models.CASCADE, related_name='+')
+    status = models.CharField(max_length=20)
+    count = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'status'], name='task_counter_user_status_uniq'),
+        ]
+
+    def __str__(self):
+        return f'{self.user_id}/{self.status}: {self.count}'
+
+
+# Карта шардов задач (tasks/sharding.py): в какой БД (алиас из TASKS_SHARDS)
+# хранятся задачи пользователя. Хранится в основной БД; нет строки - задачи
+# пользователя в основной БД.
+class UserShard(models.Model):
+    user = models.OneToOneField('User', on_delete=models.CASCADE, primary_key=True, related_name='task_shard')
+    shard = models.CharField(max_length=100)
+    # Идет перенос задач на этот шард (rebalance_task_shards): запись задач
+    # пользователя до конца переноса отклоняется
+    moving_to = models.CharField(max_length=100, blank=True, null=True)
+    # Шард, с которого задачи перенесены, но еще не удалены
+    moved_from = models.CharField(max_length=100, blank=True, null=True)
+
+    def __str__(self):
+        return f'{self.user_id}: {self.shard}'
+
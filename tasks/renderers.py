@@ -0,0 +1,83 @@
+import io
+
+from django.conf import settings
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+from .instrumentation import measure_serialization
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson необязателен
+    orjson = None
+
+
+# Рендерер и парсер JSON на orjson (если установлен) с откатом на
+# стандартный json. Вывод побайтно совпадает с JSONRenderer DRF в
+# компактном режиме: без пробелов, UTF-8 без \u-экранирования,
+# \u2028/\u2029 экранируются. Типы, которые orjson не сериализует так же,
+# как encoders.JSONEncoder DRF (datetime, Decimal, ленивые строки),
+# передаются в JSONEncoder.default. Всё, с чем orjson не справляется
+# (целые больше 64 бит, ключи не-строки), рендерится стандартным путем.
+#
+# Подключение - в REST_FRAMEWORK:
+#   'DEFAULT_RENDERER_CLASSES': ['tasks.renderers.FastJSONRenderer', ...],
+#   'DEFAULT_PARSER_CLASSES': ['tasks.renderers.FastJSONParser', ...],
+
+class FastJSONRenderer(JSONRenderer):
+
+    def __init__(self):
+        # Один экземпляр кодировщика на рендерер: default() не хранит состояния
+        self._default = JSONEncoder().default
+        self._options = 0
+        if orjson is not None:
+            self._options = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+
+    def can_use_orjson(self, accepted_media_type, renderer_context):
+        # Отступы (Browsable API, "; indent=4"), экранирование ASCII и
+        # NaN/Infinity поддерживает только стандартный путь
+        return (
+            orjson is not None
+            and self.compact
+            and not self.ensure_ascii
+            and self.strict
+            and self.get_indent(accepted_media_type, renderer_context or {}) is None
+        )
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        with measure_serialization():
+            return self._render(data, accepted_media_type, renderer_context)
+
+    def _render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if not self.can_use_orjson(accepted_media_type, renderer_context):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            ret = orjson.dumps(data, default=self._default, option=self._options)
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        return ret
+
+
+class FastJSONParser(JSONParser):
+    renderer_class = FastJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        if orjson is None or encoding.lower().replace('-', '') != 'utf8' or not self.strict:
+            return super().parse(stream, media_type, parser_context)
+
+        data = stream.read()
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            # Сообщение об ошибке (и редкие случаи вроде целых больше 64 бит)
+            # - как у стандартного парсера
+            return super().parse(io.BytesIO(data), media_type, parser_context)
+
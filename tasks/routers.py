@@ -0,0 +1,97 @@
+import hashlib
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from .cache import get_cache
+
+
+# Чтение с реплик. Реплики (TASKS_DB_REPLICAS, алиасы DATABASES) получают
+# только запросы представлений чтения, подключивших ReplicaReadMixin, и
+# только вне транзакции на основной БД; все записи и остальные чтения
+# (аутентификация, проверки перед записью) идут в основную БД.
+#
+# Read-your-writes: запись задач пользователя (invalidate_task_lists)
+# "прилипает" его чтения к основной БД на TASKS_DB_REPLICA_STICKY_SECONDS -
+# дольше, чем типичное отставание реплик. Метка хранится в общем кэше,
+# поэтому действует во всех процессах.
+
+# Реплика для чтений текущего запроса (None - основная БД)
+_read_alias = ContextVar('tasks_read_alias', default=None)
+
+
+def get_replicas():
+    return getattr(settings, 'TASKS_DB_REPLICAS', [])
+
+
+def _sticky_key(username):
+    digest = hashlib.md5(str(username).encode()).hexdigest()
+    return f'tasks:db:sticky:{digest}'
+
+
+def mark_primary_sticky(usernames):
+    if not get_replicas():
+        return
+    timeout = getattr(settings, 'TASKS_DB_REPLICA_STICKY_SECONDS', 5)
+    get_cache().set_many({_sticky_key(username): True for username in set(usernames)}, timeout)
+
+
+# Реплика для чтений пользователя: случайная из настроенных (одна на весь
+# запрос) или None, если реплик нет или пользователь недавно писал
+def choose_read_alias(username):
+    replicas = get_replicas()
+    if not replicas or get_cache().get(_sticky_key(username)):
+        return None
+    return random.choice(replicas)
+
+
+async def achoose_read_alias(username):
+    replicas = get_replicas()
+    if not replicas or await get_cache().aget(_sticky_key(username)):
+        return None
+    return random.choice(replicas)
+
+
+# Чтения текущего запроса идут на реплику
+def reading_replica():
+    return _read_alias.get() is not None
+
+
+@contextmanager
+def reading_from(alias):
+    token = _read_alias.set(alias)
+    try:
+        yield
+    finally:
+        _read_alias.reset(token)
+
+
+class ReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        alias = _read_alias.get()
+        # Внутри транзакции на основной БД реплика не видит ее изменений
+        if alias is None or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None
+        return alias
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    # Реплики содержат те же данные, что и основная БД
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *get_replicas()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+
+# GET представления чтения - с реплики (если пользователь не писал недавно)
+class ReplicaReadMixin:
+
+    def get(self, request, *args, **kwargs):
+        with reading_from(choose_read_alias(request.user.username)):
+            return super().get(request, *args, **kwargs)
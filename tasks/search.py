@@ -0,0 +1,109 @@
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db import connection
+from django.db.models import F, FloatField, Q, Value
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import Cursor
+
+from .pagination import TaskCursorPagination
+
+
+# Полнотекстовый поиск задач по title (вес A) и description (вес B).
+# На PostgreSQL - tsvector-колонка Task.search_vector с GIN-индексом,
+# которую поддерживает триггер (миграция 0005_task_search), и ранжирование
+# ts_rank. Конфигурация 'simple' не зависит от языка: задачи пишут и
+# по-русски, и по-английски. На остальных СУБД (SQLite в разработке и
+# тестах) - поиск подстрок без ранжирования.
+
+SEARCH_CONFIG = 'simple'
+
+
+# То же выражение, что и в триггере - для заполнения существующих строк
+def task_search_vector():
+    return (SearchVector('title', weight='A', config=SEARCH_CONFIG)
+            + SearchVector('description', weight='B', config=SEARCH_CONFIG))
+
+
+def search_tasks(queryset, query):
+    if connection.vendor == 'postgresql':
+        # websearch: слова, "фразы в кавычках", OR и -исключения
+        search_query = SearchQuery(query, search_type='websearch', config=SEARCH_CONFIG)
+        return (queryset
+                .filter(search_vector=search_query)
+                .annotate(rank=SearchRank(F('search_vector'), search_query)))
+
+    condition = Q()
+    for word in query.split():
+        condition &= Q(title__icontains=word) | Q(description__icontains=word)
+    return queryset.filter(condition).annotate(rank=Value(0.0, output_field=FloatField()))
+
+
+# Курсорная пагинация результатов поиска: по убыванию ранга, при равном
+# ранге - по убыванию id. CursorPagination DRF строит курсор только по
+# первому полю сортировки, а строки с равным рангом листает смещением
+# (не больше offset_cutoff) - на тысячах совпадений с одинаковым рангом
+# страницы начинают повторяться. Здесь курсор хранит пару (rank, id)
+# последней (или первой - для previous) строки страницы, и следующая
+# страница выбирается условием (rank < r) OR (rank = r AND id < i).
+class TaskSearchCursorPagination(TaskCursorPagination):
+    ordering = ('-rank', '-id')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.cursor = self.decode_cursor(request)
+        reverse = self.cursor is not None and self.cursor.reverse
+        self.position = self.decode_position(self.cursor.position) if self.cursor is not None else None
+
+        queryset = queryset.order_by('rank', 'id') if reverse else queryset.order_by('-rank', '-id')
+        if self.position is not None:
+            rank, task_id = self.position
+            if reverse:
+                queryset = queryset.filter(Q(rank__gt=rank) | Q(rank=rank, id__gt=task_id))
+            else:
+                queryset = queryset.filter(Q(rank__lt=rank) | Q(rank=rank, id__lt=task_id))
+
+        results = list(queryset[:self.page_size + 1])
+        self.page = results[:self.page_size]
+        has_following = len(results) > self.page_size
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = self.position is not None, has_following
+        else:
+            self.has_next, self.has_previous = has_following, self.position is not None
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        position = self.get_row_position(self.page[-1]) if self.page else self.position
+        return self.encode_cursor(Cursor(offset=0, reverse=False, position=self.encode_position(position)))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        position = self.get_row_position(self.page[0]) if self.page else self.position
+        return self.encode_cursor(Cursor(offset=0, reverse=True, position=self.encode_position(position)))
+
+    @staticmethod
+    def get_row_position(row):
+        if isinstance(row, dict):
+            return row['rank'], row['id']
+        return row.rank, row.id
+
+    # repr() числа с плавающей точкой восстанавливается float() без потерь,
+    # поэтому граничная строка не теряется и не повторяется
+    @staticmethod
+    def encode_position(position):
+        rank, task_id = position
+        return f'{float(rank)!r}|{task_id}'
+
+    def decode_position(self, value):
+        try:
+            rank, task_id = value.split('|')
+            return float(rank), int(task_id)
+        except (AttributeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
@@ -6,3 +6,42 @@ class TaskSerializer(serializers.ModelSerializer):
         model = Task
         fields = ['id', 'title', 'description', 'status', 'user']  
         read_only_fields = ['user'] 
+
+    # fields - только часть полей ответа (?fields= / ?exclude=, tasks/values.py)
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+    # UPDATE только переданных полей (и метки изменения) вместо записи всей строки
+    def update(self, instance, validated_data):
+        for field, value in validated_data.items():
+            setattr(instance, field, value)
+        instance.save(update_fields=[*validated_data, 'updated_at'])
+        return instance
+
+
+# Одна операция пакетного запроса
+class BulkOperationSerializer(serializers.Serializer):
+    OPERATIONS = ['create', 'update', 'complete', 'delete']
+
+    op = serializers.ChoiceField(choices=OPERATIONS)
+    id = serializers.IntegerField(required=False)
+    data = serializers.DictField(required=False, default=dict)
+
+    def validate(self, attrs):
+        if attrs['op'] != 'create' and attrs.get('id') is None:
+            raise serializers.ValidationError({'id': 'This field is required for this operation.'})
+        return attrs
+
+
+# Пакетный запрос: список операций над задачами
+class BulkRequestSerializer(serializers.Serializer):
+    operations = serializers.ListField(child=BulkOperationSerializer(), allow_empty=False)
+
+    def validate_operations(self, value):
+        max_operations = self.context.get('max_operations')
+        if max_operations and len(value) > max_operations:
+            raise serializers.ValidationError(f'Ensure this field has no more than {max_operations} elements.')
+        return value
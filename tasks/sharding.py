@@ -0,0 +1,242 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import DEFAULT_DB_ALIAS, connections, router, transaction
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.permissions import SAFE_METHODS
+
+from .cache import get_cache
+from .merge import MergedQuerySet
+from .models import Task, UserShard
+
+
+# Шардирование задач по пользователю. Задачи пользователя (Task, а также
+# архив ArchivedTask, TaskTombstone и TaskCounter, которые поддерживаются
+# вместе с ними) хранятся
+# в одной из БД TASKS_SHARDS; основная БД - первый шард, в ней же остаются
+# пользователи и карта шардов (UserShard). Пустой TASKS_SHARDS - шардирования
+# нет, все как раньше.
+#
+#   - Запросы одного пользователя (его список, создание, изменение, завершение,
+#     удаление, пакетные операции, синхронизация) идут только в его шард:
+#     TaskShardMixin выбирает шард, ShardRouter направляет в него запросы.
+#   - Общие списки (все задачи, фильтр по статусу), поиск задачи по id,
+#     полнотекстовый поиск и выгрузка опрашивают все шарды (scatter) и
+#     сливают отсортированные результаты (k-way merge). Команды обслуживания
+#     (сверка счетчиков, заполнение search_vector, архив) обходят шарды по
+#     очереди.
+#   - id задач глобально уникальны: на дополнительных шардах id выдает
+#     последовательность tasks_task основной БД.
+#   - Внешний ключ задачи на пользователя на дополнительном шарде указывает на
+#     строку-"якорь" (id и username пользователя, без пароля), которая
+#     создается при назначении шарда.
+#
+# Пользователи переносятся между шардами командой rebalance_task_shards.
+
+SHARDED_MODELS = frozenset({'tasks.task', 'tasks.archivedtask', 'tasks.tasktombstone', 'tasks.taskcounter'})
+
+# Шард задач текущего запроса (None - маршрутизация по умолчанию)
+_shard_alias = ContextVar('tasks_shard_alias', default=None)
+
+
+def get_shards():
+    return getattr(settings, 'TASKS_SHARDS', None) or [DEFAULT_DB_ALIAS]
+
+
+def sharding_enabled():
+    return len(get_shards()) > 1
+
+
+@contextmanager
+def using_shard(alias):
+    token = _shard_alias.set(alias)
+    try:
+        yield
+    finally:
+        _shard_alias.reset(token)
+
+
+# Карта шардов
+
+def _map_key(user_id):
+    return f'tasks:shard:{user_id}'
+
+
+def _load_user_shard(row):
+    return tuple(row) if row is not None else (DEFAULT_DB_ALIAS, None)
+
+
+# Шард пользователя и шард, на который идет перенос (или None).
+# Карта кэшируется (TASKS_CACHE_ALIAS); rebalance_task_shards обновляет
+# кэш при каждом изменении строки карты. cached=False - прямо из основной
+# БД: так читают запросы на запись, чтобы запрет записи на время переноса
+# действовал сразу во всех процессах
+def get_user_shard(user_id, cached=True):
+    if not sharding_enabled():
+        return DEFAULT_DB_ALIAS, None
+    if not cached:
+        return _load_user_shard(
+            UserShard.objects.using(DEFAULT_DB_ALIAS)
+            .filter(user_id=user_id).values_list('shard', 'moving_to').first()
+        )
+    cache = get_cache()
+    entry = cache.get(_map_key(user_id))
+    if entry is None:
+        entry = get_user_shard(user_id, cached=False)
+        cache.set(_map_key(user_id), entry, getattr(settings, 'TASKS_SHARD_MAP_CACHE_TIMEOUT', 300))
+    return entry
+
+
+def publish_user_shard(user_id, shard, moving_to=None):
+    get_cache().set(_map_key(user_id), (shard, moving_to), getattr(settings, 'TASKS_SHARD_MAP_CACHE_TIMEOUT', 300))
+
+
+# Шард пользователя по username: один запрос к основной БД (LEFT JOIN карты).
+# Неизвестный пользователь - основная БД (представление само ответит 404)
+def get_username_shard(username):
+    if not sharding_enabled():
+        return DEFAULT_DB_ALIAS
+    row = (get_user_model().objects.using(DEFAULT_DB_ALIAS)
+           .filter(username=username).values_list('task_shard__shard').first())
+    return (row and row[0]) or DEFAULT_DB_ALIAS
+
+
+async def aget_username_shard(username):
+    if not sharding_enabled():
+        return DEFAULT_DB_ALIAS
+    row = await (get_user_model().objects.using(DEFAULT_DB_ALIAS)
+                 .filter(username=username).values_list('task_shard__shard').afirst())
+    return (row and row[0]) or DEFAULT_DB_ALIAS
+
+
+# Строка пользователя на шарде - цель внешних ключей задач; повторный вызов
+# ничего не меняет
+def ensure_anchor(alias, user_id, username):
+    if alias == DEFAULT_DB_ALIAS:
+        return
+    User = get_user_model()
+    User.objects.using(alias).bulk_create(
+        [User(id=user_id, username=username, first_name='')], ignore_conflicts=True,
+    )
+
+
+# Шард нового пользователя: по id по кругу
+def assign_new_user(user):
+    shards = get_shards()
+    alias = shards[user.pk % len(shards)]
+    ensure_anchor(alias, user.pk, user.username)
+    UserShard.objects.using(DEFAULT_DB_ALIAS).create(user_id=user.pk, shard=alias)
+    publish_user_shard(user.pk, alias)
+
+
+# id для новых задач: в основной БД их выдает сама БД (None), на остальных
+# шардах - последовательность tasks_task основной БД
+def next_task_ids(count):
+    if router.db_for_write(Task) in (None, DEFAULT_DB_ALIAS):
+        return [None] * count
+    return allocate_task_ids(count)
+
+
+def next_task_id():
+    return next_task_ids(1)[0]
+
+
+def allocate_task_ids(count):
+    connection = connections[DEFAULT_DB_ALIAS]
+    table = Task._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(
+                'SELECT nextval(pg_get_serial_sequence(%s, %s)) FROM generate_series(1, %s)',
+                [table, 'id', count],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+        # SQLite: счетчик AUTOINCREMENT таблицы (sqlite_sequence)
+        with transaction.atomic(using=DEFAULT_DB_ALIAS):
+            cursor.execute('UPDATE sqlite_sequence SET seq = seq + %s WHERE name = %s RETURNING seq',
+                           [count, table])
+            row = cursor.fetchone()
+            if row is None:
+                cursor.execute('SELECT COALESCE(MAX(id), 0) + %s FROM ' + connection.ops.quote_name(table),
+                               [count])
+                row = cursor.fetchone()
+                cursor.execute('INSERT INTO sqlite_sequence (name, seq) VALUES (%s, %s)', [table, row[0]])
+        return list(range(row[0] - count + 1, row[0] + 1))
+
+
+class ShardMoving(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = "User's tasks are being moved to another shard, retry later."
+    default_code = 'shard_moving'
+    wait = 1
+
+
+class ShardRouter:
+
+    def db_for_read(self, model, **hints):
+        if model._meta.label_lower in SHARDED_MODELS:
+            return _shard_alias.get()
+        # Пользователь задачи с шарда (task.user) - из основной БД, а не якорь
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db not in (None, DEFAULT_DB_ALIAS) \
+                and instance._state.db in get_shards():
+            return DEFAULT_DB_ALIAS
+        return None
+
+    def db_for_write(self, model, **hints):
+        if model._meta.label_lower in SHARDED_MODELS:
+            return _shard_alias.get()
+        return None
+
+    # Задачи шардов ссылаются на пользователей основной БД
+    def allow_relation(self, obj1, obj2, **hints):
+        shards = get_shards()
+        if obj1._state.db in shards and obj2._state.db in shards:
+            return True
+        return None
+
+
+# Запросы представления к задачам - в шард одного пользователя: владельца
+# задач из параметра URL shard_username_kwarg или (по умолчанию) текущего
+# пользователя. Во время переноса задач пользователя на другой шард его
+# запросы на запись получают 503 (Retry-After), чтение идет со старого шарда.
+# Запись проверяет карту в основной БД, а не в кэше.
+# Шард выбирается после аутентификации (initial) и действует до конца
+# обработки запроса (finalize_response вызывается и при исключениях).
+class TaskShardMixin:
+    shard_username_kwarg = None
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if sharding_enabled():
+            self._shard_token = _shard_alias.set(self.get_task_shard(request))
+
+    def get_task_shard(self, request):
+        if self.shard_username_kwarg is not None:
+            return get_username_shard(self.kwargs.get(self.shard_username_kwarg))
+        if request.method in SAFE_METHODS:
+            return get_user_shard(request.user.id)[0]
+        shard, moving_to = get_user_shard(request.user.id, cached=False)
+        if moving_to is not None:
+            raise ShardMoving()
+        return shard
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        token = self.__dict__.pop('_shard_token', None)
+        if token is not None:
+            _shard_alias.reset(token)
+        return super().finalize_response(request, response, *args, **kwargs)
+
+
+# Запрос ко всем шардам: без шардирования - исходный queryset. Для
+# MergedQuerySet (например, задачи вместе с архивом) опрашивается каждая
+# его часть на каждом шарде
+def scatter(queryset):
+    if not sharding_enabled():
+        return queryset
+    parts = queryset.querysets if isinstance(queryset, MergedQuerySet) else [queryset]
+    return MergedQuerySet([part.using(alias) for part in parts for alias in get_shards()])
@@ -0,0 +1,64 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import Signal, receiver
+
+from .authentication import user_state_cache
+from .events import event_hub
+from .models import Task
+from .sharding import assign_new_user, get_shards, sharding_enabled
+
+
+# Изменения задач для ленты событий. Отправляется путями записи, которые
+# обходят сигналы моделей (UPDATE/DELETE одним запросом, bulk-операции);
+# обычные save() приходят сюда через post_save.
+# changes: список событий {"type", "task", "previous_status"}
+tasks_changed = Signal()
+
+
+# Сброс закэшированного состояния пользователя (is_active, пароль и т.д.)
+# при любом изменении или удалении пользователя
+@receiver([post_save, post_delete], sender=settings.AUTH_USER_MODEL)
+def invalidate_user_state(sender, instance, **kwargs):
+    user_state_cache.invalidate(instance.pk)
+
+
+# Шардирование задач: новому пользователю назначается шард, у якорей
+# пользователя на шардах обновляется username (JOIN user__username в
+# запросах задач), при удалении пользователя якоря удаляются вместе с его
+# задачами на шардах. Записи в сами шарды (using) не обрабатываются
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def update_user_shards(sender, instance, created, using, raw=False, **kwargs):
+    if raw or using != DEFAULT_DB_ALIAS or not sharding_enabled():
+        return
+    if created:
+        assign_new_user(instance)
+        return
+    for alias in get_shards()[1:]:
+        get_user_model().objects.using(alias).filter(pk=instance.pk).update(username=instance.username)
+
+
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def delete_user_shards(sender, instance, using, **kwargs):
+    if using != DEFAULT_DB_ALIAS or not sharding_enabled():
+        return
+    for alias in get_shards()[1:]:
+        get_user_model().objects.using(alias).filter(pk=instance.pk).delete()
+
+
+@receiver(post_save, sender=Task)
+def task_saved(sender, instance, created, **kwargs):
+    from .serializers import TaskSerializer
+
+    tasks_changed.send(sender=Task, changes=[{
+        'type': 'created' if created else 'updated',
+        'task': TaskSerializer(instance).data,
+        'previous_status': None if created else instance.loaded_status,
+    }])
+    instance.loaded_status = instance.status
+
+
+@receiver(tasks_changed, sender=Task)
+def publish_task_events(sender, changes, **kwargs):
+    event_hub.publish(changes)
@@ -0,0 +1,44 @@
+from django.conf import settings
+from django.db.models import Sum
+
+from .cache import get_cache
+from .models import Task, TaskCounter
+from .sharding import scatter
+
+
+# Статистика задач по материализованным счетчикам (TaskCounter) -
+# без COUNT(*) по таблице задач на каждый запрос.
+
+TASK_STATUSES = [value for value, _ in Task.STATUS_CHOICES]
+
+GLOBAL_STATS_CACHE_KEY = 'tasks:stats:global'
+
+
+def summarize(counts):
+    by_status = {status: 0 for status in TASK_STATUSES}
+    by_status.update(counts)
+    return {'total': sum(by_status.values()), 'by_status': by_status}
+
+
+# Общие счетчики - сумма по строкам пользователей (по 3 строки на
+# пользователя, с шардированием - по всем шардам); результат кратко
+# кэшируется, чтобы частые запросы дашбордов не суммировали таблицу каждый раз
+def get_global_stats():
+    cache = get_cache()
+    stats = cache.get(GLOBAL_STATS_CACHE_KEY)
+    if stats is None:
+        totals = {}
+        for row in scatter(TaskCounter.objects.values('status').annotate(total=Sum('count')).order_by()):
+            totals[row['status']] = totals.get(row['status'], 0) + row['total']
+        stats = summarize(totals)
+        cache.set(GLOBAL_STATS_CACHE_KEY, stats, getattr(settings, 'TASKS_STATS_CACHE_TIMEOUT', 5))
+    return stats
+
+
+# Счетчики нескольких пользователей одним запросом (на шард): {user_id: summary}
+def get_user_stats(user_ids):
+    counts = {user_id: {} for user_id in user_ids}
+    rows = scatter(TaskCounter.objects.filter(user_id__in=user_ids).values_list('user_id', 'status', 'count'))
+    for user_id, status, count in rows:
+        counts[user_id][status] = counts[user_id].get(status, 0) + count
+    return {user_id: summarize(user_counts) for user_id, user_counts in counts.items()}
@@ -0,0 +1,113 @@
+import base64
+import binascii
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+
+from .archive import with_archive
+from .models import TaskTombstone
+
+
+# Инкрементальная синхронизация задач пользователя.
+# Водяной знак - непрозрачная строка с позициями в двух потоках изменений:
+# задачи по (updated_at, id) и удаления (tombstones) по (deleted_at, id).
+# Оба потока читаются по индексам (user, updated_at, id) и (user, deleted_at, id).
+# Поток задач включает архив (ArchivedTask): перенос в архив не меняет
+# updated_at и не пишет меток удаления - для клиента задача не изменилась,
+# а полная синхронизация возвращает и задачи из архива.
+
+class WatermarkExpired(APIException):
+    status_code = status.HTTP_410_GONE
+    default_detail = 'Watermark is too old, full resync required.'
+    default_code = 'watermark_expired'
+
+
+def encode_watermark(tasks_position, tombstones_position):
+    data = {
+        't': [tasks_position[0].isoformat(), tasks_position[1]],
+        'd': [tombstones_position[0].isoformat(), tombstones_position[1]],
+    }
+    return base64.urlsafe_b64encode(json.dumps(data, separators=(',', ':')).encode()).decode()
+
+
+def decode_watermark(value):
+    try:
+        data = json.loads(base64.urlsafe_b64decode(value.encode()))
+        positions = []
+        for key in ('t', 'd'):
+            moment, pk = data[key]
+            moment = parse_datetime(moment)
+            if moment is None:
+                raise ValueError(moment)
+            positions.append((moment, int(pk)))
+    except (binascii.Error, ValueError, TypeError, KeyError):
+        raise ValidationError({'since': 'Invalid watermark.'})
+    return tuple(positions)
+
+
+def _after(position, time_field):
+    moment, pk = position
+    return Q(**{f'{time_field}__gt': moment}) | Q(**{time_field: moment, 'id__gt': pk})
+
+
+def _next_position(last, current, horizon, has_more):
+    if has_more:
+        return last or current or horizon
+    # Поток прочитан до конца: знак переходит на "горизонт" now - settle,
+    # даже если новых изменений не было (иначе знак клиента, у которого нет
+    # удалений, устареет через TASKS_SYNC_TOMBSTONE_RETENTION_DAYS). Дальше
+    # горизонта знак не идет, чтобы не пропустить транзакции, которые
+    # зафиксируются позже с меньшим updated_at. Изменения в этом окне придут
+    # повторно (клиент применяет их идемпотентно).
+    return horizon
+
+
+# Изменения задач пользователя после водяного знака since (None - полная
+# синхронизация). Возвращает (задачи, id удаленных задач, новый знак, has_more).
+def get_changes(username, since, limit):
+    now = timezone.now()
+    horizon = (now - timedelta(seconds=getattr(settings, 'TASKS_SYNC_SETTLE_SECONDS', 5)), 0)
+
+    if since is None:
+        # При полной синхронизации удаления не нужны - только текущие задачи
+        tasks_position, tombstones_position = None, horizon
+    else:
+        tasks_position, tombstones_position = decode_watermark(since)
+        retention = timedelta(days=getattr(settings, 'TASKS_SYNC_TOMBSTONE_RETENTION_DAYS', 30))
+        if tombstones_position[0] < now - retention:
+            raise WatermarkExpired()
+
+    tasks = with_archive(lambda model: model.objects.filter(user__username=username).order_by('updated_at', 'id'))
+    if tasks_position is not None:
+        tasks = tasks.filter(_after(tasks_position, 'updated_at'))
+    changed = list(tasks[:limit + 1])
+    tasks_more = len(changed) > limit
+    changed = changed[:limit]
+
+    deleted, tombstones_more, last_tombstone = [], False, None
+    if since is not None:
+        tombstones = list(
+            TaskTombstone.objects
+            .filter(user__username=username)
+            .filter(_after(tombstones_position, 'deleted_at'))
+            .order_by('deleted_at', 'id')
+            .values_list('id', 'task_id', 'deleted_at')[:limit + 1]
+        )
+        tombstones_more = len(tombstones) > limit
+        tombstones = tombstones[:limit]
+        deleted = [task_id for _, task_id, _ in tombstones]
+        if tombstones:
+            last_tombstone = (tombstones[-1][2], tombstones[-1][0])
+
+    last_task = (changed[-1].updated_at, changed[-1].id) if changed else None
+    watermark = encode_watermark(
+        _next_position(last_task, tasks_position, horizon, tasks_more),
+        _next_position(last_tombstone, tombstones_position, horizon, tombstones_more),
+    )
+    return changed, deleted, watermark, tasks_more or tombstones_more
@@ -1,15 +1,53 @@
-from django.test import TestCase
+from asgiref.sync import sync_to_async
+from django.core.management import CommandError, call_command
+from django.db import connections
+from django.test.utils import CaptureQueriesContext
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.core.cache import cache
+from django.core.cache.backends.db import DatabaseCache
+from django.core.cache.backends.redis import RedisCache
+from django.core.exceptions import ImproperlyConfigured
 from django.contrib.auth import get_user_model
-from rest_framework.test import APITestCase
+from django.utils.translation import gettext_lazy
+from rest_framework.exceptions import ErrorDetail, ParseError
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient, APITestCase
 from rest_framework import status
+from rest_framework_simplejwt.tokens import RefreshToken
 from django.urls import reverse
-from .models import Task
+from django.utils import timezone
+from .models import ArchivedTask, Task, TaskCounter, TaskTombstone, UserShard
+from .serializers import TaskSerializer
+from .authentication import UserStateCache, user_state_cache
+from .values import task_values_serializer
+from .renderers import FastJSONParser, FastJSONRenderer
+from .search import TaskSearchCursorPagination
+from .pagination import TaskCursorPagination
+from .instrumentation import metrics_registry, wrap_open_connections
+from .throttling import TokenBucket, TokenBucketThrottle, token_bucket
+from .sharding import get_user_shard
+from .cache import cache_stats, list_cache_timeout
+from .admin import EstimatedCountPaginator
+from .events import PostgresNotifyBackend
+import asyncio
+import csv
+import datetime
+import decimal
+import io
 import json
+import re
+import uuid
+from collections import OrderedDict
+from unittest import mock
 
 User = get_user_model()
 
 class TaskAPITestCase(APITestCase):
     def setUp(self):
+        cache.clear()
+
         # Создаем тестовых пользователей
         self.user1 = User.objects.create_user(
             username='testuser1', password='testpass1', first_name='Test1', last_name='User1'
@@ -73,6 +111,20 @@ class TaskAPITestCase(APITestCase):
         self.task1.refresh_from_db()
         self.assertEqual(self.task1.status, 'completed')   
 
+    def test_mark_task_completed_not_owner(self):
+        """ Отметить выполненной можно только свою задачу """
+        task = Task.objects.create(title="Foreign Task", status="new", user=self.user2)
+        response = self.client.put(reverse('task-complete', args=[task.id]))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        task.refresh_from_db()
+        self.assertEqual(task.status, 'new')
+
+        response = self.client.put(reverse('task-complete', args=[999999]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        response = self.client.delete(reverse('task-delete', args=[999999]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
     def test_filter_tasks_by_status(self):
         """ Фильтрация задач по статусу """
         response = self.client.get(reverse('task-filter-by-status', args=['new']))
@@ -142,9 +194,1566 @@ class TaskAPITestCase(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertTrue('next' in response.data or 'previous' in response.data)  
 
+    def test_cursor_pagination(self):
+        """ Курсорная пагинация """
+        for i in range(10):
+            Task.objects.create(title=f"Task {i+4}", description="Bulk task", status="new", user=self.user1)
+
+        response = self.client.get(reverse('task-list'), {'pagination': 'cursor'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn('count', response.data)
+        self.assertEqual(len(response.data['results']), 10)
+        self.assertIsNone(response.data['previous'])
+        first_page_ids = [task['id'] for task in response.data['results']]
+        self.assertEqual(first_page_ids, sorted(first_page_ids, reverse=True))
+
+        # Следующая страница доступна по непрозрачному курсору
+        response = self.client.get(response.data['next'])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 3)
+        self.assertIsNone(response.data['next'])
+        self.assertIsNotNone(response.data['previous'])
+        self.assertLess(response.data['results'][0]['id'], first_page_ids[-1])
+
+        response = self.client.get(reverse('task-filter-by-status', args=['new']), {'pagination': 'cursor'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 10)
+
+    def test_list_cache_invalidation(self):
+        """ Кэш списков задач сбрасывается при изменении задач """
+        url = reverse('user-task-list', args=['testuser1'])
+        self.assertEqual(len(self.client.get(url).data['results']), 2)
+
+        # Изменение в обход API не сбрасывает кэш - отдается закэшированный ответ
+        Task.objects.create(title="Direct Task", status="new", user=self.user1)
+        self.assertEqual(len(self.client.get(url).data['results']), 2)
+
+        # Создание через API увеличивает версию пользователя и статуса
+        # (инвалидация выполняется после фиксации транзакции)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('task-create'), {'title': 'New Task', 'status': 'new'})
+        self.assertEqual(len(self.client.get(url).data['results']), 4)
+
+        status_url = reverse('task-filter-by-status', args=['completed'])
+        self.assertEqual(len(self.client.get(status_url).data['results']), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.put(reverse('task-complete', args=[self.task1.id]))
+        self.assertEqual(len(self.client.get(status_url).data['results']), 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(reverse('task-delete', args=[self.task1.id]))
+        self.assertEqual(len(self.client.get(status_url).data['results']), 1)
+
+    def test_conditional_get(self):
+        """ ETag / If-None-Match для задачи и списков """
+        url = reverse('task-detail', args=[self.task1.id])
+        response = self.client.get(url)
+        etag = response['ETag']
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['ETag'], etag)
+
+        self.client.put(reverse('task-update', args=[self.task1.id]),
+                        {'title': 'Updated Task Title', 'status': 'new'})
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+        for list_url in (reverse('task-list'), reverse('user-task-list', args=['testuser1']),
+                         reverse('task-filter-by-status', args=['new'])):
+            etag = self.client.get(list_url)['ETag']
+            response = self.client.get(list_url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        # Другая страница/режим пагинации - другой ETag
+        response = self.client.get(reverse('task-list'), {'pagination': 'cursor'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        etag = self.client.get(reverse('task-list'))['ETag']
+        Task.objects.filter(id=self.task2.id).update(title="Changed", updated_at=timezone.now())
+        response = self.client.get(reverse('task-list'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_bulk_operations(self):
+        """ Пакетные операции над задачами """
+        data = {'operations': [
+            {'op': 'create', 'data': {'title': 'Bulk Task', 'status': 'new'}},
+            {'op': 'create', 'data': {'status': 'unknown'}},
+            {'op': 'update', 'id': self.task1.id, 'data': {'title': 'Bulk Updated'}},
+            {'op': 'complete', 'id': self.task2.id},
+            {'op': 'delete', 'id': self.task3.id},
+            {'op': 'delete', 'id': 999999},
+            {'op': 'complete', 'id': self.task2.id},
+        ]}
+        response = self.client.post(reverse('task-bulk'), data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = response.data['results']
+        self.assertEqual([result['status'] for result in results], [201, 400, 200, 200, 403, 404, 400])
+        self.assertEqual(results[0]['task']['title'], 'Bulk Task')
+        self.assertEqual(results[0]['task']['user'], self.user1.id)
+        self.assertIn('title', results[1]['errors'])
+        self.assertEqual(results[2]['task']['title'], 'Bulk Updated')
+
+        self.assertTrue(Task.objects.filter(id=results[0]['id'], user=self.user1).exists())
+        self.task1.refresh_from_db()
+        self.assertEqual(self.task1.title, 'Bulk Updated')
+        self.task2.refresh_from_db()
+        self.assertEqual(self.task2.status, 'completed')
+        self.assertTrue(Task.objects.filter(id=self.task3.id).exists())
+
+        response = self.client.post(reverse('task-bulk'), {'operations': [{'op': 'delete'}]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(TASKS_SYNC_SETTLE_SECONDS=0)
+    def test_task_sync(self):
+        """ Инкрементальная синхронизация: изменения, удаления, водяной знак """
+        url = reverse('user-task-sync', args=['testuser1'])
+        response = self.client.get(url, {'limit': 1})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([task['id'] for task in response.data['changes']], [self.task1.id])
+        self.assertTrue(response.data['has_more'])
+
+        response = self.client.get(url, {'limit': 1, 'since': response.data['watermark']})
+        self.assertEqual([task['id'] for task in response.data['changes']], [self.task2.id])
+        self.assertEqual(response.data['deleted'], [])
+        self.assertFalse(response.data['has_more'])
+        watermark = response.data['watermark']
+
+        self.client.patch(reverse('task-update', args=[self.task1.id]), {'title': 'Synced'})
+        self.client.delete(reverse('task-delete', args=[self.task2.id]))
+        response = self.client.get(url, {'since': watermark})
+        self.assertEqual([task['title'] for task in response.data['changes']], ['Synced'])
+        self.assertEqual(response.data['deleted'], [self.task2.id])
+
+        response = self.client.get(url, {'since': 'garbage'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(reverse('user-task-sync', args=['nonexistent']))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_task_sync_watermark_advances_without_deletions(self):
+        """ Знак клиента без удалений не устаревает: через срок хранения меток - 200, а не 410 """
+        url = reverse('user-task-sync', args=['testuser1'])
+        watermark = self.client.get(url).data['watermark']
+        now = timezone.now()
+        for days in (20, 40):
+            with mock.patch('tasks.sync.timezone.now', return_value=now + datetime.timedelta(days=days)):
+                response = self.client.get(url, {'since': watermark})
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response.data['deleted'], [])
+            watermark = response.data['watermark']
+
+    def test_task_export(self):
+        """ Потоковая выгрузка задач в NDJSON и CSV """
+        response = self.client.get(reverse('task-export'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        expected = TaskSerializer(Task.objects.order_by('id'), many=True).data
+        self.assertEqual([json.loads(line) for line in lines], [dict(task) for task in expected])
+
+        response = self.client.get(reverse('task-export'), {'output': 'csv', 'user': 'testuser1',
+                                                            'status': 'in_progress'})
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        rows = list(csv.reader(io.StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual(rows[0], ['id', 'title', 'description', 'status', 'user'])
+        self.assertEqual([row[0] for row in rows[1:]], [str(self.task2.id)])
+
+        response = self.client.get(reverse('task-export'), HTTP_ACCEPT='text/csv')
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertFalse(response.is_async)
+        response = self.client.get(reverse('task-export'), {'output': 'xml'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(reverse('task-export'), {'user': 'nonexistent'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_json_renderer_byte_equivalence(self):
+        """ Ответы FastJSONRenderer побайтно совпадают с JSONRenderer DRF """
+        self.client.patch(reverse('task-update', args=[self.task1.id]),
+                          {'title': 'Задача \u2028 "кавычки"'}, format='json')
+        responses = [
+            self.client.get(reverse('task-list')),
+            self.client.get(reverse('task-list'), {'pagination': 'cursor'}),
+            self.client.get(reverse('user-task-list', args=['testuser1'])),
+            self.client.get(reverse('task-filter-by-status', args=['new'])),
+            self.client.get(reverse('task-detail', args=[self.task1.id])),
+            self.client.get(reverse('task-detail', args=[999999])),
+            self.client.post(reverse('task-create'), {'status': 'unknown'}, format='json'),
+            self.client.post(reverse('task-bulk'), {'operations': [
+                {'op': 'create', 'data': {'title': 'Bulk'}}, {'op': 'delete', 'id': self.task3.id},
+            ]}, format='json'),
+        ]
+        for response in responses:
+            self.assertEqual(response['Content-Type'], 'application/json')
+            self.assertEqual(response.content, JSONRenderer().render(response.data))
+        # Компактный вывод: без пробелов после разделителей
+        self.assertNotIn(b'", "', responses[0].content)
+        self.assertNotIn(b'": ', responses[0].content)
+
+    def test_search_tasks(self):
+        """ Поиск задач по словам из title и description с фильтрами """
+        Task.objects.create(title="Buy milk", description="At the corner shop", status="new", user=self.user1)
+        Task.objects.create(title="Call Bob", description="buy tickets", status="completed", user=self.user2)
+
+        response = self.client.get(reverse('task-search'), {'q': 'buy'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([task['title'] for task in response.data['results']], ['Call Bob', 'Buy milk'])
+        self.assertNotIn('rank', response.data['results'][0])
+
+        response = self.client.get(reverse('task-search'), {'q': 'buy', 'user': 'testuser1'})
+        self.assertEqual([task['title'] for task in response.data['results']], ['Buy milk'])
+        response = self.client.get(reverse('task-search'), {'q': 'buy', 'status': 'completed'})
+        self.assertEqual([task['title'] for task in response.data['results']], ['Call Bob'])
+        response = self.client.get(reverse('task-search'), {'q': 'buy shop'})
+        self.assertEqual([task['title'] for task in response.data['results']], ['Buy milk'])
+
+        self.assertEqual(self.client.get(reverse('task-search')).status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(reverse('task-search'), {'q': 'x', 'status': 'unknown'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(reverse('task-search'), {'q': 'x', 'user': 'nonexistent'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_search_cursor_pagination(self):
+        """ Курсорная пагинация результатов поиска """
+        with mock.patch.object(TaskSearchCursorPagination, 'page_size', 2):
+            response = self.client.get(reverse('task-search'), {'q': 'task'})
+            self.assertEqual([task['id'] for task in response.data['results']], [self.task3.id, self.task2.id])
+            self.assertIsNotNone(response.data['next'])
+            response = self.client.get(response.data['next'])
+        self.assertEqual([task['id'] for task in response.data['results']], [self.task1.id])
+        self.assertIsNone(response.data['next'])
+
+    def test_search_cursor_pagination_with_tied_ranks(self):
+        """ Больше offset_cutoff совпадений с одинаковым рангом: каждая задача - ровно один раз """
+        tasks = Task.objects.bulk_create([
+            Task(title=f'Tied match {number}', status='new', user=self.user1) for number in range(1200)
+        ])
+        ids, pages = [], []
+        with mock.patch.object(TaskSearchCursorPagination, 'page_size', 100):
+            url, params = reverse('task-search'), {'q': 'tied'}
+            while url is not None and len(pages) < 20:
+                response = self.client.get(url, params)
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                pages.append([task['id'] for task in response.data['results']])
+                ids.extend(pages[-1])
+                url, params = response.data['next'], None
+            # Назад с последней страницы - предпоследняя
+            response = self.client.get(response.data['previous'])
+        self.assertEqual(len(pages), 12)
+        self.assertEqual(sorted(ids), sorted(task.id for task in tasks))
+        self.assertEqual([task['id'] for task in response.data['results']], pages[-2])
+
+    @override_settings(TASKS_STATS_CACHE_TIMEOUT=0)
+    def test_task_stats(self):
+        """ Статистика задач по счетчикам после записи через API """
+        self.client.post(reverse('task-create'), {'title': 'New Task', 'status': 'new'})
+        self.client.put(reverse('task-complete', args=[self.task1.id]))
+        self.client.patch(reverse('task-update', args=[self.task2.id]), {'status': 'new'})
+        self.client.post(reverse('task-bulk'), {'operations': [
+            {'op': 'create', 'data': {'title': 'Bulk', 'status': 'in_progress'}},
+            {'op': 'delete', 'id': self.task2.id},
+        ]}, format='json')
+
+        response = self.client.get(reverse('task-stats'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {
+            'total': 4, 'by_status': {'new': 1, 'in_progress': 1, 'completed': 2},
+        })
+
+        response = self.client.get(reverse('user-task-stats', args=['testuser1']))
+        self.assertEqual(response.data, {
+            'user': 'testuser1', 'total': 3, 'by_status': {'new': 1, 'in_progress': 1, 'completed': 1},
+        })
+        response = self.client.get(reverse('user-task-stats', args=['nonexistent']))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        response = self.client.get(reverse('user-task-stats-list'))
+        self.assertEqual([(row['user'], row['total']) for row in response.data['results']],
+                         [('testuser2', 1), ('testuser1', 3)])
+
+    def test_reconcile_task_counters(self):
+        """ Сверка счетчиков находит и исправляет расхождения """
+        TaskCounter.objects.filter(user=self.user1, status='new').update(count=10)
+        TaskCounter.objects.filter(user=self.user2).delete()
+
+        out = io.StringIO()
+        call_command('reconcile_task_counters', '--dry-run', stdout=out)
+        self.assertIn('Расхождений найдено: 2', out.getvalue())
+        self.assertEqual(TaskCounter.objects.get(user=self.user1, status='new').count, 10)
+
+        call_command('reconcile_task_counters', '--batch-size', '1', stdout=io.StringIO())
+        counts = {(c.user_id, c.status): c.count for c in TaskCounter.objects.exclude(count=0)}
+        self.assertEqual(counts, {(self.user1.id, 'new'): 1, (self.user1.id, 'in_progress'): 1,
+                                  (self.user2.id, 'completed'): 1})
+        out = io.StringIO()
+        call_command('reconcile_task_counters', stdout=out)
+        self.assertIn('Счетчики совпадают', out.getvalue())
+
+    def test_inactive_user_rejected(self):
+        """ Деактивация пользователя сбрасывает кэш аутентификации """
+        response = self.client.get(reverse('task-detail', args=[self.task1.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        self.user1.is_active = False
+        self.user1.save()
+        response = self.client.get(reverse('task-detail', args=[self.task1.id]))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_user_change_reaches_other_processes(self):
+        """ Изменение пользователя в другом процессе сбрасывает кэш аутентификации этого процесса """
+        response = self.client.get(reverse('task-detail', args=[self.task1.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        # Сигнал в другом процессе сбрасывает его собственный кэш в памяти
+        with mock.patch('tasks.signals.user_state_cache', UserStateCache(max_size=10, ttl=60)), \
+                self.captureOnCommitCallbacks(execute=True):
+            self.user1.is_active = False
+            self.user1.save()
+        self.assertIsNotNone(user_state_cache._entries.get(self.user1.id))
+        response = self.client.get(reverse('task-detail', args=[self.task1.id]))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
     def test_authentication_required(self):
         """ Доступ только авторизованным пользователям """
         self.client.logout()  
 
         response = self.client.get(reverse('task-list'))
         self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)   
+
+
+class QueryPlanTestCase(TestCase):
+    def test_find_seq_scans(self):
+        """ Поиск Seq Scan в плане EXPLAIN """
+        from .management.commands.check_task_query_plans import find_seq_scans
+
+        plan = {
+            'Node Type': 'Limit', 'Plan Rows': 10,
+            'Plans': [
+                {'Node Type': 'Sort', 'Plan Rows': 500000, 'Plans': [
+                    {'Node Type': 'Seq Scan', 'Relation Name': 'tasks_task', 'Plan Rows': 500000},
+                ]},
+                {'Node Type': 'Seq Scan', 'Relation Name': 'tasks_user', 'Plan Rows': 20},
+            ],
+        }
+        self.assertEqual(find_seq_scans(plan, 10000), [('tasks_task', 500000)])
+        self.assertEqual(len(find_seq_scans(plan, 0)), 2)
+        self.assertEqual(find_seq_scans({'Node Type': 'Index Scan', 'Plan Rows': 10}, 0), [])
+
+    @override_settings(TASKS_ARCHIVE_AFTER_DAYS=30)
+    def test_list_querysets_with_archive(self):
+        """ Списки вместе с архивом проверяются по частям: у каждой есть EXPLAIN """
+        from .management.commands.check_task_query_plans import Command
+
+        querysets = dict(Command().get_list_querysets('testuser1', 10))
+        self.assertIn('task-list [archivedtask@default]', querysets)
+        self.assertIn('task-filter-by-status status=completed (cursor) [task@default]', querysets)
+        self.assertIn('task-filter-by-status status=new', querysets)
+        for label, queryset in querysets.items():
+            with self.subTest(label=label):
+                self.assertTrue(queryset.explain())
+
+
+class ValuesSerializerTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='testuser1', password='testpass1', first_name='Test1')
+        self.client.force_authenticate(self.user)
+        Task.objects.create(title="С описанием", description="Описание", status="new", user=self.user)
+        Task.objects.create(title="Без описания", description=None, status="in_progress", user=self.user)
+        Task.objects.create(title="", description="", status="completed", user=self.user)
+
+    def test_matches_task_serializer(self):
+        """ Быстрый путь дает тот же результат, что и TaskSerializer """
+        queryset = Task.objects.order_by('id')
+        expected = TaskSerializer(queryset, many=True).data
+        rows = queryset.values(*task_values_serializer.columns)
+        self.assertEqual(task_values_serializer.to_representation(rows), expected)
+        self.assertEqual(json.dumps(task_values_serializer.to_representation(rows)),
+                         json.dumps(expected))
+
+    def test_list_views_match_task_serializer(self):
+        """ Списки задач отдают те же данные, что и TaskSerializer """
+        expected = TaskSerializer(Task.objects.order_by('-id'), many=True).data
+        for url in (reverse('task-list'), reverse('user-task-list', args=['testuser1'])):
+            response = self.client.get(url)
+            self.assertEqual(response.data['results'], expected)
+        response = self.client.get(reverse('task-filter-by-status', args=['in_progress']))
+        self.assertEqual(response.data['results'],
+                         TaskSerializer(Task.objects.filter(status='in_progress'), many=True).data)
+
+
+class FastJSONTestCase(TestCase):
+    payload = {
+        'text': 'Юникод \u2028 \u2029 "кавычки" \\ / \x00',
+        'lazy': gettext_lazy('This field is required.'),
+        'error': ErrorDetail('Invalid.', code='invalid'),
+        'datetime': datetime.datetime(2024, 1, 2, 3, 4, 5, 678901, tzinfo=datetime.timezone.utc),
+        'date': datetime.date(2024, 1, 2),
+        'decimal': decimal.Decimal('1.50'),
+        'uuid': uuid.UUID('12345678-1234-5678-1234-567812345678'),
+        'nested': [OrderedDict(a=1, b=[True, False, None]), 1.5, -0.25],
+    }
+
+    def test_render_matches_json_renderer(self):
+        """ Побайтное совпадение с JSONRenderer, в том числе без orjson """
+        expected = JSONRenderer().render(self.payload)
+        self.assertEqual(FastJSONRenderer().render(self.payload), expected)
+        self.assertEqual(FastJSONRenderer().render({'title': 'Задача'}), JSONRenderer().render({'title': 'Задача'}))
+        with mock.patch('tasks.renderers.orjson', None):
+            self.assertEqual(FastJSONRenderer().render(self.payload), expected)
+        # То, что orjson не кодирует, уходит в стандартный путь
+        for data in ({'big': 2 ** 70}, {'keys': {1: 'int key'}}):
+            self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+        self.assertEqual(FastJSONRenderer().render(None), b'')
+        self.assertEqual(FastJSONRenderer().render({'a': 1}, 'application/json; indent=4'),
+                         JSONRenderer().render({'a': 1}, 'application/json; indent=4'))
+
+    def test_parse_matches_json_parser(self):
+        """ FastJSONParser разбирает тело так же, как JSONParser """
+        body = '{"title": "Задача", "ids": [1, 2, 3], "big": 1180591620717411303424, "x": null}'.encode()
+        self.assertEqual(FastJSONParser().parse(io.BytesIO(body)), JSONParser().parse(io.BytesIO(body)))
+        for invalid in (b'{"title": ', b'{"x": NaN}'):
+            with self.assertRaises(ParseError):
+                FastJSONParser().parse(io.BytesIO(invalid))
+
+
+# Фиксируем число SQL-запросов для каждого эндпоинта из tasks/urls.py,
+# чтобы N+1 и лишние выборки не появлялись незаметно
+class QueryCountTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        # "auth" в комментариях ниже - загрузка состояния пользователя при
+        # пустом кэше аутентификации (один узкий запрос)
+        user_state_cache.clear()
+        self.user1 = User.objects.create_user(
+            username='testuser1', password='testpass1', first_name='Test1', last_name='User1'
+        )
+        self.user2 = User.objects.create_user(
+            username='testuser2', password='testpass2', first_name='Test2', last_name='User2'
+        )
+        self.refresh = RefreshToken.for_user(self.user1)
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + str(self.refresh.access_token))
+
+        for i in range(15):
+            Task.objects.create(title=f"Task {i}", description="Bulk task", status="new", user=self.user1)
+        self.task = Task.objects.create(
+            title="Test Task", description="Description", status="in_progress", user=self.user1
+        )
+
+    def test_task_list_queries(self):
+        with self.assertNumQueries(3):  # auth, COUNT, страница
+            response = self.client.get(reverse('task-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        with self.assertNumQueries(1):  # страница (без COUNT), пользователь уже в кэше auth
+            response = self.client.get(reverse('task-list'), {'pagination': 'cursor'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_user_task_list_queries(self):
+        with self.assertNumQueries(3):  # auth, COUNT, страница
+            response = self.client.get(reverse('user-task-list', args=['testuser1']))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        with self.assertNumQueries(1):  # страница
+            response = self.client.get(reverse('user-task-list', args=['testuser1']), {'pagination': 'cursor'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_user_task_list_unknown_user(self):
+        with self.assertNumQueries(3):  # auth, COUNT, проверка пользователя
+            response = self.client.get(reverse('user-task-list', args=['nobody']))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        response = self.client.get(reverse('user-task-list', args=['testuser2']))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'], [])
+
+    def test_cached_list_queries(self):
+        url = reverse('task-filter-by-status', args=['new'])
+        self.client.get(url)
+        with self.assertNumQueries(0):  # пользователь и ответ из кэша
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 10)
+
+    def test_not_modified_queries(self):
+        url = reverse('task-filter-by-status', args=['new'])
+        etag = self.client.get(url)['ETag']
+        with self.assertNumQueries(0):  # пользователь и ETag из кэша
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        etag = self.client.get(reverse('task-list'))['ETag']
+        with self.assertNumQueries(2):  # COUNT, страница (без сериализации)
+            response = self.client.get(reverse('task-list'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_task_filter_by_status_queries(self):
+        with self.assertNumQueries(3):  # auth, COUNT, страница
+            response = self.client.get(reverse('task-filter-by-status', args=['new']))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_task_detail_queries(self):
+        with self.assertNumQueries(2):  # auth, задача
+            response = self.client.get(reverse('task-detail', args=[self.task.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_task_create_queries(self):
+        with self.assertNumQueries(2):  # auth, INSERT
+            response = self.client.post(reverse('task-create'), {'title': 'New Task', 'status': 'new'})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_task_update_queries(self):
+        with self.assertNumQueries(3):  # auth, задача, UPDATE
+            response = self.client.put(reverse('task-update', args=[self.task.id]),
+                                       {'title': 'Updated', 'status': 'new'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_task_delete_queries(self):
+        with self.assertNumQueries(3):  # auth, DELETE, INSERT метки удаления
+            response = self.client.delete(reverse('task-delete', args=[self.task.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_task_complete_queries(self):
+        with self.assertNumQueries(2):  # auth, UPDATE
+            response = self.client.put(reverse('task-complete', args=[self.task.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_task_bulk_queries(self):
+        tasks = list(Task.objects.filter(user=self.user1).order_by('id')[:6])
+        other_task = Task.objects.create(title="Other", status="new", user=self.user2)
+        operations = [{'op': 'create', 'data': {'title': f'Bulk {i}'}} for i in range(5)]
+        operations += [{'op': 'update', 'id': task.id, 'data': {'status': 'in_progress'}} for task in tasks[:2]]
+        operations += [{'op': 'complete', 'id': task.id} for task in tasks[2:4]]
+        operations += [{'op': 'delete', 'id': task.id} for task in tasks[4:]]
+        operations.append({'op': 'delete', 'id': other_task.id})
+        # auth, владелец, чужие id, SAVEPOINT/RELEASE, INSERT, UPDATE (bulk), UPDATE, DELETE,
+        # INSERT меток удаления
+        with self.assertNumQueries(10):
+            response = self.client.post(reverse('task-bulk'), {'operations': operations}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_task_sync_queries(self):
+        url = reverse('user-task-sync', args=['testuser1'])
+        with self.assertNumQueries(2):  # auth, задачи (полная синхронизация - без меток удаления)
+            response = self.client.get(url)
+        self.assertEqual(len(response.data['changes']), 16)
+        with self.assertNumQueries(2):  # задачи, метки удаления
+            response = self.client.get(url, {'since': response.data['watermark']})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    @override_settings(TASKS_EXPORT_CHUNK_SIZE=5)
+    def test_task_export_queries(self):
+        # auth, один SELECT (курсор читается порциями по chunk_size)
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('task-export'))
+            lines = b''.join(response.streaming_content).splitlines()
+        self.assertEqual(len(lines), 16)
+
+    def test_cache_stats_queries(self):
+        User.objects.filter(pk=self.user1.pk).update(is_staff=True)
+        with self.assertNumQueries(2):  # auth, пользователь (is_staff для IsAdminUser)
+            response = self.client.get(reverse('task-cache-stats'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_task_search_queries(self):
+        with self.assertNumQueries(2):  # auth, страница (курсор, без COUNT)
+            response = self.client.get(reverse('task-search'), {'q': 'bulk'})
+        self.assertEqual(len(response.data['results']), 10)
+        with self.assertNumQueries(1):  # страница после курсора
+            response = self.client.get(response.data['next'])
+        self.assertEqual(len(response.data['results']), 5)
+        with self.assertNumQueries(2):  # пустая страница, проверка пользователя
+            response = self.client.get(reverse('task-search'), {'q': 'bulk', 'user': 'nobody'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_task_stats_queries(self):
+        with self.assertNumQueries(2):  # auth, сумма счетчиков
+            self.client.get(reverse('task-stats'))
+        with self.assertNumQueries(0):  # общая статистика из кэша (auth тоже в кэше)
+            self.client.get(reverse('task-stats'))
+        with self.assertNumQueries(2):  # пользователь, счетчики
+            response = self.client.get(reverse('user-task-stats', args=['testuser1']))
+        self.assertEqual(response.data['total'], 16)
+
+    def test_user_task_stats_list_queries(self):
+        with self.assertNumQueries(3):  # auth, страница пользователей, счетчики страницы
+            response = self.client.get(reverse('user-task-stats-list'))
+        self.assertEqual([row['total'] for row in response.data['results']], [0, 16])
+
+    # Асинхронный ORM выполняет запросы в потоке запроса, а не теста, поэтому
+    # число запросов берется из Server-Timing (как в InstrumentationTestCase)
+    async def count_queries(self, url, params=None):
+        response = await self.async_client.get(url, params or {}, headers=self.async_headers)
+        return response, int(re.search(r'desc="(\d+) queries"', response['Server-Timing']).group(1))
+
+    @override_settings(TASKS_METRICS_ENABLED=True)
+    async def test_async_view_queries(self):
+        await sync_to_async(wrap_open_connections)()
+        self.async_headers = {'Authorization': 'Bearer ' + str(self.refresh.access_token)}
+        cases = [
+            (reverse('async-task-list'), {}, 3),  # auth, COUNT, страница
+            (reverse('async-task-list'), {'pagination': 'cursor'}, 1),  # страница
+            (reverse('async-user-task-list', args=['testuser1']), {}, 2),  # COUNT, страница
+            (reverse('async-user-task-list', args=['nobody']), {}, 2),  # COUNT, проверка пользователя
+            (reverse('async-task-filter-by-status', args=['new']), {}, 2),  # COUNT, страница
+            (reverse('async-task-filter-by-status', args=['new']), {}, 0),  # ответ из кэша
+            (reverse('async-task-detail', args=[self.task.id]), {}, 1),  # задача
+        ]
+        for url, params, expected in cases:
+            with self.subTest(url=url, params=params):
+                response, queries = await self.count_queries(url, params)
+                self.assertEqual(response.status_code, 404 if 'nobody' in url else 200)
+                self.assertEqual(queries, expected)
+
+    @override_settings(TASKS_METRICS_ENABLED=True, TASKS_METRICS_TOKEN='metrics-token')
+    def test_metrics_queries(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer metrics-token')
+        with self.assertNumQueries(0):  # токен метрик сравнивается без БД
+            response = self.client.get(reverse('task-metrics'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    @override_settings(TASKS_METRICS_ENABLED=True)
+    async def test_task_events_queries(self):
+        await sync_to_async(wrap_open_connections)()
+        self.async_headers = {'Authorization': 'Bearer ' + str(self.refresh.access_token)}
+        # auth, id пользователя из фильтра; дальше поток событий без запросов
+        response, queries = await self.count_queries(reverse('task-events'), {'user': 'testuser1'})
+        self.assertEqual(queries, 2)
+        stream = aiter(response.streaming_content)
+        await anext(stream)
+        await stream.aclose()
+
+    def test_token_queries(self):
+        self.client.credentials()
+        with self.assertNumQueries(1):  # пользователь
+            response = self.client.post(reverse('token-obtain-pair'),
+                                        {'username': 'testuser1', 'password': 'testpass1'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        with self.assertNumQueries(0):
+            response = self.client.post(reverse('token-refresh'), {'refresh': str(self.refresh)})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+class TaskEventsTestCase(TestCase):
+    def setUp(self):
+        self.user1 = User.objects.create_user(
+            username='testuser1', password='testpass1', first_name='Test1', last_name='User1'
+        )
+        self.user2 = User.objects.create_user(
+            username='testuser2', password='testpass2', first_name='Test2', last_name='User2'
+        )
+        self.task = Task.objects.create(title="Test Task", status="new", user=self.user1)
+        self.headers = {'Authorization': 'Bearer ' + str(RefreshToken.for_user(self.user1).access_token)}
+
+    async def read_event(self, stream):
+        chunk = await asyncio.wait_for(anext(stream), timeout=2)
+        event_type, data = chunk.decode().strip().split('\n')
+        return event_type.removeprefix('event: '), json.loads(data.removeprefix('data: '))
+
+    async def test_event_stream(self):
+        """ Лента изменений задач по статусу """
+        response = await self.async_client.get(reverse('task-events'), {'status': 'new'}, headers=self.headers)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = aiter(response.streaming_content)
+        self.assertTrue((await anext(stream)).startswith(b'retry:'))
+
+        def write():
+            with self.captureOnCommitCallbacks(execute=True):
+                Task.objects.create(title="Completed Task", status="completed", user=self.user2)
+                Task.objects.create(title="New Task", status="new", user=self.user2)
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.put(reverse('task-complete', args=[self.task.id]), headers=self.headers)
+
+        await sync_to_async(write)()
+
+        # Задача в другом статусе не попадает в ленту
+        event_type, event = await self.read_event(stream)
+        self.assertEqual(event_type, 'created')
+        self.assertEqual(event['task']['title'], 'New Task')
+
+        event_type, event = await self.read_event(stream)
+        self.assertEqual(event_type, 'completed')
+        self.assertEqual(event['task']['id'], self.task.id)
+        await stream.aclose()
+
+    async def test_event_stream_requires_auth(self):
+        response = await self.async_client.get(reverse('task-events'))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        response = await self.async_client.get(reverse('task-events'), {'user': 'nobody'}, headers=self.headers)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_postgres_listener_bypasses_pool(self):
+        """ Соединение LISTEN открывается мимо пула и закрывается при каждом переподключении """
+        wrapper = mock.MagicMock()
+        wrapper.get_connection_params.return_value = {'dbname': 'todo'}
+        backend = PostgresNotifyBackend(hub=mock.Mock())
+        with mock.patch('tasks.events.connections', {'default': wrapper}), \
+                mock.patch.object(PostgresNotifyBackend, '_wait_notifies', side_effect=OSError):
+            for _ in range(2):
+                with self.assertRaises(OSError):
+                    backend._listen()
+        wrapper.get_new_connection.assert_not_called()
+        self.assertEqual(wrapper.Database.connect.call_args_list, [mock.call(dbname='todo')] * 2)
+        self.assertEqual(wrapper.Database.connect.return_value.close.call_count, 2)
+
+
+class AsyncViewsTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        user_state_cache.clear()
+        self.user1 = User.objects.create_user(
+            username='testuser1', password='testpass1', first_name='Test1', last_name='User1'
+        )
+        self.user2 = User.objects.create_user(
+            username='testuser2', password='testpass2', first_name='Test2', last_name='User2'
+        )
+        for i in range(12):
+            Task.objects.create(title=f"Task {i}", status="new" if i % 2 else "completed",
+                                user=self.user1 if i % 3 else self.user2)
+        self.task = Task.objects.create(title="Test Task", description="Description", status="new", user=self.user1)
+        self.headers = {'Authorization': 'Bearer ' + str(RefreshToken.for_user(self.user1).access_token)}
+
+    async def get_both(self, name, args, params):
+        sync_response = await self.async_client.get(reverse(name, args=args), params, headers=self.headers)
+        async_response = await self.async_client.get(reverse(f'async-{name}', args=args), params,
+                                                     headers=self.headers)
+        return sync_response, async_response
+
+    async def test_async_views_match_sync(self):
+        """ Асинхронные представления отдают те же данные, что и синхронные """
+        cases = [
+            ('task-list', [], {}),
+            ('task-list', [], {'page': 2}),
+            ('task-list', [], {'pagination': 'cursor'}),
+            ('user-task-list', ['testuser1'], {}),
+            ('user-task-list', ['testuser2'], {'pagination': 'cursor'}),
+            ('task-filter-by-status', ['new'], {}),
+            ('task-detail', [self.task.id], {}),
+        ]
+        for name, args, params in cases:
+            with self.subTest(name=name, params=params):
+                sync_response, async_response = await self.get_both(name, args, params)
+                self.assertEqual(async_response.status_code, status.HTTP_200_OK)
+                self.assertEqual(async_response['Content-Type'], 'application/json')
+                self.assertIn('ETag', async_response)
+                # Ссылки next/previous отличаются только префиксом пути
+                self.assertEqual(async_response.content.replace(b'/api/async/', b'/api/'),
+                                 sync_response.content)
+
+        # Переход по курсору next асинхронного ответа
+        response = await self.async_client.get(reverse('async-task-list'), {'pagination': 'cursor'},
+                                               headers=self.headers)
+        next_page = await self.async_client.get(response.json()['next'], headers=self.headers)
+        ids = [task['id'] for task in response.json()['results'] + next_page.json()['results']]
+        self.assertEqual(ids, sorted(ids, reverse=True))
+        self.assertEqual(len(ids), 13)
+
+    def sync_export(self, params):
+        response = self.client.get(reverse('task-export'), params, headers=self.headers)
+        self.assertFalse(response.is_async)
+        return b''.join(response.streaming_content)
+
+    @override_settings(TASKS_EXPORT_CHUNK_SIZE=5)
+    async def test_export_streams_under_asgi(self):
+        """ Под ASGI выгрузка - асинхронный итератор пакетов, тело совпадает с WSGI """
+        for params in ({}, {'output': 'csv'}, {'output': 'csv', 'status': 'in_progress'}):
+            with self.subTest(params=params):
+                response = await self.async_client.get(reverse('task-export'), params, headers=self.headers)
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                self.assertTrue(response.is_async)
+                chunks = [chunk async for chunk in response.streaming_content]
+                expected = await sync_to_async(self.sync_export)(params)
+                self.assertEqual(b''.join(chunks), expected)
+        # 13 задач пакетами по 5 строк - три блока NDJSON
+        response = await self.async_client.get(reverse('task-export'), headers=self.headers)
+        self.assertEqual(len([chunk async for chunk in response.streaming_content]), 3)
+
+    async def test_async_conditional_get(self):
+        """ 304 по If-None-Match для списка и задачи """
+        for url in (reverse('async-task-list'), reverse('async-user-task-list', args=['testuser1']),
+                    reverse('async-task-detail', args=[self.task.id])):
+            response = await self.async_client.get(url, headers=self.headers)
+            not_modified = await self.async_client.get(
+                url, headers={**self.headers, 'If-None-Match': response['ETag']}
+            )
+            self.assertEqual(not_modified.status_code, status.HTTP_304_NOT_MODIFIED)
+            self.assertEqual(not_modified['ETag'], response['ETag'])
+            self.assertEqual(not_modified.content, b'')
+
+    async def test_async_errors(self):
+        """ Ошибки: без токена, неизвестные задача, пользователь и страница """
+        response = await self.async_client.get(reverse('async-task-list'))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(response['WWW-Authenticate'], 'Bearer realm="api"')
+
+        response = await self.async_client.get(reverse('async-task-list'),
+                                               headers={'Authorization': 'Bearer invalid'})
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(response.json()['code'], 'token_not_valid')
+
+        for name, args, params in [('task-detail', [0], {}), ('user-task-list', ['nobody'], {}),
+                                   ('task-list', [], {'page': 100})]:
+            with self.subTest(name=name):
+                sync_response, async_response = await self.get_both(name, args, params)
+                self.assertEqual(async_response.status_code, status.HTTP_404_NOT_FOUND)
+                self.assertEqual(async_response.json(), sync_response.json())
+
+    async def test_async_list_cache_invalidation(self):
+        """ Кэш асинхронных списков сбрасывается при записи """
+        url = reverse('async-user-task-list', args=['testuser1'])
+        first = await self.async_client.get(url, headers=self.headers)
+
+        def create():
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post(reverse('task-create'), {'title': 'Fresh', 'status': 'new'},
+                                 headers=self.headers)
+
+        await sync_to_async(create)()
+        second = await self.async_client.get(url, headers=self.headers)
+        self.assertEqual(second.json()['count'], first.json()['count'] + 1)
+        self.assertEqual(second.json()['results'][0]['title'], 'Fresh')
+
+
+@override_settings(TASKS_METRICS_ENABLED=True, TASKS_METRICS_TOKEN='metrics-token')
+class InstrumentationTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        user_state_cache.clear()
+        metrics_registry.clear()
+        self.user = User.objects.create_user(username='testuser1', password='testpass1', first_name='Test1')
+        Task.objects.create(title="Test Task", status="new", user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + str(RefreshToken.for_user(self.user).access_token))
+
+    def test_server_timing_and_metrics(self):
+        """ Server-Timing и гистограммы по маршрутам """
+        response = self.client.get(reverse('task-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertRegex(response['Server-Timing'],
+                         r'^app;dur=[\d.]+, db;dur=[\d.]+;desc="3 queries", serialize;dur=[\d.]+$')
+
+        self.client.get(reverse('task-list'), {'pagination': 'cursor'})
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer metrics-token')
+        response = self.client.get(reverse('task-metrics'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+        text = response.content.decode()
+        self.assertIn('# TYPE tasks_request_duration_seconds histogram', text)
+        self.assertIn('tasks_request_duration_seconds_count{route="task-list",method="GET"} 2', text)
+        # 3 запроса без курсора и 1 с курсором
+        self.assertIn('tasks_request_db_queries_bucket{route="task-list",method="GET",le="1.0"} 1', text)
+        self.assertIn('tasks_request_db_queries_bucket{route="task-list",method="GET",le="3.0"} 2', text)
+        self.assertIn('tasks_request_db_queries_sum{route="task-list",method="GET"} 4', text)
+        self.assertIn('tasks_response_size_bytes_count{route="task-list",method="GET"} 2', text)
+
+    @override_settings(TASKS_SLOW_QUERY_MS=0)
+    def test_slow_query_log(self):
+        """ Журнал медленных запросов с маршрутом запроса """
+        with self.assertLogs('tasks.slow_queries', 'WARNING') as logs:
+            response = self.client.get(reverse('task-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(logs.records), 3)
+        self.assertIn('/api/tasks/', logs.output[0])
+
+    def test_metrics_endpoint_requires_token(self):
+        """ Эндпоинт метрик - только по токену """
+        response = self.client.get(reverse('task-metrics'))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer metrics-token')
+        with override_settings(TASKS_METRICS_TOKEN=''):
+            response = self.client.get(reverse('task-metrics'))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    async def test_async_view_metrics(self):
+        """ Запросы асинхронного ORM учитываются в запросе """
+        # Соединение теста открыто в другом потоке до загрузки middleware
+        await sync_to_async(wrap_open_connections)()
+        headers = {'Authorization': 'Bearer ' + str(RefreshToken.for_user(self.user).access_token)}
+        response = await self.async_client.get(reverse('async-task-list'), {'pagination': 'cursor'},
+                                               headers=headers)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('desc="2 queries"', response['Server-Timing'])
+
+    @override_settings(TASKS_METRICS_ENABLED=False)
+    def test_disabled(self):
+        """ Выключенное инструментирование не добавляет заголовков и метрик """
+        response = self.client.get(reverse('task-list'))
+        self.assertNotIn('Server-Timing', response)
+        self.assertEqual(metrics_registry.render().count('_count{'), 0)
+
+
+class ThrottlingTestCase(APITestCase):
+    rates = {'user': '3/min', 'ip': '100/min', 'token_ip': '4/min', 'token_username': '2/min'}
+
+    def setUp(self):
+        cache.clear()
+        user_state_cache.clear()
+        self.user = User.objects.create_user(username='testuser1', password='testpass1', first_name='Test1')
+        patcher = mock.patch.object(TokenBucketThrottle, 'THROTTLE_RATES', self.rates)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_token_bucket_refill(self):
+        """ Всплеск до емкости корзины, затем пополнение со временем """
+        now = [1000.0]
+        with mock.patch.object(token_bucket, 'timer', lambda: now[0]):
+            self.assertEqual(token_bucket.consume('bucket', 2, 1.0), (True, 0.0))
+            self.assertEqual(token_bucket.consume('bucket', 2, 1.0), (True, 0.0))
+            self.assertEqual(token_bucket.consume('bucket', 2, 1.0), (False, 1.0))
+            now[0] += 0.5
+            self.assertEqual(token_bucket.consume('bucket', 2, 1.0), (False, 0.5))
+            now[0] += 0.5
+            self.assertEqual(token_bucket.consume('bucket', 2, 1.0), (True, 0.0))
+            # Простой не накапливает токены сверх емкости
+            now[0] += 60
+            results = [token_bucket.consume('bucket', 2, 1.0)[0] for _ in range(3)]
+            self.assertEqual(results, [True, True, False])
+
+    def test_redis_single_round_trip(self):
+        """ Redis: одно выполнение скрипта на запрос """
+        redis_cache = mock.Mock(spec=RedisCache)
+        redis_cache.make_and_validate_key.side_effect = lambda key: f':1:{key}'
+        client = redis_cache._cache.get_client.return_value
+        script = client.register_script.return_value
+        script.side_effect = [[1, '0'], [0, '0.25']]
+
+        bucket = TokenBucket()
+        with mock.patch('tasks.throttling.get_cache', return_value=redis_cache):
+            self.assertEqual(bucket.consume('bucket', 4, 2.0), (True, 0.0))
+            self.assertEqual(bucket.consume('bucket', 4, 2.0), (False, 0.25))
+        client.register_script.assert_called_once()
+        script.assert_called_with(keys=[':1:bucket'], args=[4, 2.0], client=client)
+
+    def test_shared_non_redis_cache_refused(self):
+        """ Общий кэш без атомарного обновления (memcached, БД) не поддерживается """
+        db_cache = mock.Mock(spec=DatabaseCache)
+        with mock.patch('tasks.throttling.get_cache', return_value=db_cache):
+            with self.assertRaises(ImproperlyConfigured):
+                TokenBucket().consume('bucket', 4, 2.0)
+        db_cache.get.assert_not_called()
+        db_cache.set.assert_not_called()
+
+    def test_token_endpoint_throttling(self):
+        """ Выдача токенов ограничивается по имени пользователя и по IP """
+        url = reverse('token-obtain-pair')
+        for _ in range(2):
+            response = self.client.post(url, {'username': 'testuser1', 'password': 'wrong'})
+            self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        # Третья попытка под тем же именем - 429, даже с верным паролем
+        response = self.client.post(url, {'username': 'TestUser1', 'password': 'testpass1'})
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertIn('Retry-After', response)
+
+        # Корзина IP (4 запроса) исчерпана четвертым запросом
+        response = self.client.post(url, {'username': 'other', 'password': 'wrong'})
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        response = self.client.post(url, {'username': 'another', 'password': 'wrong'})
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    async def test_task_endpoint_throttling(self):
+        """ Запросы к задачам ограничиваются по пользователю, в том числе асинхронные """
+        headers = {'Authorization': 'Bearer ' + str(RefreshToken.for_user(self.user).access_token)}
+        statuses = []
+        for name in ('task-list', 'async-task-list', 'task-list', 'async-task-list'):
+            response = await self.async_client.get(reverse(name), headers=headers)
+            statuses.append(response.status_code)
+        self.assertEqual(statuses, [200, 200, 200, 429])
+        self.assertEqual(response.json()['detail'][:len('Request was throttled.')], 'Request was throttled.')
+        self.assertIn('Retry-After', response)
+
+
+# Дополнительные тестовые БД (реплика, шард) - отдельные БД, не зеркала
+# основной, поэтому по содержимому ответа видно, из какой БД прочитаны
+# данные. Алиасы регистрируются при импорте модуля, до создания тестовых БД
+def register_test_database(alias):
+    default = connections['default'].settings_dict
+    connections.settings.setdefault(alias, {**default, 'TEST': {
+        **default['TEST'], 'MIRROR': None,
+        'NAME': None if default['ENGINE'].endswith('sqlite3') else f"test_{default['NAME']}_{alias}",
+    }})
+
+
+register_test_database('replica')
+register_test_database('shard')
+
+
+@override_settings(TASKS_DB_REPLICAS=['replica'])
+class ReplicaRoutingTestCase(TransactionTestCase):
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        cache.clear()
+        user_state_cache.clear()
+        self.user1 = User.objects.create_user(username='testuser1', password='testpass1', first_name='Test1')
+        self.user2 = User.objects.create_user(username='testuser2', password='testpass2', first_name='Test2')
+        self.task = Task.objects.create(title='Primary', status='new', user=self.user1)
+        # Отставшая реплика: те же пользователи и задача, но старое название
+        for user in (self.user1, self.user2):
+            user.save(using='replica')
+        Task.objects.using('replica').bulk_create([
+            Task(id=self.task.id, title='Stale', status='new', user_id=self.user1.id)
+        ])
+        self.headers = {'Authorization': 'Bearer ' + str(RefreshToken.for_user(self.user1).access_token)}
+
+    def titles(self, response):
+        data = response.json()
+        return [task['title'] for task in data['results']] if 'results' in data else [data['title']]
+
+    def test_reads_use_replica(self):
+        """ Представления чтения, в том числе асинхронные, читают с реплики """
+        for name, args in [('task-list', []), ('user-task-list', ['testuser1']),
+                           ('task-filter-by-status', ['new']), ('task-detail', [self.task.id]),
+                           ('async-task-list', []), ('async-task-detail', [self.task.id])]:
+            with self.subTest(name=name):
+                response = self.client.get(reverse(name, args=args), headers=self.headers)
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                self.assertEqual(self.titles(response), ['Stale'])
+
+    def test_read_your_writes(self):
+        """ После записи чтения автора идут в основную БД, чтения других - на реплику """
+        response = self.client.post(reverse('task-create'), {'title': 'Fresh', 'status': 'new'},
+                                    headers=self.headers)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        # Запись - только в основную БД
+        self.assertTrue(Task.objects.filter(title='Fresh').exists())
+        self.assertFalse(Task.objects.using('replica').filter(title='Fresh').exists())
+
+        for name in ('task-list', 'async-task-list'):
+            response = self.client.get(reverse(name), headers=self.headers)
+            self.assertEqual(self.titles(response), ['Fresh', 'Primary'])
+
+        other = {'Authorization': 'Bearer ' + str(RefreshToken.for_user(self.user2).access_token)}
+        response = self.client.get(reverse('task-list'), headers=other)
+        self.assertEqual(self.titles(response), ['Stale'])
+
+        # Метка истекла - снова реплика
+        cache.clear()
+        response = self.client.get(reverse('task-list'), headers=self.headers)
+        self.assertEqual(self.titles(response), ['Stale'])
+
+    def test_list_cache_ignores_replica_reads(self):
+        """ Список, прочитанный с отставшей реплики, не достается автору записи из кэша """
+        other = {'Authorization': 'Bearer ' + str(RefreshToken.for_user(self.user2).access_token)}
+        response = self.client.patch(reverse('task-update', args=[self.task.id]), {'title': 'Fresh'},
+                                     content_type='application/json', headers=self.headers)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        for name, args in [('user-task-list', ['testuser1']), ('task-filter-by-status', ['new']),
+                           ('async-user-task-list', ['testuser1']), ('async-task-filter-by-status', ['new'])]:
+            with self.subTest(name=name):
+                # Другой пользователь читает с реплики после смены версии
+                response = self.client.get(reverse(name, args=args), headers=other)
+                self.assertEqual(self.titles(response), ['Stale'])
+                # Автор записи читает основную БД, а не кэш с реплики
+                response = self.client.get(reverse(name, args=args), headers=self.headers)
+                self.assertEqual(self.titles(response), ['Fresh'])
+                # Ответ основной БД кэшируется как обычно
+                response = self.client.get(reverse(name, args=args), headers=other)
+                self.assertEqual(self.titles(response), ['Fresh'])
+
+    def test_list_cache_serves_replica_reads(self):
+        """ Повторные чтения с реплики отдаются из кэша, ответ реплики живет недолго """
+        for name, args in [('user-task-list', ['testuser1']), ('task-filter-by-status', ['new']),
+                           ('async-user-task-list', ['testuser1']), ('async-task-filter-by-status', ['new'])]:
+            with self.subTest(name=name):
+                cache.clear()
+                response = self.client.get(reverse(name, args=args), headers=self.headers)
+                self.assertEqual(self.titles(response), ['Stale'])
+                hits = cache_stats.snapshot()['hits']
+                with CaptureQueriesContext(connections['replica']) as queries:
+                    for _ in range(3):
+                        response = self.client.get(reverse(name, args=args), headers=self.headers)
+                        self.assertEqual(self.titles(response), ['Stale'])
+                self.assertEqual(cache_stats.snapshot()['hits'], hits + 3)
+                self.assertEqual(len(queries), 0)
+
+        with override_settings(TASKS_LIST_CACHE_TIMEOUT=300, TASKS_DB_REPLICA_STICKY_SECONDS=5):
+            self.assertEqual(list_cache_timeout(replica=False), 300)
+            self.assertEqual(list_cache_timeout(replica=True), 5)
+
+    def test_no_replicas(self):
+        """ Без настроенных реплик все чтения - из основной БД """
+        with override_settings(TASKS_DB_REPLICAS=[]):
+            response = self.client.get(reverse('task-detail', args=[self.task.id]), headers=self.headers)
+        self.assertEqual(self.titles(response), ['Primary'])
+
+
+# Шард 'shard' - второй шард задач; при reset_sequences пользователям
+# назначаются шарды по id по кругу: testuser1 (id 1) - 'shard',
+# testuser2 (id 2) - 'default'
+# Кэш тестов - LocMemCache; перенос между шардами считает его общим
+@override_settings(TASKS_SHARDS=['default', 'shard'])
+@mock.patch('tasks.management.commands.rebalance_task_shards.cache_is_shared', return_value=True)
+class ShardingTestCase(TransactionTestCase):
+    databases = {'default', 'shard'}
+    reset_sequences = True
+    client_class = APIClient
+
+    def setUp(self):
+        cache.clear()
+        user_state_cache.clear()
+        self.user1 = User.objects.create_user(username='testuser1', password='testpass1', first_name='Test1')
+        self.user2 = User.objects.create_user(username='testuser2', password='testpass2', first_name='Test2')
+        self.headers1 = {'Authorization': 'Bearer ' + str(RefreshToken.for_user(self.user1).access_token)}
+        self.headers2 = {'Authorization': 'Bearer ' + str(RefreshToken.for_user(self.user2).access_token)}
+
+    def create(self, headers, title, task_status='new'):
+        response = self.client.post(reverse('task-create'), {'title': title, 'status': task_status},
+                                    headers=headers)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return response.json()['id']
+
+    def test_per_user_requests_use_one_shard(self, cache_is_shared):
+        """ Задачи пользователя создаются, читаются и меняются только в его шарде """
+        self.assertEqual(get_user_shard(self.user1.id), ('shard', None))
+        self.assertEqual(get_user_shard(self.user2.id), ('default', None))
+
+        first = self.create(self.headers2, 'Default task')
+        second = self.create(self.headers1, 'Shard task')
+        # id глобально уникальны и растут
+        self.assertGreater(second, first)
+        self.assertEqual(list(Task.objects.using('shard').values_list('id', flat=True)), [second])
+        self.assertEqual(list(Task.objects.using('default').values_list('id', flat=True)), [first])
+
+        with CaptureQueriesContext(connections['default']) as default_queries:
+            response = self.client.get(reverse('user-task-list', args=['testuser1']), headers=self.headers1)
+            self.client.put(reverse('task-complete', args=[second]), headers=self.headers1)
+            self.client.patch(reverse('task-update', args=[second]), {'title': 'Renamed'}, headers=self.headers1)
+        self.assertEqual([task['id'] for task in response.json()['results']], [second])
+        self.assertFalse([query for query in default_queries.captured_queries if 'tasks_task' in query['sql']])
+        task = Task.objects.using('shard').get(pk=second)
+        self.assertEqual((task.title, task.status), ('Renamed', 'completed'))
+
+        # Чужая задача на другом шарде - 403, несуществующая - 404
+        for name in ('task-complete', 'task-update', 'task-delete'):
+            method = self.client.delete if name == 'task-delete' else self.client.put
+            response = method(reverse(name, args=[second]), {'title': 'X'}, headers=self.headers2)
+            self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+            response = method(reverse(name, args=[second + 100]), {'title': 'X'}, headers=self.headers2)
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        response = self.client.post(reverse('task-bulk'), {'operations': [
+            {'op': 'create', 'data': {'title': 'Bulk', 'status': 'new'}},
+            {'op': 'complete', 'id': first},
+        ]}, format='json', headers=self.headers1)
+        self.assertEqual([result['status'] for result in response.json()['results']], [201, 403])
+        self.assertTrue(Task.objects.using('shard').filter(title='Bulk').exists())
+
+        response = self.client.delete(reverse('task-delete', args=[second]), headers=self.headers1)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(TaskTombstone.objects.using('shard').filter(task_id=second).exists())
+
+    def test_scatter_gather_lists(self, cache_is_shared):
+        """ Общие списки и задача по id - со всех шардов, по убыванию id """
+        ids = [self.create(headers, f'Task {i}', 'new' if i % 3 else 'completed')
+               for i, headers in enumerate([self.headers1, self.headers2] * 6)]
+        expected = sorted(ids, reverse=True)
+        new_ids = sorted((task_id for i, task_id in enumerate(ids) if i % 3), reverse=True)
+
+        with mock.patch.object(PageNumberPagination, 'page_size', 5), \
+                mock.patch.object(TaskCursorPagination, 'page_size', 5):
+            pages = [self.client.get(reverse('task-list'), {'page': page}, headers=self.headers1).json()
+                     for page in (1, 2, 3)]
+            self.assertEqual(pages[0]['count'], 12)
+            self.assertEqual([task['id'] for page in pages for task in page['results']], expected)
+
+            seen, url = [], reverse('task-list') + '?pagination=cursor'
+            while url:
+                page = self.client.get(url, headers=self.headers1).json()
+                seen += [task['id'] for task in page['results']]
+                url = page['next']
+            self.assertEqual(seen, expected)
+            previous = self.client.get(page['previous'], headers=self.headers1).json()
+            self.assertEqual([task['id'] for task in previous['results']], expected[5:10])
+
+            response = self.client.get(reverse('task-filter-by-status', args=['new']), headers=self.headers1)
+            self.assertEqual([task['id'] for task in response.json()['results']], new_ids[:5])
+            response = self.client.get(reverse('async-task-list'), {'page': 2}, headers=self.headers1)
+            self.assertEqual([task['id'] for task in response.json()['results']], expected[5:10])
+
+        for name in ('task-detail', 'async-task-detail'):
+            response = self.client.get(reverse(name, args=[ids[0]]), headers=self.headers2)
+            self.assertEqual(response.json()['title'], 'Task 0')
+
+        response = self.client.get(reverse('async-user-task-list', args=['testuser1']), headers=self.headers2)
+        self.assertEqual(response.json()['count'], 6)
+        response = self.client.get(reverse('task-stats'), headers=self.headers1)
+        self.assertEqual(response.json()['total'], 12)
+
+    def test_rebalance(self, cache_is_shared):
+        """ Перенос пользователя между шардами: задачи, метки удаления и счетчики """
+        ids = [self.create(self.headers1, f'Task {i}') for i in range(5)]
+        self.client.delete(reverse('task-delete', args=[ids.pop()]), headers=self.headers1)
+
+        out = io.StringIO()
+        # Пауза - ровно --drain-seconds, без учета времени жизни кэша карты
+        with mock.patch('tasks.management.commands.rebalance_task_shards.time.sleep') as sleep:
+            call_command('rebalance_task_shards', user=['testuser1'], to='default', batch_size=2,
+                         drain_seconds=2, stdout=out)
+        sleep.assert_called_once_with(2)
+        self.assertIn('testuser1: shard -> default', out.getvalue())
+        self.assertEqual(get_user_shard(self.user1.id), ('default', None))
+        self.assertEqual(sorted(Task.objects.using('default').values_list('id', flat=True)), ids)
+        self.assertFalse(Task.objects.using('shard').exists())
+        self.assertEqual(TaskTombstone.objects.using('default').filter(user=self.user1).count(), 1)
+        self.assertEqual(TaskCounter.objects.using('default').get(user=self.user1, status='new').count, 4)
+        self.assertFalse(User.objects.using('shard').filter(pk=self.user1.pk).exists())
+
+        response = self.client.get(reverse('user-task-list', args=['testuser1']), headers=self.headers1)
+        self.assertEqual(response.json()['count'], 4)
+
+        # Автоматическая балансировка переносит одного из пользователей на пустой шард
+        self.create(self.headers2, 'Default task')
+        call_command('rebalance_task_shards', drain_seconds=0, stdout=io.StringIO())
+        loads = sorted(Task.objects.using(alias).count() for alias in ('default', 'shard'))
+        self.assertEqual(loads, [1, 4])
+        self.assertEqual(sorted(get_user_shard(user.id)[0] for user in (self.user1, self.user2)),
+                         ['default', 'shard'])
+
+    def test_interrupted_move(self, cache_is_shared):
+        """ Запись во время переноса - 503; прерванный перенос завершается """
+        task_id = self.create(self.headers1, 'Moving')
+        UserShard.objects.filter(user=self.user1).update(moving_to='default')
+        cache.clear()
+
+        response = self.client.post(reverse('task-create'), {'title': 'Blocked'}, headers=self.headers1)
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(response['Retry-After'], '1')
+        response = self.client.get(reverse('user-task-list', args=['testuser1']), headers=self.headers1)
+        self.assertEqual(response.json()['count'], 1)
+
+        call_command('rebalance_task_shards', drain_seconds=0, max_users=0, stdout=io.StringIO())
+        self.assertEqual(list(Task.objects.using('default').values_list('id', flat=True)), [task_id])
+        self.assertFalse(Task.objects.using('shard').exists())
+        self.assertEqual(self.create(self.headers1, 'After move') > task_id, True)
+
+    @override_settings(TASKS_EXPORT_CHUNK_SIZE=1)
+    def test_search_and_export_span_shards(self, cache_is_shared):
+        """ Поиск, выгрузка и сверка счетчиков видят задачи всех шардов """
+        first = self.create(self.headers2, 'Shared word default')
+        second = self.create(self.headers1, 'Shared word shard')
+        third = self.create(self.headers2, 'Shared word again')
+
+        response = self.client.get(reverse('task-search'), {'q': 'shared word'}, headers=self.headers1)
+        self.assertEqual([task['id'] for task in response.json()['results']], [third, second, first])
+        response = self.client.get(reverse('task-search'), {'q': 'shard', 'user': 'testuser1'},
+                                   headers=self.headers2)
+        self.assertEqual([task['id'] for task in response.json()['results']], [second])
+
+        response = self.client.get(reverse('task-export'), headers=self.headers1)
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual([row['id'] for row in rows], [first, second, third])
+        response = self.client.get(reverse('task-export'), {'user': 'testuser1', 'output': 'csv'},
+                                   headers=self.headers1)
+        self.assertEqual(len(b''.join(response.streaming_content).decode().splitlines()), 2)
+
+        TaskCounter.objects.using('shard').filter(user=self.user1).update(count=7)
+        out = io.StringIO()
+        call_command('reconcile_task_counters', stdout=out)
+        self.assertIn('shard: user_id=1 status=new: 7 -> 1', out.getvalue())
+        self.assertEqual(TaskCounter.objects.using('shard').get(user=self.user1, status='new').count, 1)
+
+    @override_settings(TASKS_EXPORT_CHUNK_SIZE=1)
+    async def test_async_export_spans_shards(self, cache_is_shared):
+        """ Асинхронная выгрузка (ASGI) читает пакеты со всех шардов """
+        first = await sync_to_async(self.create)(self.headers2, 'Default task')
+        second = await sync_to_async(self.create)(self.headers1, 'Shard task')
+        response = await self.async_client.get(reverse('task-export'), headers=self.headers1)
+        self.assertTrue(response.is_async)
+        content = b''.join([chunk async for chunk in response.streaming_content])
+        self.assertEqual([json.loads(line)['id'] for line in content.splitlines()], [first, second])
+
+    def test_rebalance_requires_shared_cache(self, cache_is_shared):
+        """ С кэшем в памяти процесса перенос не запускается; запись читает карту из БД """
+        cache_is_shared.return_value = False
+        with self.assertRaisesMessage(CommandError, 'общего для всех процессов кэша'):
+            call_command('rebalance_task_shards', user=['testuser1'], to='default', stdout=io.StringIO())
+
+        # Кэш карты без moving_to не мешает запрету записи
+        with override_settings(TASKS_SHARD_MAP_CACHE_TIMEOUT=300):
+            self.assertEqual(get_user_shard(self.user1.id), ('shard', None))
+            UserShard.objects.filter(user=self.user1).update(moving_to='default')
+            self.assertEqual(get_user_shard(self.user1.id), ('shard', None))
+            response = self.client.post(reverse('task-create'), {'title': 'Blocked'}, headers=self.headers1)
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+
+
+@override_settings(TASKS_ARCHIVE_AFTER_DAYS=30)
+class ArchiveTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        user_state_cache.clear()
+        self.user1 = User.objects.create_user(username='testuser1', password='testpass1', first_name='Test1')
+        self.user2 = User.objects.create_user(username='testuser2', password='testpass2', first_name='Test2')
+        self.headers1 = {'Authorization': 'Bearer ' + str(RefreshToken.for_user(self.user1).access_token)}
+        self.headers2 = {'Authorization': 'Bearer ' + str(RefreshToken.for_user(self.user2).access_token)}
+        self.tasks = [
+            Task.objects.create(title=f'Task {i}', status='new' if i % 3 == 0 else 'completed', user=self.user1)
+            for i in range(9)
+        ]
+        # Задачи 1, 2, 4, 5 завершены давно, 7 и 8 - недавно
+        self.old_ids = [task.id for task in self.tasks[:6] if task.status == 'completed']
+        Task.objects.filter(id__in=self.old_ids).update(updated_at=timezone.now() - datetime.timedelta(days=40))
+
+    def list_ids(self, name, args, headers=None):
+        response = self.client.get(reverse(name, args=args), headers=headers or self.headers1)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [task['id'] for task in response.json()['results']]
+
+    def test_archive_command_is_batched_and_resumable(self):
+        """ Команда переносит старые завершенные задачи пакетами; повторный запуск продолжает """
+        out = io.StringIO()
+        call_command('archive_completed_tasks', dry_run=True, stdout=out)
+        self.assertIn('Всего задач для переноса: 4', out.getvalue())
+        self.assertFalse(ArchivedTask.objects.exists())
+
+        call_command('archive_completed_tasks', batch_size=3, max_batches=1, stdout=io.StringIO())
+        self.assertEqual(sorted(ArchivedTask.objects.values_list('id', flat=True)), self.old_ids[:3])
+
+        out = io.StringIO()
+        call_command('archive_completed_tasks', batch_size=3, stdout=out)
+        self.assertIn('Перенесено в архив задач: 1', out.getvalue())
+        self.assertEqual(sorted(ArchivedTask.objects.values_list('id', flat=True)), self.old_ids)
+        self.assertFalse(Task.objects.filter(id__in=self.old_ids).exists())
+        archived = ArchivedTask.objects.get(pk=self.old_ids[0])
+        self.assertEqual((archived.title, archived.user_id), ('Task 1', self.user1.id))
+
+        # Счетчики учитывают архив
+        self.assertEqual(TaskCounter.objects.get(user=self.user1, status='completed').count, 6)
+        out = io.StringIO()
+        call_command('reconcile_task_counters', dry_run=True, stdout=out)
+        self.assertIn('Счетчики совпадают с данными.', out.getvalue())
+
+    def test_reads_fall_through_to_archive(self):
+        """ Списки и задача по id после переноса в архив отдают те же данные """
+        cases = [
+            ('task-list', ()), ('user-task-list', ('testuser1',)),
+            ('task-filter-by-status', ('completed',)), ('task-filter-by-status', ('new',)),
+        ]
+        before = {case: self.list_ids(*case) for case in cases}
+        detail = self.client.get(reverse('task-detail', args=[self.old_ids[0]]), headers=self.headers1)
+
+        call_command('archive_completed_tasks', stdout=io.StringIO())
+        cache.clear()
+        for case in cases:
+            with self.subTest(case=case):
+                self.assertEqual(self.list_ids(*case), before[case])
+                self.assertEqual(self.list_ids(f'async-{case[0]}', case[1]), before[case])
+
+        for name in ('task-detail', 'async-task-detail'):
+            response = self.client.get(reverse(name, args=[self.old_ids[0]]), headers=self.headers1)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response.json(), detail.json())
+        # ETag зависит только от id и updated_at задачи
+        response = self.client.get(reverse('task-detail', args=[self.old_ids[0]]), headers=self.headers1)
+        self.assertEqual(response['ETag'], detail['ETag'])
+
+        with mock.patch.object(PageNumberPagination, 'page_size', 4):
+            response = self.client.get(reverse('task-list'), {'page': 2}, headers=self.headers1)
+            self.assertEqual(response.json()['count'], 9)
+            self.assertEqual([task['id'] for task in response.json()['results']], before[cases[0]][4:8])
+
+        response = self.client.get(reverse('task-stats'), headers=self.headers1)
+        self.assertEqual(response.json()['total'], 9)
+
+    def full_sync(self, limit=4):
+        changes, params = [], {'limit': limit}
+        while True:
+            response = self.client.get(reverse('user-task-sync', args=['testuser1']), params,
+                                       headers=self.headers1)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            changes.extend(response.data['changes'])
+            params['since'] = response.data['watermark']
+            if not response.data['has_more']:
+                return sorted(changes, key=lambda task: task['id']), response.data['watermark']
+
+    def export(self, params):
+        response = self.client.get(reverse('task-export'), params, headers=self.headers1)
+        return b''.join(response.streaming_content)
+
+    def test_sync_and_export_include_archive(self):
+        """ Синхронизация и выгрузка после переноса в архив возвращают те же задачи """
+        before, watermark = self.full_sync()
+        self.assertEqual(len(before), 9)
+        exports = {output: self.export({'output': output, 'status': 'completed'}) for output in ('ndjson', 'csv')}
+        exports['all'] = self.export({})
+
+        call_command('archive_completed_tasks', stdout=io.StringIO())
+        self.assertEqual(ArchivedTask.objects.count(), 4)
+
+        self.assertEqual(self.full_sync()[0], before)
+        # Перенос в архив - не изменение и не удаление: задачи архива не
+        # приходят повторно (свежие задачи внутри окна settle - приходят)
+        response = self.client.get(reverse('user-task-sync', args=['testuser1']), {'since': watermark},
+                                   headers=self.headers1)
+        self.assertEqual(response.data['deleted'], [])
+        self.assertFalse({task['id'] for task in response.data['changes']} & set(self.old_ids))
+
+        for output in ('ndjson', 'csv'):
+            self.assertEqual(self.export({'output': output, 'status': 'completed'}), exports[output])
+        self.assertEqual(self.export({}), exports['all'])
+        self.assertEqual(len(exports['all'].splitlines()), 9)
+
+    def test_writes_restore_archived_tasks(self):
+        """ Изменение задачи из архива возвращает ее в Task; чужая задача - 403 """
+        call_command('archive_completed_tasks', stdout=io.StringIO())
+        updated, completed, deleted, bulk = self.old_ids
+
+        for name, task_id in (('task-update', updated), ('task-complete', completed), ('task-delete', deleted)):
+            method = self.client.delete if name == 'task-delete' else self.client.put
+            response = method(reverse(name, args=[task_id]), {'title': 'X'}, headers=self.headers2)
+            self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        response = self.client.patch(reverse('task-update', args=[updated]), {'status': 'in_progress'},
+                                     headers=self.headers1)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(Task.objects.get(pk=updated).status, 'in_progress')
+
+        response = self.client.put(reverse('task-complete', args=[completed]), headers=self.headers1)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertGreater(Task.objects.get(pk=completed).updated_at,
+                           timezone.now() - datetime.timedelta(minutes=1))
+
+        response = self.client.delete(reverse('task-delete', args=[deleted]), headers=self.headers1)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(TaskTombstone.objects.filter(task_id=deleted).exists())
+
+        response = self.client.post(reverse('task-bulk'), {'operations': [
+            {'op': 'update', 'id': bulk, 'data': {'title': 'Bulk'}},
+        ]}, format='json', headers=self.headers1)
+        self.assertEqual(response.json()['results'][0]['status'], 200)
+        self.assertEqual(Task.objects.get(pk=bulk).title, 'Bulk')
+
+        self.assertFalse(ArchivedTask.objects.exists())
+        self.assertEqual(TaskCounter.objects.get(user=self.user1, status='completed').count, 4)
+
+
+class SparseFieldsetTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        user_state_cache.clear()
+        self.user = User.objects.create_user(username='testuser1', password='testpass1', first_name='Test1')
+        self.headers = {'Authorization': 'Bearer ' + str(RefreshToken.for_user(self.user).access_token)}
+        self.tasks = [Task.objects.create(title=f'Task {i}', description='Long description', status='new',
+                                          user=self.user) for i in range(5)]
+
+    def get(self, name, args=(), **params):
+        with CaptureQueriesContext(connections['default']) as queries:
+            response = self.client.get(reverse(name, args=args), params, headers=self.headers)
+        task_queries = [query['sql'] for query in queries.captured_queries if 'tasks_task' in query['sql']]
+        return response, task_queries
+
+    def test_fields_narrow_payload_and_columns(self):
+        """ ?fields= и ?exclude= сужают и ответ, и колонки SQL-запроса """
+        cases = [
+            ('task-list', (), {'fields': 'id,title,status'}, ['id', 'title', 'status']),
+            ('user-task-list', ('testuser1',), {'exclude': 'description'}, ['id', 'title', 'status', 'user']),
+            ('task-filter-by-status', ('new',), {'fields': 'status,title'}, ['title', 'status']),
+        ]
+        for name, args, params, expected in cases:
+            with self.subTest(name=name):
+                response, queries = self.get(name, args, **params)
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                self.assertEqual([list(task) for task in response.json()['results']], [expected] * 5)
+                self.assertFalse([sql for sql in queries if 'description' in sql])
+                # Асинхронный вариант отдает то же самое
+                response = self.client.get(reverse(f'async-{name}', args=args), params, headers=self.headers)
+                self.assertEqual(response.json()['results'], self.get(name, args, **params)[0].json()['results'])
+
+        task = self.tasks[0]
+        for name in ('task-detail', 'async-task-detail'):
+            response, queries = self.get(name, (task.id,), fields='title')
+            self.assertEqual(response.json(), {'title': task.title})
+            self.assertIn('ETag', response)
+            self.assertFalse([sql for sql in queries if 'description' in sql])
+
+    def test_fields_with_cursor_pagination_and_cache(self):
+        """ Курсорная пагинация и кэш списков работают с любым набором полей """
+        with mock.patch.object(TaskCursorPagination, 'page_size', 3):
+            response, _ = self.get('user-task-list', ('testuser1',), fields='title', pagination='cursor')
+            self.assertEqual(response.json()['results'], [{'title': f'Task {i}'} for i in (4, 3, 2)])
+            next_page = self.client.get(response.json()['next'], headers=self.headers).json()
+            self.assertEqual(next_page['results'], [{'title': 'Task 1'}, {'title': 'Task 0'}])
+
+        # Разные наборы полей - разные записи кэша
+        response, _ = self.get('user-task-list', ('testuser1',))
+        self.assertEqual(len(response.json()['results'][0]), 5)
+
+    def test_unknown_fields_rejected(self):
+        """ Неизвестные поля и пустой набор полей - 400 """
+        for params in ({'fields': 'id,secret'}, {'exclude': 'password'}, {'fields': 'id', 'exclude': 'id'}):
+            for name, args in (('task-list', ()), ('task-detail', (self.tasks[0].id,)),
+                               ('async-task-list', ()), ('async-task-detail', (self.tasks[0].id,))):
+                with self.subTest(name=name, params=params):
+                    response, _ = self.get(name, args, **params)
+                    self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response, _ = self.get('task-list', fields='id,secret')
+        self.assertIn('Unknown field(s): secret.', response.json()['fields'])
+
+
+class TaskAdminTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        user_state_cache.clear()
+        self.admin = User.objects.create_superuser(username='admin', password='adminpass', first_name='Admin')
+        self.user = User.objects.create_user(username='testuser1', password='testpass1', first_name='Test1')
+        self.tasks = [Task.objects.create(title=f'Task {i}', status='new' if i % 2 else 'in_progress',
+                                          user=self.user) for i in range(6)]
+        self.client.force_login(self.admin)
+
+    def test_changelist_and_search(self):
+        """ Список задач в админке: пользователь - одним JOIN, поиск по id и @username """
+        url = reverse('admin:tasks_task_changelist')
+        with CaptureQueriesContext(connections['default']) as queries:
+            response = self.client.get(url, {'status__exact': 'new'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['cl'].result_count, 3)
+        task_queries = [query['sql'] for query in queries.captured_queries if 'FROM "tasks_task"' in query['sql']]
+        # Точный COUNT ограничен подзапросом с LIMIT; пользователи - JOIN в запросе страницы
+        self.assertTrue(any('LIMIT 10001' in sql for sql in task_queries if 'COUNT' in sql))
+        self.assertTrue(any('INNER JOIN "tasks_user"' in sql for sql in task_queries if 'COUNT' not in sql))
+
+        for term, expected in ((str(self.tasks[2].id), [self.tasks[2].id]), ('@testuser1', None), ('@nobody', [])):
+            with self.subTest(term=term):
+                response = self.client.get(url, {'q': term})
+                ids = [task.id for task in response.context['cl'].result_list]
+                self.assertEqual(ids, expected if expected is not None else sorted(
+                    (task.id for task in self.tasks), reverse=True))
+
+        response = self.client.get(reverse('admin:tasks_user_changelist'))
+        self.assertEqual(response.status_code, 200)
+
+    def test_mark_completed_action(self):
+        """ Действие "завершить" - один UPDATE, события и сброс кэша списков """
+        selected = [task.id for task in self.tasks[:4]]
+        with CaptureQueriesContext(connections['default']) as queries, \
+                self.captureOnCommitCallbacks(execute=True), \
+                mock.patch('tasks.admin.tasks_changed.send') as send:
+            response = self.client.post(reverse('admin:tasks_task_changelist'), {
+                'action': 'mark_completed', '_selected_action': selected,
+            })
+        self.assertEqual(response.status_code, 302)
+        updates = [query for query in queries.captured_queries if query['sql'].startswith('UPDATE "tasks_task"')]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(set(Task.objects.filter(id__in=selected).values_list('status', flat=True)), {'completed'})
+        self.assertEqual(sorted(change['task']['id'] for change in send.call_args.kwargs['changes']), selected)
+
+    def test_delete_writes_tombstones(self):
+        """ Удаление через админку оставляет метки удаления для синхронизации """
+        task = self.tasks[0]
+        response = self.client.post(reverse('admin:tasks_task_delete', args=[task.id]), {'post': 'yes'})
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(Task.objects.filter(pk=task.id).exists())
+        self.assertTrue(TaskTombstone.objects.filter(task_id=task.id, status=task.status).exists())
+
+    def test_estimated_count_paginator(self):
+        """ Больше exact_count_limit строк без оценки СУБД - точный COUNT """
+        queryset = Task.objects.filter(status='new').order_by('-id')
+        self.assertEqual(EstimatedCountPaginator(queryset, 2).count, 3)
+        with mock.patch.object(EstimatedCountPaginator, 'exact_count_limit', 2):
+            self.assertEqual(EstimatedCountPaginator(queryset, 2).count, 3)
+            self.assertEqual(EstimatedCountPaginator(Task.objects.order_by('-id'), 2).count, 6)
@@ -0,0 +1,155 @@
+import hashlib
+import threading
+import time
+
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.cache.backends.redis import RedisCache
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework.throttling import SimpleRateThrottle
+
+from .cache import get_cache
+
+
+# Ограничение частоты запросов алгоритмом token bucket. Частота области
+# задается в REST_FRAMEWORK['DEFAULT_THROTTLE_RATES'] в формате DRF
+# ('20/min'): емкость корзины - 20 запросов (допустимый всплеск), корзина
+# пополняется со скоростью 20 запросов в минуту.
+#
+# Состояние корзины хранится в кэше Django (TASKS_CACHE_ALIAS):
+#   - Redis - Lua-скрипт: чтение, пополнение, списание и запись атомарно
+#     на сервере, за одно обращение; время берется с сервера Redis, поэтому
+#     расхождение часов серверов приложения не влияет на результат;
+#   - locmem - чтение и запись под блокировкой процесса: кэш виден только
+#     этому процессу, поэтому обновление атомарно.
+# Другие общие бэкенды (memcached, БД, файлы) не поддерживаются: get и set
+# из разных процессов не атомарны (incr в DatabaseCache - тоже get + set),
+# и корзина пропускала бы лишние запросы - consume() для них выбрасывает
+# ImproperlyConfigured.
+
+TOKEN_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1])
+local ts = tonumber(state[2])
+if tokens == nil or ts == nil then
+    tokens = capacity
+    ts = now
+end
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+else
+    wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate * 1000))
+return {allowed, tostring(wait)}
+"""
+
+
+class TokenBucket:
+    lock_stripes = 64
+    timer = time.time
+
+    def __init__(self):
+        self._locks = [threading.Lock() for _ in range(self.lock_stripes)]
+        self._script = None
+
+    # Списывает один запрос из корзины key: (разрешен ли запрос,
+    # через сколько секунд появится следующий токен)
+    def consume(self, key, capacity, rate):
+        cache = get_cache()
+        if isinstance(cache, RedisCache):
+            return self._consume_redis(cache, key, capacity, rate)
+        if isinstance(cache, LocMemCache):
+            return self._consume_locked(cache, key, capacity, rate)
+        raise ImproperlyConfigured(
+            f'Token bucket throttling requires RedisCache or LocMemCache, '
+            f'got {type(cache).__name__}.'
+        )
+
+    def _consume_redis(self, cache, key, capacity, rate):
+        key = cache.make_and_validate_key(key)
+        client = cache._cache.get_client(key, write=True)
+        if self._script is None:
+            # EVALSHA; текст скрипта отправляется только если его нет в кэше скриптов Redis
+            self._script = client.register_script(TOKEN_BUCKET_SCRIPT)
+        allowed, wait = self._script(keys=[key], args=[capacity, rate], client=client)
+        return bool(allowed), float(wait)
+
+    def _consume_locked(self, cache, key, capacity, rate):
+        with self._locks[hash(key) % self.lock_stripes]:
+            now = self.timer()
+            tokens, ts = cache.get(key) or (capacity, now)
+            tokens = min(capacity, tokens + max(0.0, now - ts) * rate)
+            if tokens >= 1:
+                tokens, allowed, wait = tokens - 1, True, 0.0
+            else:
+                allowed, wait = False, (1 - tokens) / rate
+            # Через capacity / rate секунд корзина снова полная - ключ не нужен
+            cache.set(key, (tokens, now), timeout=max(1, round(capacity / rate)))
+        return allowed, wait
+
+
+token_bucket = TokenBucket()
+
+
+# Базовый класс: частота - по scope из DEFAULT_THROTTLE_RATES, ключ корзины -
+# get_cache_key() (None - запрос не ограничивается этим классом)
+class TokenBucketThrottle(SimpleRateThrottle):
+    cache_format = 'tasks:throttle:%(scope)s:%(ident)s'
+    bucket = token_bucket
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+        key = self.get_cache_key(request, view)
+        if key is None:
+            return True
+        allowed, self.retry_after = self.bucket.consume(key, self.num_requests, self.num_requests / self.duration)
+        return allowed
+
+    def wait(self):
+        return self.retry_after
+
+
+# Запросы аутентифицированного пользователя - по id пользователя
+class UserTokenBucketThrottle(TokenBucketThrottle):
+    scope = 'user'
+
+    def get_cache_key(self, request, view):
+        if not request.user or not request.user.is_authenticated:
+            return None
+        return self.cache_format % {'scope': self.scope, 'ident': request.user.pk}
+
+
+# Все запросы - по IP клиента (с учетом NUM_PROXIES и X-Forwarded-For)
+class IPTokenBucketThrottle(TokenBucketThrottle):
+    scope = 'ip'
+
+    def get_cache_key(self, request, view):
+        return self.cache_format % {'scope': self.scope, 'ident': self.get_ident(request)}
+
+
+# Выдача токенов (PBKDF2 на каждый запрос): отдельные, более строгие области
+class TokenIPThrottle(IPTokenBucketThrottle):
+    scope = 'token_ip'
+
+
+# Попытки входа под одним именем пользователя с любых адресов
+# (подбор пароля к одной учетной записи из многих IP)
+class TokenUsernameThrottle(TokenBucketThrottle):
+    scope = 'token_username'
+
+    def get_cache_key(self, request, view):
+        username = request.data.get('username') if hasattr(request.data, 'get') else None
+        if not isinstance(username, str) or not username:
+            return None
+        digest = hashlib.md5(username.lower().encode()).hexdigest()
+        return self.cache_format % {'scope': self.scope, 'ident': digest}
@@ -1,6 +1,5 @@
 from django.urls import path
-from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
-from . import views      
+from . import async_views, views
 
 urlpatterns = [
     # Получение списка всех задач
@@ -9,6 +8,9 @@ urlpatterns = [
     # Получение списка задач пользователя по 'username'
     path('tasks/user/<str:username>/', views.UserTasksView.as_view(), name='user-task-list'),
 
+    # Инкрементальная синхронизация задач пользователя (?since=<watermark>&limit=<n>)
+    path('tasks/user/<str:username>/sync/', views.UserTaskSyncView.as_view(), name='user-task-sync'),
+
     # Получение инфо о задаче по UID
     path('tasks/<int:pk>/', views.TaskDetailView.as_view(), name='task-detail'),
 
@@ -24,14 +26,45 @@ urlpatterns = [
     # Установка статуса задачи complete
     path('tasks/<int:pk>/complete/', views.MarkTaskCompletedView.as_view(), name='task-complete'),
 
+    # Пакетные операции над задачами (создание, обновление, завершение, удаление)
+    path('tasks/bulk/', views.TaskBulkView.as_view(), name='task-bulk'),
+
+    # Лента изменений задач (Server-Sent Events, ?user=<username>&status=<status>)
+    path('tasks/events/', views.task_events, name='task-events'),
+
+    # Потоковая выгрузка задач (?output=ndjson|csv&user=<username>&status=<status>)
+    path('tasks/export/', views.TaskExportView.as_view(), name='task-export'),
+
+    # Полнотекстовый поиск задач (?q=<запрос>&user=<username>&status=<status>)
+    path('tasks/search/', views.TaskSearchView.as_view(), name='task-search'),
+
     # Фильтр задач по статусу
     path('tasks/status/<str:status>/', views.TaskFilterStatusView.as_view(), name='task-filter-by-status'),
 
+    # Статистика задач: общая, по пользователям и одного пользователя
+    path('tasks/stats/', views.TaskStatsView.as_view(), name='task-stats'),
+    path('tasks/stats/users/', views.UserTaskStatsListView.as_view(), name='user-task-stats-list'),
+    path('tasks/stats/user/<str:username>/', views.UserTaskStatsView.as_view(), name='user-task-stats'),
+
+    # Статистика кэша списков задач (только для администраторов)
+    path('tasks/cache/stats/', views.TaskCacheStatsView.as_view(), name='task-cache-stats'),
+
+    # Метрики запросов в формате Prometheus (Authorization: Bearer <TASKS_METRICS_TOKEN>)
+    path('tasks/metrics/', views.task_metrics, name='task-metrics'),
+
+    # Асинхронные варианты эндпоинтов чтения (ASGI): те же ответы, только JSON
+    path('async/tasks/', async_views.AsyncTaskListView.as_view(), name='async-task-list'),
+    path('async/tasks/user/<str:username>/', async_views.AsyncUserTasksView.as_view(),
+         name='async-user-task-list'),
+    path('async/tasks/<int:pk>/', async_views.AsyncTaskDetailView.as_view(), name='async-task-detail'),
+    path('async/tasks/status/<str:status>/', async_views.AsyncTaskFilterStatusView.as_view(),
+         name='async-task-filter-by-status'),
+
     # JWT - эндпоинты
     # Получение refresh и acess токенов
-    path('api/token/', TokenObtainPairView.as_view(), name='token-obtain-pair'),  
+    path('api/token/', views.TaskTokenObtainPairView.as_view(), name='token-obtain-pair'),  
     # Обновление acess токена
-    path('api/token/refresh/', TokenRefreshView.as_view(), name='token-refresh'), 
+    path('api/token/refresh/', views.TaskTokenRefreshView.as_view(), name='token-refresh'), 
 ]
 
 
@@ -0,0 +1,178 @@
+from functools import cached_property
+from operator import itemgetter
+
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
+
+from .serializers import TaskSerializer
+
+
+# Быстрый путь сериализации списков только для чтения.
+# Вместо моделей и обхода полей ModelSerializer для каждой строки
+# queryset отдает .values() (словари колонок), а сопоставление
+# "поле ответа -> колонка -> преобразование" строится один раз по полям
+# исходного сериализатора. Результат совпадает с выводом этого сериализатора.
+
+# Поля, для которых to_representation не меняет значение, прочитанное из БД
+IDENTITY_FIELDS = (
+    serializers.IntegerField,
+    serializers.CharField,
+    serializers.ChoiceField,
+    serializers.BooleanField,
+)
+
+
+# fields - только часть полей исходного сериализатора (см. narrow)
+class ValuesSerializer:
+
+    def __init__(self, serializer_class, extra_columns=(), fields=None):
+        self.serializer_class = serializer_class
+        self.extra_columns = tuple(extra_columns)
+        self.fields = tuple(fields) if fields is not None else None
+        self._narrowed = {}
+
+    @cached_property
+    def mapping(self):
+        model = self.serializer_class.Meta.model
+        mapping = []
+        for name, field in self.serializer_class().fields.items():
+            if field.write_only or (self.fields is not None and name not in self.fields):
+                continue
+            if field.source == '*' or '.' in field.source:
+                raise ImproperlyConfigured(
+                    f'{self.serializer_class.__name__}.{name}: source {field.source!r} '
+                    f'is not supported by ValuesSerializer.'
+                )
+            # Для ForeignKey берется колонка user_id - без JOIN и объекта
+            column = model._meta.get_field(field.source).attname
+            if isinstance(field, IDENTITY_FIELDS):
+                convert = None
+            elif isinstance(field, serializers.PrimaryKeyRelatedField) and field.pk_field is None:
+                convert = None
+            else:
+                convert = field.to_representation
+            mapping.append((name, column, convert))
+        return tuple(mapping)
+
+    @cached_property
+    def names(self):
+        return tuple(name for name, _, _ in self.mapping)
+
+    # Сериализатор с частью полей (кортеж имен в порядке полей исходного).
+    # Сужает и ответ, и колонки запроса; служебные колонки остаются.
+    # Наборов полей немного, поэтому сериализаторы кэшируются
+    def narrow(self, fields):
+        if fields is None or fields == self.names:
+            return self
+        narrowed = self._narrowed.get(fields)
+        if narrowed is None:
+            narrowed = ValuesSerializer(self.serializer_class, self.extra_columns, fields)
+            self._narrowed[fields] = narrowed
+        return narrowed
+
+    # Колонки для queryset.values(): поля ответа и служебные (например,
+    # id для пагинации и updated_at для ETag)
+    @cached_property
+    def columns(self):
+        columns = [column for _, column, _ in self.mapping]
+        columns.extend(column for column in self.extra_columns if column not in columns)
+        return tuple(columns)
+
+    @cached_property
+    def _compiled(self):
+        names = tuple(name for name, _, _ in self.mapping)
+        getter = itemgetter(*(column for _, column, _ in self.mapping))
+        if len(names) == 1:
+            single = getter
+            getter = lambda row: (single(row),)  # noqa: E731
+        converters = tuple(
+            (name, convert) for name, _, convert in self.mapping if convert is not None
+        )
+        return names, getter, converters
+
+    def to_representation(self, rows):
+        names, getter, converters = self._compiled
+        data = [dict(zip(names, getter(row))) for row in rows]
+        if converters:
+            for item in data:
+                for name, convert in converters:
+                    # Как и DRF, None не преобразуется
+                    if item[name] is not None:
+                        item[name] = convert(item[name])
+        return data
+
+
+task_values_serializer = ValuesSerializer(TaskSerializer, extra_columns=('id', 'updated_at'))
+
+
+# Разреженный набор полей ответа: ?fields=id,title - только эти поля,
+# ?exclude=description - все, кроме этих (можно вместе). Возвращает кортеж
+# имен в порядке полей сериализатора или None, если параметров нет;
+# неизвестные поля и пустой набор - 400
+def parse_fieldset(query_params, available):
+    fields, exclude = query_params.get('fields'), query_params.get('exclude')
+    if fields is None and exclude is None:
+        return None
+    selected = set(_split_fields(fields, 'fields', available)) if fields is not None else set(available)
+    if exclude is not None:
+        selected -= set(_split_fields(exclude, 'exclude', available))
+    if not selected:
+        raise ValidationError({'fields': 'At least one field must be selected.'})
+    return tuple(name for name in available if name in selected)
+
+
+def _split_fields(value, param, available):
+    names = [name.strip() for name in value.split(',') if name.strip()]
+    unknown = [name for name in names if name not in available]
+    if unknown:
+        raise ValidationError({param: f"Unknown field(s): {', '.join(unknown)}. "
+                                      f"Available: {', '.join(available)}."})
+    return names
+
+
+# ?fields= / ?exclude= для представлений задач: набор полей разбирается один
+# раз на запрос по полям values_serializer
+class SparseFieldsetMixin:
+    values_serializer = task_values_serializer
+
+    def get_fieldset(self):
+        if not hasattr(self, '_fieldset'):
+            self._fieldset = parse_fieldset(self.request.query_params, self.values_serializer.names)
+        return self._fieldset
+
+    def get_values_serializer(self):
+        return self.values_serializer.narrow(self.get_fieldset())
+
+    # Одиночный объект - serializer_class с тем же набором полей
+    def get_serializer(self, *args, **kwargs):
+        fieldset = self.get_fieldset()
+        if fieldset is not None:
+            kwargs.setdefault('fields', fieldset)
+        return super().get_serializer(*args, **kwargs)
+
+
+# Подключение быстрого пути к ListAPIView: список читается через .values(),
+# а сериализуется через ValuesSerializer (с учетом ?fields= / ?exclude=).
+# Одиночные объекты и схема API по-прежнему используют serializer_class.
+class ValuesListMixin(SparseFieldsetMixin):
+
+    def filter_queryset(self, queryset):
+        return super().filter_queryset(queryset).values(*self.get_values_serializer().columns)
+
+    def get_serializer(self, *args, **kwargs):
+        if kwargs.get('many') and args:
+            return _ValuesSerializerResult(self.get_values_serializer(), args[0])
+        return super().get_serializer(*args, **kwargs)
+
+
+# Минимальный интерфейс сериализатора, который нужен ListAPIView (.data)
+class _ValuesSerializerResult:
+
+    def __init__(self, values_serializer, rows):
+        self.values_serializer = values_serializer
+        self.rows = rows
+
+    @cached_property
+    def data(self):
+        return self.values_serializer.to_representation(self.rows)
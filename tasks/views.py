@@ -1,36 +1,91 @@
 from rest_framework.response import Response
-from rest_framework.exceptions import PermissionDenied
+from rest_framework.exceptions import AuthenticationFailed, NotFound, PermissionDenied, ValidationError
 from rest_framework.permissions import IsAuthenticated
 from rest_framework import generics, permissions
+from rest_framework.views import APIView
 from rest_framework import status
 from rest_framework import filters
+from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from .models import Task
-from .serializers import TaskSerializer
+from django.core.handlers.asgi import ASGIRequest
+from django.db import router, transaction
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils.crypto import constant_time_compare
+from django.utils import timezone
+from .models import ArchivedTask, Task, TaskTombstone
+from .serializers import BulkRequestSerializer, TaskSerializer
+from .bulk import apply_bulk_operations
+from .pagination import SelectablePaginationMixin, TaskCursorPagination
+from .cache import VersionedListCacheMixin, cache_stats, invalidate_task_lists
+from .conditional import DetailETagMixin, ListETagMixin
+from .signals import tasks_changed
+from .events import event_hub, stream_events
+from .authentication import TaskJWTAuthentication
+from .instrumentation import PROMETHEUS_CONTENT_TYPE, metrics_registry
+from .throttling import TokenIPThrottle, TokenUsernameThrottle
+from .routers import ReplicaReadMixin
+from .archive import archive_enabled, restore_archived_tasks, with_archive
+from .sharding import TaskShardMixin, next_task_id, scatter, sharding_enabled
+from .sync import get_changes
+from .values import SparseFieldsetMixin, ValuesListMixin, ValuesSerializer
+from .search import TaskSearchCursorPagination, search_tasks
+from .stats import get_global_stats, get_user_stats
+from .export import (
+    EXPORT_FORMATS, ExportContentNegotiation, aget_export_batches, aiter_export, get_export_rows, iter_export,
+)
+
+
+TASK_STATUSES = [value for value, _ in Task.STATUS_CHOICES]
+
+
+# Запись не затронула ни одной строки: задача чужая (403) или ее нет (404).
+# Чужая задача может быть на другом шарде или в архиве - проверяются все
+def raise_for_missing_task(pk, message):
+    if scatter(with_archive(lambda model: model.objects.filter(pk=pk))).exists():
+        raise PermissionDenied(message)
+    raise NotFound()
 
 
 # Получение списка всех задач
-class TaskListView(generics.ListAPIView):
+class TaskListView(ReplicaReadMixin, ListETagMixin, ValuesListMixin, SelectablePaginationMixin, generics.ListAPIView):
     queryset = Task.objects.all().order_by('-id')
     serializer_class = TaskSerializer 
     permission_classes = [permissions.IsAuthenticated]
 
+    # Слияние по -id страниц Task и архива на всех шардах
+    def get_queryset(self):
+        return scatter(with_archive(lambda model: model.objects.order_by('-id')))
+
 # Получение задач пользователя по 'username'
-class UserTasksView(generics.ListAPIView):
+class UserTasksView(ReplicaReadMixin, TaskShardMixin, VersionedListCacheMixin, ListETagMixin, ValuesListMixin,
+                    SelectablePaginationMixin, generics.ListAPIView):
     queryset = Task.objects.all()
     serializer_class = TaskSerializer
     permission_classes = [permissions.IsAuthenticated]
+    cache_scope = 'user'
+    cache_scope_kwarg = 'username'
+    shard_username_kwarg = 'username'
 
+    # Один запрос с JOIN по уникальному (индексированному) username
+    # вместо отдельной выборки пользователя (и такой же - к архиву)
     def get_queryset(self):
-        User = get_user_model()
         username = self.kwargs.get('username')
+        return with_archive(lambda model: model.objects.filter(user__username=username).order_by('-id'))
+
+    # Пустая страница - единственный случай, когда нужно отличить
+    # "у пользователя нет задач" от "пользователя не существует"
+    def paginate_queryset(self, queryset):
+        page = super().paginate_queryset(queryset)
+        if not page:
+            User = get_user_model()
+            if not User.objects.filter(username=self.kwargs.get('username')).exists():
+                raise NotFound("User not found.")
+        return page
 
-        user = User.objects.get(username=username)
-        return Task.objects.filter(user=user).order_by('-id')
-        
 
 # Получение задачи по ее UID
-class TaskDetailView(generics.RetrieveUpdateDestroyAPIView):
+class TaskDetailView(ReplicaReadMixin, SparseFieldsetMixin, DetailETagMixin, generics.RetrieveUpdateDestroyAPIView):
     queryset = Task.objects.all()
     serializer_class = TaskSerializer
     permission_classes = [permissions.IsAuthenticated]
@@ -50,74 +105,366 @@ class TaskDetailView(generics.RetrieveUpdateDestroyAPIView):
         return Response({"detail": "Partial update via this endpoint is not allowed."},
                         status=status.HTTP_405_METHOD_NOT_ALLOWED)
 
-    def get_object(self):
-        task = super().get_object()
-        return task
+    # Задача по id ищется на всех шардах, затем в архиве; читаются только
+    # колонки запрошенных полей (?fields= / ?exclude=) и updated_at для ETag
+    def get_queryset(self):
+        columns = self.get_values_serializer().columns
+        return scatter(with_archive(lambda model: model.objects.only(*columns)))
 
 
 # Создание новой задачи текущему пользователю
-class TaskCreateView(generics.CreateAPIView):
+class TaskCreateView(TaskShardMixin, generics.CreateAPIView):
     serializer_class = TaskSerializer  
     permission_classes = [IsAuthenticated]  
 
     def perform_create(self, serializer):
-        serializer.save(user=self.request.user)  
+        task = serializer.save(user_id=self.request.user.id, id=next_task_id())
+        invalidate_task_lists(usernames=[self.request.user.username], statuses=[task.status])
 
 
 # Обновление задачи
-class TaskUpdateView(generics.UpdateAPIView):
+class TaskUpdateView(TaskShardMixin, generics.UpdateAPIView):
     queryset = Task.objects.all()
     serializer_class = TaskSerializer
     permission_classes = [permissions.IsAuthenticated]
 
-    def perform_update(self, serializer):
-        task = self.get_object()  # Получаем задачу
+    # Задача выбирается один раз: проверка владельца - по user_id,
+    # без загрузки пользователя
+    def get_object(self):
+        pk = self.kwargs.get('pk')
+        try:
+            task = super().get_object()
+        except Http404:
+            # Своя задача из архива изменяется после возврата в Task
+            if restore_archived_tasks([pk], self.request.user.id):
+                return super().get_object()
+            # Задачи нет на шарде пользователя, но она может быть на другом
+            # (или в архиве, если она чужая)
+            if not (sharding_enabled() or archive_enabled()) or \
+                    not scatter(with_archive(lambda model: model.objects.filter(pk=pk))).exists():
+                raise
+            raise PermissionDenied("You do not have permission to update this task.")
 
         # Проверка, является ли пользователь владельцем задачи
-        if task.user != self.request.user:
+        if task.user_id != self.request.user.id:
             raise PermissionDenied("You do not have permission to update this task.")
+        return task
 
-        # Если пользователь является владельцем, сохраняем изменения
-        serializer.save()
+    def perform_update(self, serializer):
+        previous_status = serializer.instance.status
+
+        # Сохраняются только переданные поля (update_fields)
+        task = serializer.save()
+        invalidate_task_lists(usernames=[self.request.user.username],
+                              statuses=[previous_status, task.status])
 
 
 # Удаление задачи по UID
-class TaskDeleteView(generics.DestroyAPIView):
+class TaskDeleteView(TaskShardMixin, generics.DestroyAPIView):
     queryset = Task.objects.all()
     serializer_class = TaskSerializer
     permission_classes = [permissions.IsAuthenticated]
 
+    # Один DELETE ... WHERE id = %s AND user_id = %s; по числу удаленных строк
+    # выбираем ответ, а 403/404 различаем только при неудаче
     def delete(self, request, *args, **kwargs):
-        task = self.get_object()
-        
-        if task.user != request.user:
-            raise PermissionDenied("You do not have permission to delete this task.")
+        pk = self.kwargs.get('pk')
+        with transaction.atomic(using=router.db_for_write(Task), savepoint=False):
+            deleted, _ = Task.objects.filter(pk=pk, user_id=request.user.id).delete()
+            if not deleted and archive_enabled():
+                deleted, _ = ArchivedTask.objects.filter(pk=pk, user_id=request.user.id).delete()
+            if deleted:
+                # Метка удаления для инкрементальной синхронизации (tasks/sync.py)
+                TaskTombstone.objects.create(task_id=pk, user_id=request.user.id)
+        if not deleted:
+            raise_for_missing_task(pk, "You do not have permission to delete this task.")
+
+        tasks_changed.send(sender=Task, changes=[{
+            'type': 'deleted', 'task': {'id': pk, 'user': request.user.id}, 'previous_status': None,
+        }])
+
+        # Статус удаленной задачи неизвестен - сбрасываем списки всех статусов
+        invalidate_task_lists(usernames=[request.user.username], statuses=TASK_STATUSES)
 
-        task.delete()
-        
         return Response({"detail": "Task successfully deleted."}, status=status.HTTP_200_OK)
 
 
 # Установка статуса 'complete'
-class MarkTaskCompletedView(generics.UpdateAPIView):
+class MarkTaskCompletedView(TaskShardMixin, generics.UpdateAPIView):
     queryset = Task.objects.all()
     serializer_class = TaskSerializer  
     permission_classes = [IsAuthenticated]
 
+    # Один UPDATE ... WHERE id = %s AND user_id = %s вместо SELECT и полного save().
+    # Своя задача из архива завершается повторно после возврата в Task
     def update(self, request, *args, **kwargs):
-        task = self.get_object()
-        
-        task.status = "completed"
-        task.save()
+        pk = self.kwargs.get('pk')
+        tasks = Task.objects.filter(pk=pk, user_id=request.user.id)
+        updated = tasks.update(status="completed", updated_at=timezone.now())
+        if not updated and restore_archived_tasks([pk], request.user.id):
+            updated = tasks.update(status="completed", updated_at=timezone.now())
+        if not updated:
+            raise_for_missing_task(pk, "You do not have permission to complete this task.")
+
+        tasks_changed.send(sender=Task, changes=[{
+            'type': 'completed', 'task': {'id': pk, 'user': request.user.id, 'status': 'completed'},
+            'previous_status': None,
+        }])
+
+        # Прежний статус неизвестен - сбрасываем списки всех статусов
+        invalidate_task_lists(usernames=[request.user.username], statuses=TASK_STATUSES)
 
         return Response({"detail": "Task status updated to 'completed'."}, status=status.HTTP_200_OK)
 
 
+# Пакетные операции над задачами текущего пользователя:
+# create / update / complete / delete в одном запросе и одной транзакции
+class TaskBulkView(TaskShardMixin, APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, *args, **kwargs):
+        serializer = BulkRequestSerializer(data=request.data, context={
+            'max_operations': getattr(settings, 'TASKS_BULK_MAX_OPERATIONS', 500),
+        })
+        serializer.is_valid(raise_exception=True)
+
+        results, affected_statuses = apply_bulk_operations(
+            request.user, serializer.validated_data['operations']
+        )
+        if affected_statuses:
+            invalidate_task_lists(usernames=[request.user.username], statuses=affected_statuses)
+
+        return Response({"results": results}, status=status.HTTP_200_OK)
+
+
+# Инкрементальная синхронизация задач пользователя:
+# ?since=<watermark> - изменения после прошлой синхронизации (без since -
+# все задачи), ?limit=<n> - размер страницы. Клиент повторяет запрос с
+# полученным watermark, пока has_more = true.
+class UserTaskSyncView(TaskShardMixin, APIView):
+    permission_classes = [IsAuthenticated]
+    shard_username_kwarg = 'username'
+
+    def get(self, request, username, *args, **kwargs):
+        max_limit = getattr(settings, 'TASKS_SYNC_MAX_LIMIT', 1000)
+        try:
+            limit = int(request.query_params.get('limit', max_limit))
+        except ValueError:
+            limit = 0
+        if not 0 < limit <= max_limit:
+            return Response({"detail": f"limit must be between 1 and {max_limit}."},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        changed, deleted, watermark, has_more = get_changes(
+            username, request.query_params.get('since'), limit
+        )
+        if not changed and not deleted:
+            User = get_user_model()
+            if not User.objects.filter(username=username).exists():
+                raise NotFound("User not found.")
+
+        return Response({
+            "changes": TaskSerializer(changed, many=True).data,
+            "deleted": deleted,
+            "watermark": watermark,
+            "has_more": has_more,
+        })
+
+
+# Потоковая выгрузка задач в NDJSON или CSV без пагинации:
+# ?output=ndjson|csv (или заголовок Accept), фильтры ?user=<username> и
+# ?status=<status> - те же, что у списков задач
+class TaskExportView(APIView):
+    permission_classes = [IsAuthenticated]
+    content_negotiation_class = ExportContentNegotiation
+
+    def get_output_format(self, request):
+        output_format = request.query_params.get('output')
+        if output_format is None:
+            accept = request.META.get('HTTP_ACCEPT', '')
+            output_format = next(
+                (name for name, media_type in EXPORT_FORMATS.items() if media_type in accept), 'ndjson'
+            )
+        return output_format
+
+    def get(self, request, *args, **kwargs):
+        output_format = self.get_output_format(request)
+        if output_format not in EXPORT_FORMATS:
+            return Response({"detail": f"Unknown output format '{output_format}'."},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        status_filter = request.query_params.get('status')
+        if status_filter is not None and status_filter not in TASK_STATUSES:
+            return Response({"detail": "Unknown status."}, status=status.HTTP_400_BAD_REQUEST)
+
+        username = request.query_params.get('user')
+        if username is not None and not get_user_model().objects.filter(username=username).exists():
+            raise NotFound("User not found.")
+
+        # Под ASGI - асинхронный итератор: синхронный Django прочитал бы целиком
+        if isinstance(request._request, ASGIRequest):
+            content = aiter_export(aget_export_batches(username=username, status=status_filter), output_format)
+        else:
+            content = iter_export(get_export_rows(username=username, status=status_filter), output_format)
+        response = StreamingHttpResponse(content, content_type=EXPORT_FORMATS[output_format])
+        response['Content-Disposition'] = f'attachment; filename="tasks.{output_format}"'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+
 # Фильтрация задач по статусу
-class TaskFilterStatusView(generics.ListAPIView):
+class TaskFilterStatusView(ReplicaReadMixin, VersionedListCacheMixin, ListETagMixin, ValuesListMixin,
+                           SelectablePaginationMixin, generics.ListAPIView):
     serializer_class = TaskSerializer
     permission_classes = [IsAuthenticated]
+    cache_scope = 'status'
+    cache_scope_kwarg = 'status'
 
+    # Завершенные задачи - вместе с архивом
     def get_queryset(self):
         status = self.kwargs.get('status') # Получение статуса из запроса
-        return Task.objects.filter(status=status).order_by('-id')
+        return scatter(with_archive(lambda model: model.objects.filter(status=status).order_by('-id'),
+                                    include_archive=status == 'completed'))
+
+
+# Полнотекстовый поиск задач по title и description:
+# ?q=<запрос> (обязателен), фильтры ?user=<username> и ?status=<status>.
+# Результаты упорядочены по релевантности, пагинация - курсорная.
+# С шардированием опрашиваются все шарды (scatter).
+class TaskSearchView(ListETagMixin, ValuesListMixin, generics.ListAPIView):
+    serializer_class = TaskSerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = TaskSearchCursorPagination
+    values_serializer = ValuesSerializer(TaskSerializer, extra_columns=('id', 'updated_at', 'rank'))
+
+    def get_queryset(self):
+        params = self.request.query_params
+        query = params.get('q', '').strip()
+        if not query:
+            raise ValidationError({"q": "This query parameter is required."})
+
+        queryset = Task.objects.all()
+        username = params.get('user')
+        if username is not None:
+            queryset = queryset.filter(user__username=username)
+        status_filter = params.get('status')
+        if status_filter is not None:
+            if status_filter not in TASK_STATUSES:
+                raise ValidationError({"status": "Unknown status."})
+            queryset = queryset.filter(status=status_filter)
+        return scatter(search_tasks(queryset, query))
+
+    # Как в UserTasksView: пользователь проверяется только при пустой странице
+    def paginate_queryset(self, queryset):
+        page = super().paginate_queryset(queryset)
+        username = self.request.query_params.get('user')
+        if not page and username is not None:
+            if not get_user_model().objects.filter(username=username).exists():
+                raise NotFound("User not found.")
+        return page
+
+
+# Статистика задач: общее число и число по статусам (по счетчикам TaskCounter)
+class TaskStatsView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, *args, **kwargs):
+        return Response(get_global_stats())
+
+
+# Статистика задач по пользователям (курсорная пагинация по пользователям,
+# счетчики страницы - одним запросом)
+class UserTaskStatsListView(generics.ListAPIView):
+    permission_classes = [IsAuthenticated]
+    pagination_class = TaskCursorPagination
+
+    def get_queryset(self):
+        return get_user_model().objects.values('id', 'username')
+
+    def list(self, request, *args, **kwargs):
+        users = self.paginate_queryset(self.get_queryset())
+        stats = get_user_stats([user['id'] for user in users])
+        return self.get_paginated_response([
+            {"user": user['username'], **stats[user['id']]} for user in users
+        ])
+
+
+# Статистика задач одного пользователя
+class UserTaskStatsView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, username, *args, **kwargs):
+        user_id = get_user_model().objects.filter(username=username).values_list('id', flat=True).first()
+        if user_id is None:
+            raise NotFound("User not found.")
+        return Response({"user": username, **get_user_stats([user_id])[user_id]})
+
+
+# Счетчики попаданий/промахов кэша списков задач (для сбора метрик)
+class TaskCacheStatsView(APIView):
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        return Response(cache_stats.snapshot())
+
+
+# Выдача JWT: каждый запрос - проверка пароля (PBKDF2), поэтому частота
+# ограничивается и по IP, и по имени пользователя
+class TaskTokenObtainPairView(TokenObtainPairView):
+    throttle_classes = [TokenIPThrottle, TokenUsernameThrottle]
+
+
+# Обновление access-токена
+class TaskTokenRefreshView(TokenRefreshView):
+    throttle_classes = [TokenIPThrottle]
+
+
+# Гистограммы инструментирования (tasks/instrumentation.py) в текстовом
+# формате Prometheus. Доступ - по статическому токену TASKS_METRICS_TOKEN
+# (Authorization: Bearer <токен>), который задается в конфигурации
+# сборщика; без токена эндпоинт выключен
+def task_metrics(request):
+    token = getattr(settings, 'TASKS_METRICS_TOKEN', '')
+    if not token:
+        raise Http404()
+    if not constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return HttpResponse(status=status.HTTP_401_UNAUTHORIZED,
+                            headers={"WWW-Authenticate": 'Bearer realm="metrics"'})
+    return HttpResponse(metrics_registry.render(), content_type=PROMETHEUS_CONTENT_TYPE)
+
+
+# Лента изменений задач (Server-Sent Events, только под ASGI).
+# Фильтры: ?user=<username> и/или ?status=<status>.
+# Асинхронное представление Django: соединение не занимает поток,
+# пока ждет событий.
+async def task_events(request):
+    try:
+        auth = await TaskJWTAuthentication().aauthenticate(request)
+    except AuthenticationFailed as exc:
+        detail = exc.detail if isinstance(exc.detail, dict) else {"detail": exc.detail}
+        return JsonResponse(detail, status=status.HTTP_401_UNAUTHORIZED,
+                            headers={"WWW-Authenticate": 'Bearer realm="api"'})
+    if auth is None:
+        return JsonResponse({"detail": "Authentication credentials were not provided."},
+                            status=status.HTTP_401_UNAUTHORIZED,
+                            headers={"WWW-Authenticate": 'Bearer realm="api"'})
+
+    status_filter = request.GET.get('status')
+    if status_filter is not None and status_filter not in TASK_STATUSES:
+        return JsonResponse({"detail": "Unknown status."}, status=status.HTTP_400_BAD_REQUEST)
+
+    user_id = None
+    username = request.GET.get('user')
+    if username is not None:
+        User = get_user_model()
+        user_id = await User.objects.filter(username=username).values_list('id', flat=True).afirst()
+        if user_id is None:
+            return JsonResponse({"detail": "User not found."}, status=status.HTTP_404_NOT_FOUND)
+
+    subscription = event_hub.subscribe(user_id=user_id, status=status_filter)
+    heartbeat = getattr(settings, 'TASKS_EVENTS_HEARTBEAT', 15)
+    response = StreamingHttpResponse(stream_events(subscription, heartbeat),
+                                     content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -44,6 +44,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Server-Timing, гистограммы по маршрутам и журнал медленных запросов;
+    # выключен, пока не задан TASKS_METRICS_ENABLED или TASKS_SLOW_QUERY_MS
+    'tasks.instrumentation.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -79,7 +82,9 @@ WSGI_APPLICATION = 'todo_list_app.wsgi.application'
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        # SQLite (DB_ENGINE=django.db.backends.sqlite3, DB_NAME=путь к файлу) - для
+        # локальных бенчмарков без внешних сервисов
+        'ENGINE': os.getenv('DB_ENGINE', 'django.db.backends.postgresql'),
         'NAME': os.getenv('DB_NAME'),
         'USER': os.getenv('DB_USER'),
         'PASSWORD': os.getenv('DB_PASSWORD'),
@@ -88,17 +93,127 @@ DATABASES = {
         }
 }
 
+# Дополнительные БД (реплики, шарды) задаются списком через запятую: хосты
+# PostgreSQL (имя БД и учетные данные - как у основной) или пути к файлам SQLite
+_DB_LOCATION_KEY = 'NAME' if DATABASES['default']['ENGINE'].endswith('sqlite3') else 'HOST'
+
+# Шардирование задач по пользователю (tasks/sharding.py): DB_SHARDS=<шард>[,<шард>...] -
+# БД для задач в дополнение к основной (первый шард). Пользователи и карта
+# шардов остаются в основной БД. Без DB_SHARDS шардирования нет.
+TASKS_SHARDS = []
+for _index, _shard in enumerate(filter(None, os.getenv('DB_SHARDS', '').split(',')), start=1):
+    DATABASES[f'shard{_index}'] = {**DATABASES['default'], _DB_LOCATION_KEY: _shard.strip()}
+    TASKS_SHARDS.append(f'shard{_index}')
+if TASKS_SHARDS:
+    TASKS_SHARDS.insert(0, 'default')
+
+# Время жизни закэшированных строк карты шардов (секунды)
+TASKS_SHARD_MAP_CACHE_TIMEOUT = int(os.getenv('TASKS_SHARD_MAP_CACHE_TIMEOUT', 300))
+
+# Реплики для чтения (tasks/routers.py): DB_REPLICAS=<реплика>[,<реплика>...] -
+# реплики основной БД. В тестах реплики - зеркала основной БД (TEST.MIRROR).
+DATABASE_ROUTERS = ['tasks.sharding.ShardRouter', 'tasks.routers.ReplicaRouter']
+TASKS_DB_REPLICAS = []
+for _index, _replica in enumerate(filter(None, os.getenv('DB_REPLICAS', '').split(',')), start=1):
+    DATABASES[f'replica{_index}'] = {**DATABASES['default'], _DB_LOCATION_KEY: _replica.strip(),
+                                     'TEST': {'MIRROR': 'default'}}
+    TASKS_DB_REPLICAS.append(f'replica{_index}')
+
+# Сколько секунд после записи чтения пользователя идут в основную БД
+# (должно быть больше отставания реплик)
+TASKS_DB_REPLICA_STICKY_SECONDS = int(os.getenv('TASKS_DB_REPLICA_STICKY_SECONDS', 5))
+
 AUTH_USER_MODEL = 'tasks.User'
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+# По умолчанию - locmem (разработка и тесты), в продакшене задается через окружение,
+# например CACHE_BACKEND=django.core.cache.backends.redis.RedisCache
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    }
+}
+
+# Время жизни закэшированных ответов списков задач (секунды)
+TASKS_LIST_CACHE_TIMEOUT = int(os.getenv('TASKS_LIST_CACHE_TIMEOUT', 300))
+
+# Кэш состояний пользователей для JWT-аутентификации (в памяти процесса)
+TASKS_AUTH_USER_CACHE_SIZE = int(os.getenv('TASKS_AUTH_USER_CACHE_SIZE', 10000))
+TASKS_AUTH_USER_CACHE_TTL = int(os.getenv('TASKS_AUTH_USER_CACHE_TTL', 60))
+
+# Лента изменений задач (/api/tasks/events/): бэкенд pub/sub.
+# tasks.events.InProcessBackend - в памяти одного процесса,
+# tasks.events.PostgresNotifyBackend - LISTEN/NOTIFY для нескольких процессов и узлов
+TASKS_EVENTS_BACKEND = os.getenv('TASKS_EVENTS_BACKEND', 'tasks.events.InProcessBackend')
+TASKS_EVENTS_HEARTBEAT = int(os.getenv('TASKS_EVENTS_HEARTBEAT', 15))
+
+# Максимальное число операций в одном пакетном запросе /api/tasks/bulk/
+TASKS_BULK_MAX_OPERATIONS = int(os.getenv('TASKS_BULK_MAX_OPERATIONS', 500))
+
+# Инкрементальная синхронизация (/api/tasks/user/<username>/sync/):
+# окно "дозревания" водяного знака (секунды), максимальный размер страницы
+# и срок хранения меток удаления (дни; более старый since получает 410)
+TASKS_SYNC_SETTLE_SECONDS = int(os.getenv('TASKS_SYNC_SETTLE_SECONDS', 5))
+TASKS_SYNC_MAX_LIMIT = int(os.getenv('TASKS_SYNC_MAX_LIMIT', 1000))
+TASKS_SYNC_TOMBSTONE_RETENTION_DAYS = int(os.getenv('TASKS_SYNC_TOMBSTONE_RETENTION_DAYS', 30))
+
+# Архив завершенных задач (tasks/archive.py): задачи, завершенные дольше
+# TASKS_ARCHIVE_AFTER_DAYS дней назад, переносит в архив команда
+# archive_completed_tasks; списки и поиск задачи по id читают и архив.
+# Не задан - архива нет
+TASKS_ARCHIVE_AFTER_DAYS = int(os.environ['TASKS_ARCHIVE_AFTER_DAYS']) if os.getenv('TASKS_ARCHIVE_AFTER_DAYS') else None
+
+# Потоковая выгрузка задач: число строк, читаемых из серверного курсора за раз
+TASKS_EXPORT_CHUNK_SIZE = int(os.getenv('TASKS_EXPORT_CHUNK_SIZE', 2000))
+
+# Время жизни закэшированной общей статистики задач (секунды)
+TASKS_STATS_CACHE_TIMEOUT = int(os.getenv('TASKS_STATS_CACHE_TIMEOUT', 5))
+
+# Инструментирование запросов (tasks/instrumentation.py): Server-Timing и
+# гистограммы по маршрутам для /api/tasks/metrics/ (доступ по токену),
+# журнал SQL-запросов дольше TASKS_SLOW_QUERY_MS (логгер tasks.slow_queries)
+TASKS_METRICS_ENABLED = os.getenv('TASKS_METRICS_ENABLED', 'false').lower() in ('1', 'true', 'yes', 'on')
+TASKS_METRICS_SERVER_TIMING = os.getenv('TASKS_METRICS_SERVER_TIMING', 'true').lower() in ('1', 'true', 'yes', 'on')
+TASKS_METRICS_TOKEN = os.getenv('TASKS_METRICS_TOKEN', '')
+TASKS_SLOW_QUERY_MS = float(os.environ['TASKS_SLOW_QUERY_MS']) if os.getenv('TASKS_SLOW_QUERY_MS') else None
+
+
 # JWT authentification
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        # JWTAuthentication без выборки пользователя на каждый запрос
+        'tasks.authentication.TaskJWTAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',  
     ],
+    # JSON через orjson, если он установлен (иначе - стандартный json),
+    # вывод совпадает с JSONRenderer DRF побайтно
+    'DEFAULT_RENDERER_CLASSES': [
+        'tasks.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'tasks.renderers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
+    # Token bucket (tasks/throttling.py): '<N>/<период>' - всплеск до N запросов,
+    # пополнение N запросов за период. Области token_* - эндпоинты /api/token/
+    'DEFAULT_THROTTLE_CLASSES': [
+        'tasks.throttling.UserTokenBucketThrottle',
+        'tasks.throttling.IPTokenBucketThrottle',
+    ],
+    'DEFAULT_THROTTLE_RATES': {
+        'user': os.getenv('THROTTLE_RATE_USER', '300/min'),
+        'ip': os.getenv('THROTTLE_RATE_IP', '1000/min'),
+        'token_ip': os.getenv('THROTTLE_RATE_TOKEN_IP', '30/min'),
+        'token_username': os.getenv('THROTTLE_RATE_TOKEN_USERNAME', '10/min'),
+    },
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',  
     'PAGE_SIZE': 10, 
 }
@@ -0,0 +1,90 @@
+"""
+Production settings for todo_list_app project.
+
+Используются сервером приложений (gunicorn + uvicorn, см. gunicorn.conf.py и
+entrypoint.sh): DJANGO_SETTINGS_MODULE=todo_list_app.settings_production.
+Все параметры задаются переменными окружения.
+"""
+import os
+
+from django.core.exceptions import ImproperlyConfigured
+
+from .settings import *  # noqa: F401,F403
+from .settings import DATABASES, REST_FRAMEWORK, SIMPLE_JWT
+
+
+def env_bool(name, default=False):
+    return os.getenv(name, str(default)).strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def env_list(name, default=''):
+    return [value.strip() for value in os.getenv(name, default).split(',') if value.strip()]
+
+
+# DEBUG выключен: при DEBUG = True Django сохраняет каждый SQL-запрос
+# в connection.queries, что под нагрузкой означает лишнее время и рост памяти
+DEBUG = env_bool('DJANGO_DEBUG', False)
+
+SECRET_KEY = os.getenv('DJANGO_SECRET_KEY')
+if not SECRET_KEY:
+    raise ImproperlyConfigured('DJANGO_SECRET_KEY must be set in production.')
+SIMPLE_JWT = {**SIMPLE_JWT, 'SIGNING_KEY': SECRET_KEY}
+
+ALLOWED_HOSTS = env_list('DJANGO_ALLOWED_HOSTS', 'localhost')
+CSRF_TRUSTED_ORIGINS = env_list('DJANGO_CSRF_TRUSTED_ORIGINS')
+
+# За обратным прокси (nginx, балансировщик), который завершает TLS
+if env_bool('DJANGO_BEHIND_TLS_PROXY', False):
+    SECURE_PROXY_SSL_HEADER = ('HTTP_X_FORWARDED_PROTO', 'https')
+    SESSION_COOKIE_SECURE = True
+    CSRF_COOKIE_SECURE = True
+    # IP клиента для ограничения частоты - из X-Forwarded-For (число прокси перед приложением)
+    REST_FRAMEWORK = {**REST_FRAMEWORK, 'NUM_PROXIES': int(os.getenv('DJANGO_NUM_PROXIES', 1))}
+
+
+# Database
+# Два режима работы с соединениями:
+#   DB_POOL=true  - пул соединений psycopg 3 (Django 5.1+), соединение берется
+#                   из пула на запрос; подходит и для ASGI, где постоянные
+#                   соединения (CONN_MAX_AGE) использовать не рекомендуется
+#   DB_POOL=false - постоянные соединения на поток (CONN_MAX_AGE секунд) с
+#                   проверкой соединения перед повторным использованием (для WSGI)
+
+# Настройки соединений - одинаковые для основной БД и реплик (DB_REPLICAS)
+for _database in DATABASES.values():
+    _database['CONN_HEALTH_CHECKS'] = env_bool('DB_CONN_HEALTH_CHECKS', True)
+
+    if env_bool('DB_POOL', True) and _database['ENGINE'] == 'django.db.backends.postgresql':
+        _database['CONN_MAX_AGE'] = 0
+        _database['OPTIONS'] = {**_database.get('OPTIONS', {}), 'pool': {
+            'min_size': int(os.getenv('DB_POOL_MIN_SIZE', 2)),
+            'max_size': int(os.getenv('DB_POOL_MAX_SIZE', 10)),
+            # Сколько ждать свободного соединения, прежде чем вернуть ошибку
+            'timeout': float(os.getenv('DB_POOL_TIMEOUT', 10)),
+            # Соединения старше max_lifetime пересоздаются (балансировка после
+            # перезапуска/переключения БД)
+            'max_lifetime': float(os.getenv('DB_POOL_MAX_LIFETIME', 1800)),
+        }}
+    else:
+        _database['CONN_MAX_AGE'] = int(os.getenv('DB_CONN_MAX_AGE', 60))
+
+# Static files (админка) - собираются командой collectstatic
+STATIC_ROOT = os.getenv('DJANGO_STATIC_ROOT', str(BASE_DIR / 'staticfiles'))  # noqa: F405
+
+
+# Logging - в stdout, уровень из окружения. Логгер django.db.backends
+# не включается: SQL-запросы логируются только при DEBUG.
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'default': {'format': '%(asctime)s %(levelname)s %(name)s %(message)s'},
+    },
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler', 'formatter': 'default'},
+    },
+    'root': {
+        'handlers': ['console'],
+        'level': os.getenv('DJANGO_LOG_LEVEL', 'INFO'),
+    },
+}